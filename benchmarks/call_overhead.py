@@ -0,0 +1,103 @@
+"""
+Per-call overhead ell adds on top of a raw provider call.
+
+    python benchmarks/call_overhead.py --n 2000
+
+The client is an in-process fake that answers instantly, so every microsecond reported is spent in ell (prompt
+construction, provider translation, tracking and storage) rather than on the network.
+"""
+import argparse
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+import ell
+from ell.configurator import config, register_provider
+from ell.provider import EllCallParams, Provider
+from ell.stores.sql import SQLiteStore
+from ell.types import Message
+from ell.types._lstr import _lstr
+
+
+class FakeClient:
+    def create(self, model: str, messages: List[Dict[str, Any]]):
+        return messages[-1]["content"]
+
+
+class FakeProvider(Provider):
+    def provider_call_function(self, client, api_call_params: Optional[Dict[str, Any]] = None):
+        return client.create
+
+    def translate_to_provider(self, ell_call: EllCallParams):
+        return dict(
+            model=ell_call.model,
+            messages=[dict(role=m.role, content=m.text_only) for m in ell_call.messages],
+        )
+
+    def translate_from_provider(self, provider_response, ell_call, provider_call_params, origin_id=None, logger=None):
+        return (
+            [Message(role="assistant", content=_lstr(provider_response, origin_trace=origin_id))],
+            {"usage": {"prompt_tokens": 1, "completion_tokens": 1}},
+        )
+
+
+register_provider(FakeProvider(), FakeClient)
+client = FakeClient()
+
+
+@ell.simple(model="fake-model", client=client)
+def echo(text: str):
+    """You are an echo."""
+    return f"say {text}"
+
+
+def use_store(store):
+    config.store = store
+    # LMPs remember having been serialized; make sure the fresh store gets its own copy.
+    echo.__ell_func__._has_serialized_lmp = False
+
+
+def time_per_call(fn, n: int) -> float:
+    for i in range(min(n, 50)):
+        fn(i)
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ell per-call overhead")
+    parser.add_argument("--n", type=int, default=2000, help="Calls per mode")
+    args = parser.parse_args()
+
+    def raw(i):
+        return client.create(
+            model="fake-model",
+            messages=[dict(role="system", content="You are an echo."), dict(role="user", content=f"say {i}")],
+        )
+
+    results = [("raw client call", time_per_call(raw, args.n))]
+
+    use_store(None)
+    results.append(("ell, no store", time_per_call(lambda i: echo(str(i)), args.n)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        use_store(SQLiteStore(tmpdir))
+        results.append(("ell, sqlite", time_per_call(lambda i: echo(str(i)), args.n)))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        store = SQLiteStore(tmpdir, write_behind=True)
+        use_store(store)
+        results.append(("ell, sqlite write-behind", time_per_call(lambda i: echo(str(i)), args.n)))
+        store.flush()
+    use_store(None)
+
+    baseline = results[0][1]
+    print(f"{'mode':<26} {'per call':>12} {'overhead':>12}")
+    for name, us in results:
+        print(f"{name:<26} {us:>9.1f} us {us - baseline:>9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Versioning time for a module of LMPs with a cold vs. warm closure cache.
+
+    python benchmarks/closure_cache.py --lmps 300
+
+Generates a module of LMPs (each using a shared helper, in chains of three LMPs calling one another), then computes
+every closure once with an empty cache and once more after re-importing the module, as a fresh process would.
+"""
+import argparse
+import importlib
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from ell.configurator import config
+from ell.util.closure import lexically_closured_source
+from ell.util.closure_cache import get_closure_cache
+
+HEADER = '''
+import ell
+
+STYLE = "concise"
+
+def format_question(question):
+    return question.strip().rstrip("?") + "?"
+'''
+
+LMP = '''
+@ell.simple(model="gpt-4o-mini", client=object(), temperature=0.{i})
+def lmp_{i}(question: str):
+    """You are a {{STYLE}} assistant number {i}."""
+    context = {previous}
+    return f"Answer in a {{STYLE}} way: {{format_question(question)}} {{context}}"
+'''
+
+
+def version_all(module, n):
+    start = time.perf_counter()
+    for i in range(n):
+        lexically_closured_source(getattr(module, f"lmp_{i}").__ell_func__)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the on-disk closure cache")
+    parser.add_argument("--lmps", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        source = HEADER + "".join(
+            LMP.format(i=i, previous=f'lmp_{i - 1}("hi")' if i % 3 else '""') for i in range(args.lmps)
+        )
+        Path(tmpdir, "bench_lmps.py").write_text(source)
+        sys.path.insert(0, tmpdir)
+        config.closure_cache_dir = str(Path(tmpdir, "closure_cache"))
+
+        cold = version_all(importlib.import_module("bench_lmps"), args.lmps)
+        sys.modules.pop("bench_lmps")
+        warm = version_all(importlib.import_module("bench_lmps"), args.lmps)
+
+        stats = get_closure_cache().stats
+        print(f"{'cache':<8} {'versioning time':>16}")
+        print(f"{'cold':<8} {cold * 1000:>13.0f} ms")
+        print(f"{'warm':<8} {warm * 1000:>13.0f} ms")
+        print(f"hits={stats.hits} misses={stats.misses} startup time saved={stats.seconds_saved * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Database size and read/write throughput of compressed invocation contents vs. plain JSON columns.
+
+    python benchmarks/contents_compression.py --n 5000
+
+Each layout writes the same invocations (chat-style results of a few hundred bytes, as LM invocations store) into a
+fresh SQLiteStore, then reads all their contents back through the ORM. "dictionary" trains a dictionary on the
+first 10% of the invocations before writing the rest.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, select
+
+from ell.stores.compression import default_codec
+from ell.stores.models.core import Invocation, InvocationContents, SerializedLMP
+from ell.stores.sql import SQLiteStore
+from ell.types.lmp import LMPType
+from ell.util.serialization import utc_now
+
+WORDS = "the a ship sails at dawn captain crew harbor storm north wind sea map gold island port rope deck".split()
+
+
+def make_invocations(n, seed=0):
+    rng = random.Random(seed)
+    invocations = []
+    for i in range(n):
+        invocation_id = f"invocation-{i:032x}"
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 80)))
+        invocations.append(
+            (
+                Invocation(
+                    id=invocation_id,
+                    lmp_id="lmp-bench",
+                    latency_ms=12.3,
+                    prompt_tokens=100,
+                    completion_tokens=50,
+                    state_cache_key=f"{i:064x}",
+                    created_at=utc_now(),
+                    contents=InvocationContents(
+                        invocation_id=invocation_id,
+                        params={"question": f"Question {i}: where does the ship sail?"},
+                        results=[
+                            {"role": "assistant", "content": [{"text": {"content": text, "__lstr": True}}]}
+                        ],
+                        invocation_api_params={"temperature": 0.7, "max_tokens": 256},
+                    ),
+                ),
+                set(),
+            )
+        )
+    return invocations
+
+
+def db_size(db_dir):
+    return sum(os.path.getsize(os.path.join(db_dir, name)) for name in os.listdir(db_dir) if name.startswith("ell.db"))
+
+
+def bench(layout, n, batch_size):
+    with tempfile.TemporaryDirectory() as db_dir:
+        store = SQLiteStore(db_dir, compress_contents=layout != "plain", compression_threshold=0)
+        store.write_lmp(
+            SerializedLMP(lmp_id="lmp-bench", name="bench", source="", dependencies="", lmp_type=LMPType.LM, created_at=utc_now()),
+            {},
+        )
+        invocations = make_invocations(n)
+        start = 0
+        if layout == "dictionary":
+            start = n // 10
+            store.write_invocations(invocations[:start])
+            store.train_compression_dictionary()
+
+        t0 = time.perf_counter()
+        for i in range(start, n, batch_size):
+            store.write_invocations(invocations[i : i + batch_size])
+        write_rate = (n - start) / (time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        with Session(store.engine) as session:
+            rows = session.exec(select(Invocation).options(selectinload(Invocation.contents))).all()
+            assert all(row.contents.results for row in rows)
+        read_rate = n / (time.perf_counter() - t0)
+
+        store.engine.dispose()
+        return db_size(db_dir), write_rate, read_rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compressed invocation contents")
+    parser.add_argument("--n", type=int, default=5000, help="Invocations written per layout")
+    parser.add_argument("--batch-size", type=int, default=500, help="Invocations per write_invocations call")
+    args = parser.parse_args()
+
+    print(f"codec: {default_codec()}")
+    print(f"{'layout':<12} {'db size':>12} {'write':>16} {'read':>16}")
+    for layout in ("plain", "compressed", "dictionary"):
+        size, write_rate, read_rate = bench(layout, args.n, args.batch_size)
+        print(f"{layout:<12} {size / 1024:>9.0f} KB {write_rate:>10.0f} rows/s {read_rate:>10.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Time to `import ell`, measured with `python -X importtime` in fresh interpreters.
+
+    python benchmarks/import_time.py --repeat 5
+
+Reports the best total import time, the slowest imports along the most expensive branch and whether any provider SDK was imported.
+Provider SDKs are imported on first use of a matching client or model, so none should show up here.
+"""
+import argparse
+import subprocess
+import sys
+
+PROVIDER_SDKS = ("openai", "anthropic", "groq", "botocore", "boto3", "google.genai", "black")
+
+
+def import_times(statement):
+    """Runs `statement` under -X importtime; returns [(module, cumulative_us, depth)] in the order imports finished."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement], capture_output=True, text=True, check=True
+    ).stderr
+    times = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(cumulative_us), (len(name) - len(name.lstrip()) - 1) // 2))
+    return times
+
+
+def children_of(times, module):
+    """Direct imports of `module`: they finish right before it, one level deeper."""
+    index = next(i for i, (name, _, _) in enumerate(times) if name == module)
+    depth, children = times[index][2], []
+    for name, cumulative_us, child_depth in reversed(times[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append((name, cumulative_us))
+    return children
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark `import ell`")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=4)
+    args = parser.parse_args()
+
+    runs = [import_times("import ell") for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: dict((name, us) for name, us, _ in times)["ell"])
+    print(f"import ell: {dict((name, us) for name, us, _ in best)['ell'] / 1000:.0f} ms (best of {args.repeat})")
+
+    # Walk down the most expensive branch to show where the time goes.
+    print(f"\n{'slowest imports':<40} {'cumulative':>12}")
+    module = "ell"
+    for _ in range(args.depth):
+        children = children_of(best, module)
+        if not children:
+            break
+        for name, cumulative_us in sorted(children, key=lambda c: -c[1])[:3]:
+            print(f"{name:<40} {cumulative_us / 1000:>9.0f} ms")
+        module = max(children, key=lambda c: c[1])[0]
+        print()
+
+    imported_modules = {name for name, _, _ in best}
+    imported = [sdk for sdk in PROVIDER_SDKS if sdk in imported_modules]
+    print(f"provider SDKs imported: {', '.join(imported) if imported else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Cost of preparing invocation params (cleaning, cache-key input, origin-trace collection) for long chat histories.
+
+    python benchmarks/prepare_invocation_params.py --messages 10000
+
+Compares ell.util.serialization.prepare_invocation_params against the previous implementation, which serialized
+the params to JSON, regex-scanned the string for origin traces and parsed it back.
+"""
+import argparse
+import json
+import re
+import time
+
+import ell
+from ell.types._lstr import _lstr
+from ell.util.serialization import prepare_invocation_params, serialize_object
+
+
+def regex_prepare_invocation_params(params):
+    jstr = serialize_object(params)
+    consumes = set()
+    for match in re.findall(r'"__origin_trace__":\s*"frozenset\({(.+?)}\)"', jstr):
+        consumes.update(item.strip().strip("'") for item in match.split(","))
+    return json.loads(jstr), jstr, list(consumes)
+
+
+def make_histories(n):
+    traced = [_lstr(f"turn {i}: " + "lorem ipsum " * 20, origin_trace=f"invocation-{i % 97:032x}") for i in range(n)]
+    messages = [(ell.user if i % 2 else ell.assistant)(f"turn {i}: " + "lorem ipsum " * 20) for i in range(n)]
+    return [
+        ("lstr history", {"history": traced, "question": "what next?"}),
+        ("message history", {"history": messages, "question": "what next?"}),
+    ]
+
+
+def best_of(fn, params, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(params)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prepare_invocation_params")
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'params':<18} {'regex':>12} {'single pass':>12} {'speedup':>8}")
+    for name, params in make_histories(args.messages):
+        assert prepare_invocation_params(params)[1] == regex_prepare_invocation_params(params)[1]
+        old = best_of(regex_prepare_invocation_params, params, args.repeat)
+        new = best_of(prepare_invocation_params, params, args.repeat)
+        print(f"{name:<18} {old:>9.1f} ms {new:>9.1f} ms {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
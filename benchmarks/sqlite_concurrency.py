@@ -0,0 +1,74 @@
+"""
+Multi-threaded write throughput of SQLiteStore with the default settings vs. high_concurrency=True.
+
+    python benchmarks/sqlite_concurrency.py --threads 16 --n 200
+
+Each thread mimics a tracked call: a cache lookup (read) followed by an invocation write.
+"""
+import argparse
+import secrets
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ell.stores.models.core import Invocation, InvocationContents, SerializedLMP
+from ell.stores.sql import SQLiteStore
+from ell.types.lmp import LMPType
+from ell.util.serialization import utc_now
+
+
+def make_invocation(lmp_id):
+    invocation_id = "invocation-" + secrets.token_hex(16)
+    return Invocation(
+        id=invocation_id,
+        lmp_id=lmp_id,
+        latency_ms=12.3,
+        prompt_tokens=100,
+        completion_tokens=50,
+        state_cache_key=secrets.token_hex(32),
+        created_at=utc_now(),
+        contents=InvocationContents(invocation_id=invocation_id, params={"question": "What is 1 + 1?"}, results=["2"]),
+    )
+
+
+def bench(store: SQLiteStore, n_threads: int, n_per_thread: int):
+    lmp_id = "lmp-bench"
+    store.write_lmp(
+        SerializedLMP(lmp_id=lmp_id, name=lmp_id, source="", dependencies="", lmp_type=LMPType.LM, created_at=utc_now()),
+        {},
+    )
+    errors = []
+
+    def worker(_):
+        for _ in range(n_per_thread):
+            try:
+                store.get_cached_invocations(lmp_id, secrets.token_hex(32))
+                store.write_invocation(make_invocation(lmp_id), set())
+            except Exception as e:
+                errors.append(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        list(executor.map(worker, range(n_threads)))
+    elapsed = time.perf_counter() - start
+    written = n_threads * n_per_thread - len(errors)
+    return written / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent SQLiteStore writes")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--n", type=int, default=100, help="Writes per thread")
+    parser.add_argument("--busy-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'profile':<18} {'throughput':>16} {'errors':>8}")
+    for name, high_concurrency in [("default", False), ("high_concurrency", True)]:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            store = SQLiteStore(tmpdir, high_concurrency=high_concurrency, busy_timeout=args.busy_timeout)
+            rate, n_errors = bench(store, args.threads, args.n)
+            print(f"{name:<18} {rate:>9.0f} rows/s {n_errors:>8}")
+
+
+if __name__ == "__main__":
+    main()
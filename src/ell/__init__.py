@@ -8,11 +8,8 @@ from ell.types import system, user, assistant, Message, ContentBlock
 from ell.__version__ import __version__
 from ell.evaluation import Evaluation
 
-# Import all providers
-from ell import providers
-
-# Import all models
-from ell import models
+# Providers and models are imported on first use (see ell.configurator); ell.providers and ell.models load on access.
+import importlib as _importlib
 
 
 # Import from configurator
@@ -44,3 +41,9 @@ __all__ = [
     "register_provider",
     "set_store",
 ]
+
+
+def __getattr__(name):
+    if name in ("providers", "models"):
+        return _importlib.import_module(f"ell.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,6 +1,7 @@
 from functools import lru_cache, wraps
-from typing import Dict, Any, Optional, Tuple, Union, Type, TYPE_CHECKING
-import openai
+import importlib
+import os
+from typing import Dict, Any, Iterable, Literal, Optional, Tuple, Union, Type, TYPE_CHECKING
 import logging
 from contextlib import contextmanager
 import threading
@@ -9,6 +10,7 @@ from ell.provider import Provider
 from dataclasses import dataclass, field
 
 if TYPE_CHECKING:
+    import openai
     from ell.stores import Store
 else:
     Store = None
@@ -20,7 +22,7 @@ _config_logger = logging.getLogger(__name__)
 @dataclass(frozen=True)
 class _Model:
     name: str
-    default_client: Optional[Union[openai.Client, Any]] = None
+    default_client: Optional[Any] = None
     # XXX: Deprecation in 0.1.0
     # XXX: We will depreciate this when streaming is implemented.
     # Currently we stream by default for the verbose renderer,
@@ -32,6 +34,33 @@ class _Model:
     supports_streaming: Optional[bool] = field(default=None)
 
 
+# Config fields that client & provider resolution depends on.
+_RESOLUTION_FIELDS = frozenset({"registry", "providers", "default_client"})
+
+# Provider SDKs pull in most of ell's import time, so providers and default models are registered lazily.
+
+# Root package of a client's type -> the ell.providers module that registers a provider for it. Imported the first
+# time a client from that package is looked up.
+_LAZY_PROVIDER_MODULES: Dict[str, str] = {
+    "openai": "ell.providers.openai",
+    "anthropic": "ell.providers.anthropic",
+    "groq": "ell.providers.groq",
+    "botocore": "ell.providers.bedrock",
+    "google": "ell.providers.google",
+}
+
+# ell.models modules that register default models on import -> prefixes of the model names they register. Imported
+# the first time a matching model is looked up, and all of them (in this order) before falling back to
+# `default_client` for an unknown model.
+_LAZY_MODEL_MODULES: Dict[str, Tuple[str, ...]] = {
+    "ell.models.openai": ("gpt-", "chatgpt-", "o1", "text-embedding-", "babbage-", "davinci-", "tts-"),
+    "ell.models.anthropic": ("claude-",),
+    "ell.models.bedrock": ("anthropic.", "mistral.", "ai21.", "amazon.", "cohere.", "meta."),
+    "ell.models.xai": ("grok-",),
+    "ell.models.google": ("gemini-",),
+}
+
+
 class Config(BaseModel):
     """Configuration class for ELL."""
 
@@ -68,11 +97,31 @@ class Config(BaseModel):
         default=True,
         description="If True, enables lazy versioning for improved performance."
     )
+    hashing_mode: Literal["black", "ast"] = Field(
+        default="black",
+        description="How LMP versions are hashed. 'black' hashes Black-formatted source; 'ast' hashes an AST-normalized dump, skipping Black at versioning time. Stored 'black' versions are reused under 'ast' when their code is unchanged."
+    )
+    closure_cache_dir: Optional[str] = Field(
+        default_factory=lambda: os.environ.get("ELL_CLOSURE_CACHE_DIR"),
+        description="If set, LMP closures are cached on disk in this directory and reused across processes while their source is unchanged."
+    )
+    prompt_cache: bool = Field(
+        default=False,
+        description="If True, text responses are cached in the store by the exact request sent to the provider and reused by any LMP (or LMP version) that sends the same request."
+    )
+    single_flight: bool = Field(
+        default=False,
+        description="If True, identical concurrent provider requests are coalesced: one call is made and its response is shared by every caller waiting on it."
+    )
+    semantic_cache: Optional[Any] = Field(
+        default=None,
+        description="An optional ell.util.semantic_cache.SemanticCache. Exact cache misses of frozen LMPs fall back to the nearest previously recorded params of the same LMP version."
+    )
     default_api_params: Dict[str, Any] = Field(
         default_factory=dict,
         description="Default parameters for language models."
     )
-    default_client: Optional[openai.Client] = Field(
+    default_client: Optional[Any] = Field(
         default=None,
         description="The default OpenAI client used when a specific model client is not found."
     )
@@ -89,11 +138,82 @@ class Config(BaseModel):
         super().__init__(**data)
         self._lock = threading.Lock()
         self._local = threading.local()
+        self._generation = 0
+        self._lazy_lock = threading.RLock()
+        self._loaded_modules = set()
+        self._loading_defaults = False
+        self._default_client_assigned = False
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in _RESOLUTION_FIELDS:
+            self._bump_generation()
+        if name == "default_client" and not self._loading_defaults:
+            self._default_client_assigned = True
+
+    def _bump_generation(self) -> None:
+        self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        """
+        A counter that changes whenever client or provider resolution could change (model and provider
+        registration, or assigning `registry`, `providers` or `default_client`). LMPs key their precompiled
+        call plans on it.
+        """
+        return self._generation
+
+    @property
+    def has_registry_override(self) -> bool:
+        """True while a `model_registry_override` is active on the current thread."""
+        return bool(getattr(self._local, 'stack', None))
+
+    def _import_model_modules(self, modules: Iterable[str]) -> None:
+        with self._lazy_lock:
+            pending = [module for module in modules if module not in self._loaded_modules]
+            if not pending:
+                return
+            registered = dict(self.registry)
+            default_client = self.default_client
+            self._loading_defaults = True
+            try:
+                for module in pending:
+                    importlib.import_module(module)
+                    self._loaded_modules.add(module)
+                # Models registered and clients assigned before the defaults were loaded win, as they would have
+                # if the defaults had been registered on import.
+                with self._lock:
+                    self.registry.update(registered)
+                if self._default_client_assigned:
+                    self.default_client = default_client
+            finally:
+                self._loading_defaults = False
+                self._bump_generation()
+
+    def load_default_models(self, model_name: Optional[str] = None) -> None:
+        """
+        Register the default models of the ell.models modules that could provide `model_name`, or of all of them.
+        This happens on demand when a model is looked up; call it to populate `registry` up front.
+
+        :param model_name: The model name to load default registrations for. Loads every module if None.
+        :type model_name: str, optional
+        """
+        self._import_model_modules(
+            module for module, prefixes in _LAZY_MODEL_MODULES.items()
+            if model_name is None or model_name.startswith(prefixes)
+        )
+
+    def is_registered(self, model_name: str) -> bool:
+        """
+        Whether a client is registered for `model_name`, loading the default registrations that could provide it.
+        """
+        self.load_default_models(model_name)
+        return model_name in self.registry
 
     def register_model(
         self,
         name: str,
-        default_client: Optional[Union[openai.Client, Any]] = None,
+        default_client: Optional[Union["openai.Client", Any]] = None,
         supports_streaming: Optional[bool] = None
     ) -> None:
         """
@@ -106,6 +226,7 @@ class Config(BaseModel):
                 default_client=default_client,
                 supports_streaming=supports_streaming
             )
+            self._bump_generation()
 
     @contextmanager
     def model_registry_override(self, overrides: Dict[str, _Model]):
@@ -129,7 +250,7 @@ class Config(BaseModel):
         finally:
             self._local.stack.pop()
 
-    def get_client_for(self, model_name: str) -> Tuple[Optional[openai.Client], bool]:
+    def get_client_for(self, model_name: str) -> Tuple[Optional["openai.Client"], bool]:
         """
         Get the OpenAI client for a specific model name.
 
@@ -141,6 +262,14 @@ class Config(BaseModel):
         current_registry = self._local.stack[-1] if hasattr(
             self._local, 'stack') and self._local.stack else self.registry
         model_config = current_registry.get(model_name)
+        if not model_config:
+            # Load the default registrations that could provide the model, then all of them (they also set the
+            # default client) before falling back.
+            self.load_default_models(model_name)
+            model_config = current_registry.get(model_name) or self.registry.get(model_name)
+            if not model_config:
+                self.load_default_models()
+                model_config = self.registry.get(model_name)
         fallback = False
         if not model_config:
             warning_message = f"Warning: A default provider for model '{model_name}' could not be found. Falling back to default OpenAI client from environment variables."
@@ -167,6 +296,7 @@ class Config(BaseModel):
             client_type, type), "client_type must be a type (e.g. openai.Client), not an an instance (myclient := openai.Client()))"
         with self._lock:
             self.providers[client_type] = provider
+            self._bump_generation()
 
     def get_provider_for(self, client: Union[Type[Any], Any]) -> Optional[Provider]:
         """
@@ -179,6 +309,23 @@ class Config(BaseModel):
         """
 
         client_type = type(client) if not isinstance(client, type) else client
+        provider = self._find_provider(client_type)
+        if provider is None:
+            modules = [
+                _LAZY_PROVIDER_MODULES[root] for root in
+                dict.fromkeys(cls.__module__.split(".")[0] for cls in client_type.__mro__)
+                if root in _LAZY_PROVIDER_MODULES
+            ]
+            if modules:
+                with self._lazy_lock:
+                    for module in modules:
+                        if module not in self._loaded_modules:
+                            importlib.import_module(module)
+                            self._loaded_modules.add(module)
+                provider = self._find_provider(client_type)
+        return provider
+
+    def _find_provider(self, client_type: Type[Any]) -> Optional[Provider]:
         for provider_type, provider in self.providers.items():
             if issubclass(client_type, provider_type) or client_type == provider_type:
                 return provider
@@ -197,7 +344,11 @@ def init(
     lazy_versioning: bool = True,
     default_api_params: Optional[Dict[str, Any]] = None,
     default_client: Optional[Any] = None,
-    autocommit_model: str = "gpt-4o-mini"
+    autocommit_model: str = "gpt-4o-mini",
+    closure_cache_dir: Optional[str] = None,
+    prompt_cache: Optional[bool] = None,
+    single_flight: Optional[bool] = None,
+    semantic_cache: Optional[Any] = None
 ) -> None:
     """
     Initialize the ELL configuration with various settings.
@@ -216,6 +367,14 @@ def init(
     :type default_openai_client: openai.Client, optional
     :param autocommit_model: Set the model used for autocommitting.
     :type autocommit_model: str
+    :param closure_cache_dir: Cache LMP closures on disk in this directory to skip versioning work on later starts.
+    :type closure_cache_dir: str, optional
+    :param prompt_cache: Reuse cached responses for byte-identical provider requests, across LMP versions.
+    :type prompt_cache: bool, optional
+    :param single_flight: Coalesce identical concurrent provider requests into one call.
+    :type single_flight: bool, optional
+    :param semantic_cache: Serve exact cache misses of frozen LMPs from the nearest recorded params.
+    :type semantic_cache: ell.util.semantic_cache.SemanticCache, optional
     """
     # XXX: prevent double init
     config.verbose = verbose
@@ -241,6 +400,18 @@ def init(
     if autocommit_model is not None:
         config.autocommit_model = autocommit_model
 
+    if closure_cache_dir is not None:
+        config.closure_cache_dir = closure_cache_dir
+
+    if prompt_cache is not None:
+        config.prompt_cache = prompt_cache
+
+    if single_flight is not None:
+        config.single_flight = single_flight
+
+    if semantic_cache is not None:
+        config.semantic_cache = semantic_cache
+
 # Existing helper functions
 
 
@@ -10,7 +10,7 @@ from typing import (
     Union,
     cast,
 )
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 from ell.evaluation.results import _ResultDatapoint, EvaluationResults
 from ell.evaluation.serialization import write_evaluation, write_evaluation_run_end, write_evaluation_run_intermediate, write_evaluation_run_start
 from ell.evaluation.util import get_lmp_output
@@ -22,6 +22,7 @@ from pydantic import BaseModel, ConfigDict, Field, field_validator, model_valida
 from ell.types.message import LMP
 from ell.stores.models.evaluations import EvaluationLabelerType
 from ell.util.tqdm import tqdm
+from ell.util.concurrency import ContextThreadPoolExecutor
 import inspect
 
 from ell.util.closure_util import ido
@@ -160,7 +161,7 @@ class Evaluation(LabelListMixin):
         write_evaluation(self)
         evaluation_run.id = write_evaluation_run_start(self, evaluation_run)
         try:
-            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            with ContextThreadPoolExecutor(max_workers=n_workers) as executor:
                 output_futures = [
                     executor.submit(
                         self._process_single,
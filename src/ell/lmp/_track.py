@@ -1,6 +1,8 @@
+import asyncio
 import json
 import logging
 import threading
+from contextvars import ContextVar, Token
 from ell.types.lmp import LMPType
 from ell.util._warnings import _autocommit_warning
 import ell.util.closure
@@ -10,11 +12,10 @@ import inspect
 
 import secrets
 from functools import wraps
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
-from ell.util.serialization import get_immutable_vars, utc_now
-from ell.util.serialization import compute_state_cache_key
-from ell.util.serialization import prepare_invocation_params
+from ell.util.serialization import get_closure_vars, get_immutable_vars, utc_now
+from ell.util.serialization import prepare_invocation_params, structure_result
 
 try:
     from ell.stores.models.core import SerializedLMP, Invocation, InvocationContents
@@ -23,25 +24,29 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-# Thread-local storage for the invocation stack
-_invocation_stack = threading.local()
+# Sentinel returned by the cache lookup on a miss (None is a valid cached result).
+_NOT_CACHED = object()
+
+# The invocation stack lives in a contextvar (as an immutable tuple) so that asyncio tasks inherit their parent
+# invocation and concurrent tasks never see each other's pushes. Threads don't inherit contexts; submit work through
+# ell.util.concurrency to keep parent tracking across executors.
+_invocation_stack: ContextVar[Tuple[str, ...]] = ContextVar("ell_invocation_stack", default=())
 
 
 def get_current_invocation() -> Optional[str]:
-    if not hasattr(_invocation_stack, "stack"):
-        _invocation_stack.stack = []
-    return _invocation_stack.stack[-1] if _invocation_stack.stack else None
+    stack = _invocation_stack.get()
+    return stack[-1] if stack else None
 
 
-def push_invocation(invocation_id: str):
-    if not hasattr(_invocation_stack, "stack"):
-        _invocation_stack.stack = []
-    _invocation_stack.stack.append(invocation_id)
+def push_invocation(invocation_id: str) -> Token:
+    return _invocation_stack.set(_invocation_stack.get() + (invocation_id,))
 
 
-def pop_invocation():
-    if hasattr(_invocation_stack, "stack") and _invocation_stack.stack:
-        _invocation_stack.stack.pop()
+def pop_invocation(token: Optional[Token] = None):
+    if token is not None:
+        _invocation_stack.reset(token)
+    elif (stack := _invocation_stack.get()):
+        _invocation_stack.set(stack[:-1])
 
 
 def _track(
@@ -59,132 +64,232 @@ def _track(
         func_to_track.__ell_force_closure__()
     
 
-    @wraps(func_to_track)
-    def tracked_func(*fn_args, _get_invocation_id=False, **fn_kwargs) -> str:
-        # XXX: Cache keys and global variable binding is not thread safe.
-        # Compute the invocation id and hash the inputs for serialization.
-        invocation_id = "invocation-" + secrets.token_hex(16)
-
-        state_cache_key: str = None
-        if not config.store:
-            res = func_to_track(
-                *fn_args, **fn_kwargs, _invocation_origin=invocation_id
-            )[0]
-            return (res, invocation_id) if _get_invocation_id else res
-
-        parent_invocation_id = get_current_invocation()
-        try:
-            push_invocation(invocation_id)
-
-            # Convert all positional arguments to named keyword arguments
-            sig = inspect.signature(func_to_track)
-            # Filter out kwargs that are not in the function signature
-            filtered_kwargs = {
-                k: v for k, v in fn_kwargs.items() if k in sig.parameters
-            }
-
-            bound_args = sig.bind(*fn_args, **filtered_kwargs)
-            bound_args.apply_defaults()
-            all_kwargs = dict(bound_args.arguments)
-
-            # Get the list of consumed lmps and clean the invocation params for serialization.
-            cleaned_invocation_params, ipstr, consumes = prepare_invocation_params(
-                all_kwargs
-            )
-
-            try_use_cache = hasattr(func_to_track.__wrapper__, "__ell_use_cache__")
+    closure_lock = threading.Lock()
 
-            if try_use_cache:
-                # Todo: add nice logging if verbose for when using a cahced invocaiton. IN a different color with thar args..
-                if (
-                    not hasattr(func_to_track, "__ell_hash__")
-                    and config.lazy_versioning
-                ):
-                    fn_closure, _ = ell.util.closure.lexically_closured_source(
-                        func_to_track
+    def _ensure_versioned():
+        # With lazy versioning the closure is computed on first call; concurrent first calls (thread pools, asyncio
+        # workers) must neither duplicate that work nor observe a half-built closure.
+        if not hasattr(func_to_track, "__ell_hash__"):
+            with closure_lock:
+                if not hasattr(func_to_track, "__ell_hash__"):
+                    ell.util.closure.lexically_closured_source(
+                        func_to_track, forced_dependencies
                     )
 
-                # compute the state cachekey
-                state_cache_key = compute_state_cache_key(
-                    ipstr, func_to_track.__ell_closure__
-                )
+    # The signature never changes, so inspect it once at decoration time rather than on every call.
+    sig = inspect.signature(func_to_track)
 
-                cache_store = func_to_track.__wrapper__.__ell_use_cache__
-                cached_invocations = cache_store.get_cached_invocations(
-                    func_to_track.__ell_hash__, state_cache_key
-                )
+    def _prepare_invocation(fn_args, fn_kwargs):
+        # Convert all positional arguments to named keyword arguments
+        # Filter out kwargs that are not in the function signature
+        filtered_kwargs = {
+            k: v for k, v in fn_kwargs.items() if k in sig.parameters
+        } if fn_kwargs else fn_kwargs
 
-                if len(cached_invocations) > 0:
-                    # XXX: Fix caching.
-                    results = [d.deserialize() for d in cached_invocations[0].results]
+        bound_args = sig.bind(*fn_args, **filtered_kwargs)
+        bound_args.apply_defaults()
+        all_kwargs = dict(bound_args.arguments)
 
-                    logger.info(
-                        f"Using cached result for {func_to_track.__qualname__} with state cache key: {state_cache_key}"
-                    )
-                    if len(results) == 1:
-                        return results[0]
-                    else:
-                        return results
-                    # Todo: Unfiy this with the non-cached case. We should go through the same code pathway.
-                else:
-                    logger.info(
-                        f"Attempted to use cache on {func_to_track.__qualname__} but it was not cached, or did not exist in the store. Refreshing cache..."
-                    )
+        # Get the list of consumed lmps and clean the invocation params for serialization.
+        return prepare_invocation_params(all_kwargs)
 
-            _start_time = utc_now()
+    def _lookup_cache(ipstr):
+        """Returns the state cache key and the cached result (or _NOT_CACHED) for this call."""
+        # Todo: add nice logging if verbose for when using a cahced invocaiton. IN a different color with thar args..
+        _ensure_versioned()
 
-            # XXX: thread saftey note, if I prevent yielding right here and get the global context I should be fine re: cache key problem
+        # compute the state cachekey
+        state_cache_key = get_closure_vars(func_to_track).state_cache_key(ipstr)
 
-            # get the prompt
-            (result, invocation_api_params, metadata) = (
-                (func_to_track(*fn_args, **fn_kwargs), {}, {})
-                if lmp_type == LMPType.OTHER
-                else func_to_track(
-                    *fn_args,
-                    _invocation_origin=invocation_id,
-                    **fn_kwargs,
+        cache_store = func_to_track.__wrapper__.__ell_use_cache__
+        _adopt_stored_version(func_to_track)
+        cached_invocations = cache_store.get_cached_invocations(
+            func_to_track.__ell_hash__, state_cache_key
+        )
+        if not cached_invocations and config.semantic_cache is not None:
+            neighbour_key = config.semantic_cache.lookup(func_to_track.__ell_hash__, ipstr)
+            if neighbour_key is not None:
+                cached_invocations = cache_store.get_cached_invocations(
+                    func_to_track.__ell_hash__, neighbour_key
                 )
+
+        if len(cached_invocations) > 0:
+            cached_invocation = cached_invocations[0]
+            results = cache_store.load_invocation_contents(cached_invocation).get("results")
+
+            logger.info(
+                f"Using cached result for {func_to_track.__qualname__} with state cache key: {state_cache_key}"
             )
-            latency_ms = (utc_now() - _start_time).total_seconds() * 1000
-            usage = metadata.get("usage", {"prompt_tokens": 0, "completion_tokens": 0})
-            prompt_tokens = usage.get("prompt_tokens", 0) if usage else 0
-            completion_tokens = usage.get("completion_tokens", 0) if usage else 0
-
-            # XXX: cattrs add invocation origin here recursively on all pirmitive types within a message.
-            # XXX: This will allow all objects to be traced automatically irrespective origin rather than relying on the API to do it, it will of vourse be expensive but unify track.
-            # XXX: No other code will need to consider tracking after this point.
-
-            if not hasattr(func_to_track, "__ell_hash__") and config.lazy_versioning:
-                ell.util.closure.lexically_closured_source(
-                    func_to_track, forced_dependencies
-                )
-            serialize_lmp(func_to_track)
+            return state_cache_key, structure_result(results, origin_trace=cached_invocation.id)
+            # Todo: Unfiy this with the non-cached case. We should go through the same code pathway.
+        else:
+            logger.info(
+                f"Attempted to use cache on {func_to_track.__qualname__} but it was not cached, or did not exist in the store. Refreshing cache..."
+            )
+        return state_cache_key, _NOT_CACHED
+
+    def _record_invocation(
+        invocation_id,
+        parent_invocation_id,
+        latency_ms,
+        result,
+        invocation_api_params,
+        metadata,
+        state_cache_key,
+        ipstr,
+        cleaned_invocation_params,
+        consumes,
+    ):
+        usage = metadata.get("usage", {"prompt_tokens": 0, "completion_tokens": 0})
+        prompt_tokens = usage.get("prompt_tokens", 0) if usage else 0
+        completion_tokens = usage.get("completion_tokens", 0) if usage else 0
+
+        # XXX: cattrs add invocation origin here recursively on all pirmitive types within a message.
+        # XXX: This will allow all objects to be traced automatically irrespective origin rather than relying on the API to do it, it will of vourse be expensive but unify track.
+        # XXX: No other code will need to consider tracking after this point.
+
+        _ensure_versioned()
+        serialize_lmp(func_to_track)
+
+        # Only frozen calls looked up a state cache key, and only their params are worth embedding for the semantic
+        # cache: it answers frozen calls alone.
+        if state_cache_key and config.semantic_cache is not None:
+            config.semantic_cache.add(func_to_track.__ell_hash__, ipstr, state_cache_key)
+        if not state_cache_key:
+            state_cache_key = get_closure_vars(func_to_track).state_cache_key(ipstr)
+
+        _write_invocation(
+            func_to_track,
+            invocation_id,
+            latency_ms,
+            prompt_tokens,
+            completion_tokens,
+            state_cache_key,
+            invocation_api_params,
+            cleaned_invocation_params,
+            consumes,
+            result,
+            parent_invocation_id,
+        )
 
-            if not state_cache_key:
-                state_cache_key = compute_state_cache_key(
-                    ipstr, func_to_track.__ell_closure__
+    if inspect.iscoroutinefunction(func_to_track):
+        @wraps(func_to_track)
+        async def tracked_func(*fn_args, _get_invocation_id=False, **fn_kwargs) -> str:
+            # Compute the invocation id and hash the inputs for serialization.
+            invocation_id = "invocation-" + secrets.token_hex(16)
+
+            state_cache_key: str = None
+            if not config.store:
+                res = (await func_to_track(
+                    *fn_args, **fn_kwargs, _invocation_origin=invocation_id
+                ))[0]
+                return (res, invocation_id) if _get_invocation_id else res
+
+            parent_invocation_id = get_current_invocation()
+            stack_token = push_invocation(invocation_id)
+            try:
+
+                cleaned_invocation_params, ipstr, consumes = _prepare_invocation(fn_args, fn_kwargs)
+
+                if hasattr(func_to_track.__wrapper__, "__ell_use_cache__"):
+                    # Store reads and versioning never run on the event loop.
+                    state_cache_key, cached_result = await asyncio.to_thread(_lookup_cache, ipstr)
+                    if cached_result is not _NOT_CACHED:
+                        return cached_result
+
+                _start_time = utc_now()
+
+                (result, invocation_api_params, metadata) = (
+                    ((await func_to_track(*fn_args, **fn_kwargs)), {}, {})
+                    if lmp_type == LMPType.OTHER
+                    else await func_to_track(
+                        *fn_args,
+                        _invocation_origin=invocation_id,
+                        **fn_kwargs,
+                    )
+                )
+                latency_ms = (utc_now() - _start_time).total_seconds() * 1000
+
+                await asyncio.to_thread(
+                    _record_invocation,
+                    invocation_id,
+                    parent_invocation_id,
+                    latency_ms,
+                    result,
+                    invocation_api_params,
+                    metadata,
+                    state_cache_key,
+                    ipstr,
+                    cleaned_invocation_params,
+                    consumes,
                 )
 
-            _write_invocation(
-                func_to_track,
-                invocation_id,
-                latency_ms,
-                prompt_tokens,
-                completion_tokens,
-                state_cache_key,
-                invocation_api_params,
-                cleaned_invocation_params,
-                consumes,
-                result,
-                parent_invocation_id,
-            )
+                if _get_invocation_id:
+                    return result, invocation_id
+                else:
+                    return result
+            finally:
+                pop_invocation(stack_token)
+    else:
+        @wraps(func_to_track)
+        def tracked_func(*fn_args, _get_invocation_id=False, **fn_kwargs) -> str:
+            # XXX: Cache keys and global variable binding is not thread safe.
+            # Compute the invocation id and hash the inputs for serialization.
+            invocation_id = "invocation-" + secrets.token_hex(16)
+
+            state_cache_key: str = None
+            if not config.store:
+                res = func_to_track(
+                    *fn_args, **fn_kwargs, _invocation_origin=invocation_id
+                )[0]
+                return (res, invocation_id) if _get_invocation_id else res
+
+            parent_invocation_id = get_current_invocation()
+            stack_token = push_invocation(invocation_id)
+            try:
+
+                cleaned_invocation_params, ipstr, consumes = _prepare_invocation(fn_args, fn_kwargs)
+
+                if hasattr(func_to_track.__wrapper__, "__ell_use_cache__"):
+                    state_cache_key, cached_result = _lookup_cache(ipstr)
+                    if cached_result is not _NOT_CACHED:
+                        return cached_result
+
+                _start_time = utc_now()
+
+                # XXX: thread saftey note, if I prevent yielding right here and get the global context I should be fine re: cache key problem
+
+                # get the prompt
+                (result, invocation_api_params, metadata) = (
+                    (func_to_track(*fn_args, **fn_kwargs), {}, {})
+                    if lmp_type == LMPType.OTHER
+                    else func_to_track(
+                        *fn_args,
+                        _invocation_origin=invocation_id,
+                        **fn_kwargs,
+                    )
+                )
+                latency_ms = (utc_now() - _start_time).total_seconds() * 1000
+
+                _record_invocation(
+                    invocation_id,
+                    parent_invocation_id,
+                    latency_ms,
+                    result,
+                    invocation_api_params,
+                    metadata,
+                    state_cache_key,
+                    ipstr,
+                    cleaned_invocation_params,
+                    consumes,
+                )
 
-            if _get_invocation_id:
-                return result, invocation_id
-            else:
-                return result
-        finally:
-            pop_invocation()
+                if _get_invocation_id:
+                    return result, invocation_id
+                else:
+                    return result
+            finally:
+                pop_invocation(stack_token)
 
     func_to_track.__wrapper__ = tracked_func
     if hasattr(func_to_track, "__ell_api_params__"):
@@ -217,6 +322,7 @@ def serialize_lmp(func):
     api_params = getattr(func, "__ell_api_params__", None)
 
     lmps = config.store.get_versions_by_fqn(fqn=name)
+    _adopt_stored_version(func, lmps)
     version = 0
     already_in_store = any(lmp.lmp_id == func.__ell_hash__ for lmp in lmps)
 
@@ -257,6 +363,26 @@ def serialize_lmp(func):
     return func
 
 
+def _adopt_stored_version(func, stored_lmps=None):
+    """
+    Migration path for the "ast" hashing mode: versions stored under the "black" mode were hashed from Black-formatted
+    source, so the same code now gets a different id. Black preserves the AST, so a stored version of this LMP whose
+    source and dependencies normalize to the same AST *is* this version: reuse its id rather than creating a new one.
+    """
+    if config.hashing_mode != "ast" or getattr(func, "_ell_adopted_stored_version", False):
+        return
+    name = func.__qualname__
+    if "<lambda>" not in name:
+        if stored_lmps is None:
+            stored_lmps = config.store.get_versions_by_fqn(fqn=name)
+        if not any(lmp.lmp_id == func.__ell_hash__ for lmp in stored_lmps):
+            for lmp in sorted(stored_lmps, key=lambda lmp: lmp.created_at, reverse=True):
+                if ell.util.closure.ast_function_hash(lmp.source, lmp.dependencies, name) == func.__ell_hash__:
+                    func.__ell_hash__ = lmp.lmp_id
+                    break
+    func._ell_adopted_stored_version = True
+
+
 def _write_invocation(
     func,
     invocation_id,
@@ -271,13 +397,14 @@ def _write_invocation(
     parent_invocation_id,
 ):
 
+    closure_vars = get_closure_vars(func)
     invocation_contents = InvocationContents(
         invocation_id=invocation_id,
         params=cleaned_invocation_params,
         results=result,
         invocation_api_params=invocation_api_params,
-        global_vars=get_immutable_vars(func.__ell_closure__[2]),
-        free_vars=get_immutable_vars(func.__ell_closure__[3]),
+        global_vars=closure_vars.global_vars,
+        free_vars=closure_vars.free_vars,
     )
 
     if invocation_contents.should_externalize and config.store.has_blob_storage:
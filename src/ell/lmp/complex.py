@@ -11,6 +11,7 @@ from ell.util.verbosity import model_usage_logger_pre
 from ell.util.verbosity import model_usage_logger_post_end, model_usage_logger_post_intermediate, model_usage_logger_post_start
 
 from functools import wraps
+import inspect
 from typing import Any, Dict, Optional, List, Callable, Tuple, Union
 
 def complex(model: str, client: Optional[Any] = None, tools: Optional[List[Callable]] = None, exempt_from_tracking=False, post_callback: Optional[Callable] = None, **api_params):
@@ -20,23 +21,32 @@ def complex(model: str, client: Optional[Any] = None, tools: Optional[List[Calla
     def parameterized_lm_decorator(
         prompt: LMP,
     ) -> Callable[..., Union[List[Message], Message]]:
-        _warnings(model, prompt, default_client_from_decorator)
-
-        @wraps(prompt)
-        def model_call(
-            *prompt_args,
-            _invocation_origin : Optional[str] = None,
-            client: Optional[Any] = None,
-            api_params: Optional[Dict[str, Any]] = None,
-            lm_params: Optional[DeprecationWarning] = None,
-            **prompt_kwargs,
-        ) -> Tuple[Any, Any, Any]:
-            # XXX: Deprecation in 0.1.0
-            if lm_params:
-                raise DeprecationWarning("lm_params is deprecated. Use api_params instead.")
-        
-            # promt -> str
-            res = prompt(*prompt_args, **prompt_kwargs)
+        # Checking the model's registration imports its provider's SDK, so it waits for the first call that uses the
+        # default client rather than slowing down the import of every module that defines an LMP.
+        registration_checked = []
+
+        # Resolving the client & provider walks the model registry and the provider table; the answer only changes
+        # when the config does, so it is computed once per config generation. Per-call client overrides and
+        # registry overrides resolve fresh every time.
+        call_plan: Dict[str, Any] = {}
+
+        def _resolve_client_and_provider(client):
+            if client is None and not registration_checked:
+                registration_checked.append(True)
+                _warnings(model, prompt, default_client_from_decorator)
+            use_plan = client is None and not config.has_registry_override
+            if use_plan and call_plan.get("generation") == config.generation:
+                return call_plan["client"], call_plan["provider"]
+
+            generation = config.generation
+            resolved_client = _client_for_model(model, client or default_client_from_decorator)
+            provider = config.get_provider_for(resolved_client)
+            assert provider is not None, f"No provider found for client {resolved_client}."
+            if use_plan:
+                call_plan.update(generation=generation, client=resolved_client, provider=provider)
+            return resolved_client, provider
+
+        def _prepare_call(res, prompt_args, prompt_kwargs, client, api_params):
             # Convert prompt into ell messages
             messages = _get_messages(res, prompt) 
             
@@ -50,7 +60,7 @@ def complex(model: str, client: Optional[Any] = None, tools: Optional[List[Calla
             merged_api_params = {**config.default_api_params, **default_api_params_from_decorator, **(api_params or {})}
             n = merged_api_params.get("n", 1)
             # Merge client overrides & client registry
-            merged_client = _client_for_model(model, client or default_client_from_decorator)
+            merged_client, provider = _resolve_client_and_provider(client)
             ell_call = EllCallParams(
                 # XXX: Could change behaviour of overriding ell params for dyanmic tool calls.
                 model=merged_api_params.pop("model", default_model_from_decorator),
@@ -59,22 +69,62 @@ def complex(model: str, client: Optional[Any] = None, tools: Optional[List[Calla
                 api_params=merged_api_params,
                 tools=tools or [],
             )
-            # Get the provider for the model
-            provider = config.get_provider_for(ell_call.client)
-            assert provider is not None, f"No provider found for client {ell_call.client}."
-
-            if should_log: model_usage_logger_post_start(n)
-            with model_usage_logger_post_intermediate(n) as _logger:
-                (result, final_api_params, metadata) = provider.call(ell_call, origin_id=_invocation_origin, logger=_logger if should_log else None)
-                if isinstance(result, list) and len(result) == 1:
-                    result = result[0]
-                
+            return ell_call, provider, n, should_log
+
+        def _finish_call(result, should_log):
+            if isinstance(result, list) and len(result) == 1:
+                result = result[0]
             result = post_callback(result) if post_callback else result
             if should_log:
                 model_usage_logger_post_end()
-            #
-            #  These get sent to track. This is wack.           
-            return result, final_api_params, metadata
+            return result
+
+        if inspect.iscoroutinefunction(prompt):
+            @wraps(prompt)
+            async def model_call(
+                *prompt_args,
+                _invocation_origin : Optional[str] = None,
+                client: Optional[Any] = None,
+                api_params: Optional[Dict[str, Any]] = None,
+                lm_params: Optional[DeprecationWarning] = None,
+                **prompt_kwargs,
+            ) -> Tuple[Any, Any, Any]:
+                # XXX: Deprecation in 0.1.0
+                if lm_params:
+                    raise DeprecationWarning("lm_params is deprecated. Use api_params instead.")
+
+                res = await prompt(*prompt_args, **prompt_kwargs)
+                ell_call, provider, n, should_log = _prepare_call(res, prompt_args, prompt_kwargs, client, api_params)
+
+                if should_log: model_usage_logger_post_start(n)
+                with model_usage_logger_post_intermediate(n) as _logger:
+                    (result, final_api_params, metadata) = await provider.acall(ell_call, origin_id=_invocation_origin, logger=_logger if should_log else None)
+
+                return _finish_call(result, should_log), final_api_params, metadata
+        else:
+            @wraps(prompt)
+            def model_call(
+                *prompt_args,
+                _invocation_origin : Optional[str] = None,
+                client: Optional[Any] = None,
+                api_params: Optional[Dict[str, Any]] = None,
+                lm_params: Optional[DeprecationWarning] = None,
+                **prompt_kwargs,
+            ) -> Tuple[Any, Any, Any]:
+                # XXX: Deprecation in 0.1.0
+                if lm_params:
+                    raise DeprecationWarning("lm_params is deprecated. Use api_params instead.")
+            
+                # promt -> str
+                res = prompt(*prompt_args, **prompt_kwargs)
+                ell_call, provider, n, should_log = _prepare_call(res, prompt_args, prompt_kwargs, client, api_params)
+
+                if should_log: model_usage_logger_post_start(n)
+                with model_usage_logger_post_intermediate(n) as _logger:
+                    (result, final_api_params, metadata) = provider.call(ell_call, origin_id=_invocation_origin, logger=_logger if should_log else None)
+
+                #  These get sent to track. This is wack.           
+                return _finish_call(result, should_log), final_api_params, metadata
 
 
   
@@ -301,6 +351,18 @@ Usage Modes and Examples:
         tool_results : ell.Message = response.call_tools_and_collect_as_message(parallel=True, max_workers=3)
         print("Parallel tool results:", tool_results.text)
 
+7. Async LMPs:
+
+.. code-block:: python
+
+    @ell.complex(model="gpt-4o", client=openai.AsyncOpenAI())
+    async def answer(question: str) -> List[Message]:
+        return [ell.user(question)]
+
+    responses = await asyncio.gather(*(answer(q) for q in questions))
+
+Async clients are awaited directly on the event loop; sync clients are run in a worker thread.
+
 Helper Functions for Output Processing:
 
 - response.text: Get the full text content of the last message.
@@ -4,9 +4,19 @@ Attempts to registeres model names with their respective API client bindings. Th
 For example, to register an OpenAI model:
 @ell.simple(model='gpt-4o-mini') -> @ell.simple(model='gpt-4o-mini', client=openai.OpenAI())
 
+Modules are imported on first access, or by ell.configurator the first time one of their models is looked up.
 """
-
-from ell.models import openai, anthropic, ollama, groq, bedrock, xai, google
+import importlib
 
 __all__ = ["openai", "anthropic", "ollama", "groq", "bedrock", "xai", "google"]
 
+
+def __getattr__(name):
+    if name in __all__:
+        from ell.configurator import config
+
+        # Modules with default registrations are loaded through the config, which keeps earlier registrations.
+        config._import_model_modules([f"{__name__}.{name}"])
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+import asyncio
 from collections import defaultdict
 from functools import lru_cache
 import inspect
@@ -24,6 +25,8 @@ from ell.types._lstr import _lstr
 import json
 from dataclasses import dataclass
 from ell.types.message import LMP
+from ell.util.prompt_cache import load_cached_response, prompt_cache_key, save_response
+from ell.util.single_flight import SingleFlight, share_response, single_flight_key
 
 
 # XXX: Might leave this internal to providers so that the complex code is simpler &
@@ -48,6 +51,9 @@ class EllCallParams(BaseModel):
 
 Metadata = Dict[str, Any]
 
+# In-flight provider calls, shared by identical concurrent requests when single flight is enabled.
+_provider_flights: SingleFlight = SingleFlight()
+
 # XXX: Needs a better name.
 class Provider(ABC):
     """
@@ -119,27 +125,123 @@ class Provider(ABC):
 
         final_api_call_params = self.translate_to_provider(ell_call)
 
+        cache_key = prompt_cache_key(self, ell_call.client, final_api_call_params)
+        if cache_key and (cached := load_cached_response(cache_key, origin_id, logger)) is not None:
+            return cached, final_api_call_params, {"prompt_cache_hit": True}
+
+        def call_provider():
+            call = self.provider_call_function(ell_call.client, final_api_call_params)
+            assert self.dangerous_disable_validation or _validate_provider_call_params(final_api_call_params, call)
+            
+            
+            provider_resp = call(**final_api_call_params)
+
+            messages, metadata = self.translate_from_provider(
+                provider_resp, ell_call, final_api_call_params, origin_id, logger
+            )
+            assert "choices" not in metadata, "choices should be in the metadata."
+            assert self.dangerous_disable_validation or _validate_messages_are_tracked(messages, origin_id)
+
+            if cache_key:
+                save_response(cache_key, ell_call.model, messages)
+            return messages, metadata, origin_id
+
+        flight_key = single_flight_key(self, ell_call.client, final_api_call_params, cache_key)
+        if flight_key is None:
+            messages, metadata, _ = call_provider()
+        else:
+            (messages, metadata, leader_origin_id), shared = _provider_flights.do(flight_key, call_provider)
+            if shared:
+                messages, metadata = share_response(messages, leader_origin_id, origin_id, logger)
+        return messages, final_api_call_params, metadata
+
+    async def acall(
+        self,
+        ell_call: EllCallParams,
+        origin_id: Optional[str] = None,
+        logger: Optional[Any] = None,
+    ) -> Tuple[List[Message], Dict[str, Any], Metadata]:
+        """
+        Async counterpart of `call`. Async clients (e.g. openai.AsyncOpenAI) are awaited directly on the event loop,
+        sync clients fall back to running `call` in a worker thread so they never block the loop.
+        """
+        assert (
+            not set(ell_call.api_params.keys()).intersection(self.disallowed_api_params())
+        ), f"Disallowed api parameters: {ell_call.api_params}"
+
+        final_api_call_params = self.translate_to_provider(ell_call)
         call = self.provider_call_function(ell_call.client, final_api_call_params)
-        assert self.dangerous_disable_validation or _validate_provider_call_params(final_api_call_params, call)
-        
-        
-        provider_resp = call(**final_api_call_params)
 
-        messages, metadata = self.translate_from_provider(
-            provider_resp, ell_call, final_api_call_params, origin_id, logger
-        )
-        assert "choices" not in metadata, "choices should be in the metadata."
-        assert self.dangerous_disable_validation or _validate_messages_are_tracked(messages, origin_id)
+        if not _is_async_call(call):
+            return await asyncio.to_thread(self.call, ell_call, origin_id, logger)
+
+        cache_key = prompt_cache_key(self, ell_call.client, final_api_call_params)
+        if cache_key and (cached := await asyncio.to_thread(load_cached_response, cache_key, origin_id, logger)) is not None:
+            return cached, final_api_call_params, {"prompt_cache_hit": True}
+
+        async def call_provider():
+            assert self.dangerous_disable_validation or _validate_provider_call_params(final_api_call_params, call)
+
+            provider_resp = await call(**final_api_call_params)
+            # Async streams are drained on the loop so that translate_from_provider can stay synchronous.
+            if hasattr(provider_resp, "__aiter__"):
+                provider_resp = _DrainedStream([chunk async for chunk in provider_resp])
+
+            messages, metadata = self.translate_from_provider(
+                provider_resp, ell_call, final_api_call_params, origin_id, logger
+            )
+            assert "choices" not in metadata, "choices should be in the metadata."
+            assert self.dangerous_disable_validation or _validate_messages_are_tracked(messages, origin_id)
 
+            if cache_key:
+                await asyncio.to_thread(save_response, cache_key, ell_call.model, messages)
+            return messages, metadata, origin_id
+
+        flight_key = single_flight_key(self, ell_call.client, final_api_call_params, cache_key)
+        if flight_key is None:
+            messages, metadata, _ = await call_provider()
+        else:
+            (messages, metadata, leader_origin_id), shared = await _provider_flights.ado(flight_key, call_provider)
+            if shared:
+                messages, metadata = share_response(messages, leader_origin_id, origin_id, logger)
         return messages, final_api_call_params, metadata
 
 
+class _DrainedStream:
+    """A fully consumed async stream that quacks like the sync streams providers already know how to translate."""
+
+    def __init__(self, chunks: List[Any]):
+        self.chunks = chunks
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def _is_async_call(call: Callable[..., Any]) -> bool:
+    # SDK methods are often wrapped by sync decorators (e.g. openai's and anthropic's `required_args`), which hide
+    # that they return coroutines; the function they wrap tells. Calling `call` to find out would run a sync request
+    # on the event loop.
+    return inspect.iscoroutinefunction(call) or inspect.iscoroutinefunction(inspect.unwrap(call))
+
+
 # handhold the the implementer, in production mode we can turn these off for speed.
 @lru_cache(maxsize=None)
 def _call_params(call: Callable[..., Any]) -> MappingProxyType[str, inspect.Parameter]:
     return inspect.signature(call).parameters
 
 
+@lru_cache(maxsize=None)
+def tool_params_schema(params_model: Type[BaseModel]) -> Dict[str, Any]:
+    """The JSON schema of a tool's parameters model, built once per tool rather than on every call that offers it."""
+    return params_model.model_json_schema()
+
+
 def _validate_provider_call_params(
     api_call_params: Dict[str, Any], call: Callable[..., Any]
 ):
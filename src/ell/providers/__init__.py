@@ -1,6 +1,16 @@
-from ell.providers import anthropic, bedrock, groq, openai, google
+"""
+Provider modules register a provider for their client types when imported. ell.configurator imports them the first
+time a client of a matching type is looked up, so a provider's SDK is only loaded if it is used.
+"""
+import importlib
 
 # Disabled providers
 # from ell.providers import mistral, cohere, gemini, elevenlabs, replicate, huggingface
 
 __all__ = ["openai", "groq", "anthropic", "bedrock", "google"]
+
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,5 +1,5 @@
 from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Type, Union, cast
-from ell.provider import  EllCallParams, Metadata, Provider
+from ell.provider import  EllCallParams, Metadata, Provider, tool_params_schema
 from ell.types import Message, ContentBlock, ToolCall, ImageContent
 
 from ell.types._lstr import _lstr
@@ -58,7 +58,7 @@ try:
                     dict(
                         name=tool.__name__,
                         description=tool.__doc__,
-                        input_schema=tool.__ell_params_model__.model_json_schema(),
+                        input_schema=tool_params_schema(tool.__ell_params_model__),
                     )
                     for tool in ell_call.tools
                 ]
@@ -158,6 +158,9 @@ try:
     register_provider(anthropic_provider, anthropic.Anthropic)
     register_provider(anthropic_provider, anthropic.AnthropicBedrock)
     register_provider(anthropic_provider, anthropic.AnthropicVertex)
+    register_provider(anthropic_provider, anthropic.AsyncAnthropic)
+    register_provider(anthropic_provider, anthropic.AsyncAnthropicBedrock)
+    register_provider(anthropic_provider, anthropic.AsyncAnthropicVertex)
 
 except ImportError:
     pass
@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 from collections import defaultdict
 from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union, cast
-from ell.provider import  EllCallParams, Metadata, Provider
+from ell.provider import  EllCallParams, Metadata, Provider, tool_params_schema
 from ell.types import Message, ContentBlock, ToolCall, ImageContent
 from ell.types._lstr import _lstr
 import json
@@ -53,7 +53,7 @@ try:
                             name=tool.__name__,
                             description=tool.__doc__,
                             inputSchema=dict(
-                                json=tool.__ell_params_model__.model_json_schema(),
+                                json=tool_params_schema(tool.__ell_params_model__),
                             )
                         )
                     )
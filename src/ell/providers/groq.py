@@ -22,7 +22,9 @@ try:
             if not meta['usage']:
                 meta['usage'] = meta['x_groq']['usage']
             return res, meta
-    register_provider(GroqProvider(), groq.Client)
+    groq_provider = GroqProvider()
+    register_provider(groq_provider, groq.Client)
+    register_provider(groq_provider, groq.AsyncClient)
 except ImportError:
     pass
 
@@ -3,7 +3,7 @@ from collections import defaultdict
 from typing import Any, Callable, Dict, List, Optional, Tuple, Type, Union, cast
 
 from pydantic import BaseModel
-from ell.provider import  EllCallParams, Metadata, Provider
+from ell.provider import  EllCallParams, Metadata, Provider, tool_params_schema
 from ell.types import Message, ContentBlock, ToolCall
 from ell.types._lstr import _lstr
 import json
@@ -46,7 +46,7 @@ try:
                             function=dict(
                                 name=tool.__name__,
                                 description=tool.__doc__,
-                                parameters=tool.__ell_params_model__.model_json_schema(),  #type: ignore
+                                parameters=tool_params_schema(tool.__ell_params_model__),  #type: ignore
                             )
                         ) for tool in ell_call.tools
                     ]
@@ -166,6 +166,7 @@ try:
     # xx: singleton needed
     openai_provider = OpenAIProvider()
     register_provider(openai_provider, openai.Client)
+    register_provider(openai_provider, openai.AsyncClient)
 except ImportError:
     pass
 
@@ -0,0 +1,264 @@
+"""
+Cache bundles: portable exports of a store's cached invocations.
+
+A store used as a frozen cache (see `Store.freeze`) can otherwise only be shared by copying its whole database and
+blob directory. A bundle holds just what cache lookups need: the invocations they would serve (for each LMP and state
+cache key, the most recent invocation), their contents (params and results) and the LMP rows they belong to, together
+with every LMP those use. Importing a bundle
+into another store warms its cache without repeating the provider calls.
+
+A bundle is a gzipped JSON-lines file. Contents are content-addressed: each distinct contents record is written once
+under the sha256 of its canonical JSON and invocations refer to it by hash, so repeated results cost one record.
+
+    python -m ell.stores.bundle export ./logdir cache.ell.gz --lmp my_lmp --since 2024-10-01
+    python -m ell.stores.bundle import ./other_logdir cache.ell.gz
+"""
+import gzip
+import hashlib
+import json
+import logging
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, func, select
+
+from ell.__version__ import __version__
+from ell.stores.models.core import Invocation, InvocationContents, SerializedLMP, SerializedLMPUses
+from ell.stores.sql import SQLStore
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT_VERSION = 1
+
+# Invocations are exported on their own, so links to their callers are dropped.
+_INVOCATION_FIELDS = ("id", "lmp_id", "latency_ms", "prompt_tokens", "completion_tokens", "state_cache_key", "created_at")
+_IMPORT_BATCH_SIZE = 500
+
+
+@dataclass
+class BundleStats:
+    lmps: int = 0
+    invocations: int = 0
+    contents: int = 0
+    skipped: int = 0
+    digest: Optional[str] = None
+
+
+def _dumps(record: Dict[str, Any]) -> str:
+    return json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _timestamp(value: datetime) -> str:
+    return value.isoformat()
+
+
+def _with_dependencies(session: Session, lmp_ids: Set[str]) -> Dict[str, SerializedLMP]:
+    """The LMPs with the given ids and, transitively, every LMP they use."""
+    lmps: Dict[str, SerializedLMP] = {}
+    frontier = set(lmp_ids)
+    while frontier:
+        found = session.exec(select(SerializedLMP).where(SerializedLMP.lmp_id.in_(frontier))).all()
+        lmps.update((lmp.lmp_id, lmp) for lmp in found)
+        frontier = {used.lmp_id for lmp in found for used in lmp.uses} - lmps.keys()
+    return lmps
+
+
+def export_cache_bundle(
+    store: SQLStore,
+    path: str,
+    lmp_name: Optional[str] = None,
+    lmp_id: Optional[str] = None,
+    version_number: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> BundleStats:
+    """
+    Writes the cached invocations of `store` to a bundle at `path`. Every tracked invocation records its state cache
+    key, but a lookup only ever serves the most recent invocation for a key, so older ones with the same key (and
+    invocations without one) are left out.
+
+    :param lmp_name: Only export invocations of LMPs with this fully qualified name.
+    :param lmp_id: Only export invocations of this LMP version.
+    :param version_number: Only export invocations of this version number (usually together with `lmp_name`).
+    :param since: Only export invocations created at or after this time.
+    :param until: Only export invocations created before this time.
+    :return: Counts of what was exported and the sha256 digest of the bundle's uncompressed records.
+    """
+    store.flush()
+    stats = BundleStats()
+    digest = hashlib.sha256()
+    written_contents: Set[str] = set()
+
+    # Ranked over the whole store: an invocation superseded after `until` is no longer the one a lookup serves.
+    newest = (
+        select(
+            Invocation.id,
+            func.row_number()
+            .over(partition_by=(Invocation.lmp_id, Invocation.state_cache_key), order_by=Invocation.created_at.desc())
+            .label("rank"),
+        )
+        .where(Invocation.state_cache_key.isnot(None))
+        .subquery()
+    )
+    query = select(Invocation).join(SerializedLMP).join(newest, newest.c.id == Invocation.id).where(newest.c.rank == 1)
+    if lmp_name is not None:
+        query = query.where(SerializedLMP.name == lmp_name)
+    if lmp_id is not None:
+        query = query.where(Invocation.lmp_id == lmp_id)
+    if version_number is not None:
+        query = query.where(SerializedLMP.version_number == version_number)
+    if since is not None:
+        query = query.where(Invocation.created_at >= since)
+    if until is not None:
+        query = query.where(Invocation.created_at < until)
+    query = query.options(selectinload(Invocation.contents)).order_by(Invocation.created_at)
+
+    with Session(store.read_engine) as session, gzip.open(path, "wt", encoding="utf-8") as f:
+
+        def write(record: Dict[str, Any]) -> None:
+            line = _dumps(record) + "\n"
+            digest.update(line.encode("utf-8"))
+            f.write(line)
+
+        write(dict(type="header", format=BUNDLE_FORMAT_VERSION, ell_version=__version__))
+
+        invocations = session.exec(query).all()
+        lmps = _with_dependencies(session, {invocation.lmp_id for invocation in invocations})
+        # Dependencies before the LMPs that use them, so an import can link them as it goes.
+        for lmp in sorted(lmps.values(), key=lambda lmp: lmp.created_at):
+            row = lmp.model_dump(exclude={"num_invocations"})
+            row["created_at"] = _timestamp(lmp.created_at)
+            write(dict(type="lmp", row=row, uses=sorted(used.lmp_id for used in lmp.uses)))
+            stats.lmps += 1
+
+        for invocation in invocations:
+            contents = store.load_invocation_contents(invocation)
+            contents_hash = hashlib.sha256(_dumps(contents).encode("utf-8")).hexdigest()
+            if contents_hash not in written_contents:
+                write(dict(type="contents", hash=contents_hash, data=contents))
+                written_contents.add(contents_hash)
+                stats.contents += 1
+            row = {field: getattr(invocation, field) for field in _INVOCATION_FIELDS}
+            row["created_at"] = _timestamp(invocation.created_at)
+            write(dict(type="invocation", row=row, contents=contents_hash))
+            stats.invocations += 1
+
+    stats.digest = digest.hexdigest()
+    logger.info(f"Exported {stats.invocations} invocations of {stats.lmps} LMPs to {path}.")
+    return stats
+
+
+def _read_bundle(path: str) -> Iterator[Dict[str, Any]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("type") != "header" or header.get("format") != BUNDLE_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {BUNDLE_FORMAT_VERSION} cache bundle.")
+        for line in f:
+            yield json.loads(line)
+
+
+def import_cache_bundle(store: SQLStore, path: str) -> BundleStats:
+    """
+    Writes the LMPs and invocations of the bundle at `path` into `store`. Rows the store already has are skipped,
+    so importing the same bundle twice is harmless.
+    """
+    store.flush()
+    stats = BundleStats()
+    contents_by_hash: Dict[str, Dict[str, Any]] = {}
+    batch: List[Dict[str, Any]] = []
+
+    def flush_batch() -> None:
+        with Session(store.engine) as session:
+            existing = set(session.exec(select(Invocation.id).where(Invocation.id.in_([row["id"] for row in batch]))).all())
+        invocations: List[Tuple[Invocation, Set[str]]] = []
+        for row in batch:
+            if row["id"] in existing:
+                stats.skipped += 1
+                continue
+            invocations.append((_invocation(store, row, contents_by_hash[row.pop("contents")]), set()))
+        stats.invocations += store.write_invocations(invocations)
+        batch.clear()
+
+    for record in _read_bundle(path):
+        if record["type"] == "lmp":
+            stats.lmps += _import_lmp(store, record["row"], record["uses"])
+        elif record["type"] == "contents":
+            contents_by_hash[record["hash"]] = record["data"]
+            stats.contents += 1
+        elif record["type"] == "invocation":
+            batch.append(dict(record["row"], contents=record["contents"]))
+            if len(batch) >= _IMPORT_BATCH_SIZE:
+                flush_batch()
+    if batch:
+        flush_batch()
+
+    # Memoized lookups predate the imported invocations.
+    if store.cache_memo is not None:
+        store.cache_memo.clear()
+    logger.info(f"Imported {stats.invocations} invocations of {stats.lmps} LMPs from {path} ({stats.skipped} already present).")
+    return stats
+
+
+def _import_lmp(store: SQLStore, row: Dict[str, Any], uses: List[str]) -> int:
+    with Session(store.engine) as session:
+        if session.get(SerializedLMP, row["lmp_id"]) is not None:
+            return 0
+        session.add(SerializedLMP(**dict(row, created_at=datetime.fromisoformat(row["created_at"]), num_invocations=0)))
+        for used_id in uses:
+            if session.get(SerializedLMP, used_id) is not None:
+                session.add(SerializedLMPUses(lmp_user_id=used_id, lmp_using_id=row["lmp_id"]))
+        session.commit()
+    return 1
+
+
+def _invocation(store: SQLStore, row: Dict[str, Any], data: Dict[str, Any]) -> Invocation:
+    contents = InvocationContents(invocation_id=row["id"], **data)
+    # Same rule as tracked invocations: large contents go to the blob store when there is one.
+    if contents.should_externalize and store.has_blob_storage:
+        store.blob_store.store_blob(json.dumps(contents.model_dump(), default=str, ensure_ascii=False).encode("utf-8"), row["id"])
+        contents = InvocationContents(invocation_id=row["id"], is_external=True)
+    return Invocation(**dict(row, created_at=datetime.fromisoformat(row["created_at"])), contents=contents)
+
+
+def _open_store(location: str) -> SQLStore:
+    from ell.stores.sql import PostgresStore, SQLiteStore
+
+    if location.startswith("postgresql://"):
+        return PostgresStore(location)
+    return SQLiteStore(location)
+
+
+def main():
+    parser = ArgumentParser(description="Export and import ell cache bundles")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export cached invocations from a store to a bundle")
+    export_parser.add_argument("store", help="Storage directory or PostgreSQL connection string")
+    export_parser.add_argument("bundle", help="Path of the bundle to write")
+    export_parser.add_argument("--lmp", default=None, help="Only export this LMP (fully qualified name)")
+    export_parser.add_argument("--lmp-id", default=None, help="Only export this LMP version")
+    export_parser.add_argument("--version", type=int, default=None, help="Only export this version number")
+    export_parser.add_argument("--since", type=datetime.fromisoformat, default=None, help="ISO date or time (inclusive)")
+    export_parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="ISO date or time (exclusive)")
+
+    import_parser = subparsers.add_parser("import", help="Import a bundle into a store")
+    import_parser.add_argument("store", help="Storage directory or PostgreSQL connection string")
+    import_parser.add_argument("bundle", help="Path of the bundle to read")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = _open_store(args.store)
+    if args.command == "export":
+        stats = export_cache_bundle(
+            store, args.bundle, lmp_name=args.lmp, lmp_id=args.lmp_id, version_number=args.version, since=args.since, until=args.until
+        )
+        print(f"sha256 {stats.digest}")
+    else:
+        import_cache_bundle(store, args.bundle)
+
+
+if __name__ == "__main__":
+    main()
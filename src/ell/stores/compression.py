@@ -0,0 +1,177 @@
+"""
+Compressed invocation contents.
+
+Results and other inline JSON fields of invocation contents compress well, largely because they repeat the same
+keys, roles and boilerplate across invocations. With `SQLStore(..., compress_contents=True)` the inline JSON fields of
+a contents row whose JSON is at least `compression_threshold` characters are compressed together into its
+`compressed` column and left NULL. Loaded contents keep them compressed until one of those fields is first read; the
+read decompresses them all at once.
+
+Compression uses a dictionary trained from the store's own payloads (`SQLStore.train_compression_dictionary`), so
+even small rows compress well. With the `zstandard` package installed the codec is zstd with a trained zstd
+dictionary; otherwise it is zlib with a preset dictionary built from the substrings the payloads share most.
+Dictionaries are stored in the database and addressed by hash, so every row stays readable after retraining.
+"""
+import hashlib
+import json
+import re
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import ATTR_WAS_SET, PASSIVE_NO_RESULT, SQL_OK, instance_state, set_committed_value
+
+from ell.stores.memo import MemoCache
+from ell.stores.models.core import CompressionDictionary, InvocationContents
+from ell.stores.store import INVOCATION_CONTENTS_FIELDS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# MAGIC, one codec byte, then the dictionary id (or zeros), then the compressed JSON.
+_MAGIC = b"ELC1"
+_NO_DICTIONARY = "0" * 16
+ZLIB, ZSTD = "z", "s"
+
+_dictionary_memo: MemoCache[bytes] = MemoCache(64)
+
+
+def default_codec() -> str:
+    return ZSTD if zstandard is not None else ZLIB
+
+
+def dictionary_id(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def _zlib_dictionary(samples: Sequence[bytes], size: int) -> bytes:
+    # Score the JSON keys and short strings the samples share by how many bytes they would save.
+    counts: Counter = Counter()
+    for sample in samples:
+        counts.update(set(re.findall(rb'"(?:[^"\\]|\\.){1,64}"(?:\s*:\s*)?', sample)))
+    common = [(count * len(token), token) for token, count in counts.items() if count > 1]
+    dictionary = b""
+    # zlib matches against the end of the dictionary most cheaply, so the best substrings go last.
+    for _, token in sorted(common, reverse=True):
+        if len(dictionary) + len(token) > size:
+            break
+        dictionary = token + dictionary
+    return dictionary
+
+
+def train_dictionary(samples: Sequence[bytes], size: int = 32 * 1024, codec: Optional[str] = None) -> bytes:
+    """A compression dictionary of at most `size` bytes for payloads like `samples`."""
+    codec = codec or default_codec()
+    if codec == ZSTD:
+        return zstandard.train_dictionary(size, list(samples)).as_bytes()
+    return _zlib_dictionary(samples, min(size, 32 * 1024))
+
+
+class Compressor:
+    """Compresses payloads with one codec and (optionally) one dictionary."""
+
+    def __init__(self, codec: Optional[str] = None, dictionary: Optional[bytes] = None):
+        self.codec = codec or default_codec()
+        self.dictionary = dictionary
+        self.dictionary_id = dictionary_id(dictionary) if dictionary else _NO_DICTIONARY
+        if self.codec == ZSTD:
+            if zstandard is None:
+                raise ImportError("Compressing with zstd requires the zstandard package: `pip install zstandard`.")
+            self._zstd = zstandard.ZstdCompressor(
+                level=3, dict_data=zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            )
+
+    def compress(self, data: bytes) -> bytes:
+        if self.codec == ZSTD:
+            payload = self._zstd.compress(data)
+        else:
+            compressor = zlib.compressobj(6, zdict=self.dictionary) if self.dictionary else zlib.compressobj(6)
+            payload = compressor.compress(data) + compressor.flush()
+        return _MAGIC + self.codec.encode() + self.dictionary_id.encode() + payload
+
+
+def decompress(blob: bytes, dictionary: Optional[bytes]) -> bytes:
+    codec, payload = blob[4:5].decode(), blob[21:]
+    if codec == ZSTD:
+        if zstandard is None:
+            raise ImportError("These contents were compressed with zstd; reading them requires `pip install zstandard`.")
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(payload) + decompressor.flush()
+
+
+def blob_dictionary_id(blob: bytes) -> Optional[str]:
+    assert blob[:4] == _MAGIC, "Not a compressed contents payload."
+    dict_id = blob[5:21].decode()
+    return None if dict_id == _NO_DICTIONARY else dict_id
+
+
+def contents_payload(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: row[field] for field in INVOCATION_CONTENTS_FIELDS if row.get(field) is not None}
+
+
+def compress_contents_rows(rows: List[Dict[str, Any]], compressor: Compressor, threshold: int) -> None:
+    """Compresses the inline JSON fields of contents rows into their `compressed` column, in place."""
+    from ell.stores.fragments import canonical_json
+
+    for row in rows:
+        payload = contents_payload(row)
+        if not payload:
+            continue
+        data = canonical_json(payload)
+        if len(data) < threshold:
+            continue
+        row["compressed"] = compressor.compress(data.encode("utf-8"))
+        for field in payload:
+            row[field] = None
+
+
+def load_dictionary(session: Session, dict_id: str) -> bytes:
+    data = _dictionary_memo.get(dict_id)
+    if data is None:
+        data = session.connection().execute(
+            select(CompressionDictionary.data).where(CompressionDictionary.dictionary_id == dict_id)
+        ).scalar()
+        if data is None:
+            raise LookupError(f"Compression dictionary {dict_id} is missing from the store.")
+        _dictionary_memo.put(dict_id, data)
+    return data
+
+
+def _decompressing_loader(fields: List[str], bind: Any) -> Callable[[Any, Any], Any]:
+    def load(state: Any, passive: Any) -> Any:
+        if not passive & SQL_OK:
+            return PASSIVE_NO_RESULT
+        target = state.obj()
+        dict_id = blob_dictionary_id(target.compressed)
+        dictionary = None
+        if dict_id:
+            # The contents may be read after their session closed, e.g. cached invocations.
+            with Session(bind) as session:
+                dictionary = load_dictionary(session, dict_id)
+        data = json.loads(decompress(target.compressed, dictionary))
+        for field in fields:
+            set_committed_value(target, field, data.get(field))
+        return ATTR_WAS_SET
+
+    return load
+
+
+@event.listens_for(InvocationContents, "load")
+def _defer_decompression(target: InvocationContents, context: Any) -> None:
+    if target.compressed is None:
+        return
+    # Leave the NULL columns unloaded, like deferred columns, so the first read of any of them decompresses the row.
+    state = instance_state(target)
+    fields = [field for field in INVOCATION_CONTENTS_FIELDS if state.dict.get(field) is None]
+    load = _decompressing_loader(fields, context.session.get_bind(InvocationContents))
+    if "callables" not in state.__dict__:
+        state.callables = {}
+    for field in fields:
+        state.dict.pop(field, None)
+        state.callables[field] = load
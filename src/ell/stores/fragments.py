@@ -0,0 +1,143 @@
+"""
+Content-addressed storage of invocation contents.
+
+The params, api params, globals and free variables of invocations are mostly identical across the thousands of
+calls of an evaluation or a batch job. When contents are written, each of those values whose JSON is at least
+`MIN_FRAGMENT_SIZE` characters is stored once as a `ContentFragment` under the sha256 of its canonical JSON, and the
+contents row only keeps the hash. Contents loaded through the ORM get the values back transparently. Fragments never
+change, so their JSON is memoized in process. Deleting contents (evicting cached invocations) prunes the fragments
+no remaining contents refer to.
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Sequence, Set
+
+from sqlalchemy import delete, event, insert, select, text, union
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ell.stores.memo import MemoCache
+from ell.stores.models.core import ContentFragment, InvocationContents
+from ell.util.serialization import pydantic_ltype_aware_cattr
+
+logger = logging.getLogger(__name__)
+
+DEDUPLICATED_FIELDS = ("params", "invocation_api_params", "global_vars", "free_vars")
+# Below this a hash (64 characters) saves nothing.
+MIN_FRAGMENT_SIZE = 128
+
+_fragment_memo: MemoCache[str] = MemoCache(4096)
+
+
+def canonical_json(value: Any) -> str:
+    """The JSON a JSON column would store for `value`."""
+    return json.dumps(pydantic_ltype_aware_cattr.unstructure(value), sort_keys=True, default=repr, ensure_ascii=False)
+
+
+def fragment_hash(data: str) -> str:
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def deduplicate_contents_rows(rows: Iterable[Dict[str, Any]]) -> Dict[str, str]:
+    """Moves the large deduplicated fields of contents rows into fragments, in place. Returns the fragments by hash."""
+    fragments: Dict[str, str] = {}
+    for row in rows:
+        for field in DEDUPLICATED_FIELDS:
+            if row.get(field) is None:
+                continue
+            data = canonical_json(row[field])
+            if len(data) < MIN_FRAGMENT_SIZE:
+                continue
+            content_hash = fragment_hash(data)
+            fragments[content_hash] = data
+            row[field] = None
+            row[f"{field}_hash"] = content_hash
+    return fragments
+
+
+def insert_fragments(session: Session, fragments: Dict[str, str]) -> None:
+    """Inserts the fragments the database doesn't have yet."""
+    if not fragments:
+        return
+    rows = [dict(content_hash=content_hash, data=data) for content_hash, data in fragments.items()]
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        # Concurrent writers may insert the same fragment; either copy will do.
+        session.execute(dialect_insert(ContentFragment).on_conflict_do_nothing(index_elements=["content_hash"]), rows)
+        return
+    existing = set(
+        session.execute(select(ContentFragment.content_hash).where(ContentFragment.content_hash.in_(fragments))).scalars()
+    )
+    rows = [row for row in rows if row["content_hash"] not in existing]
+    if rows:
+        session.execute(insert(ContentFragment), rows)
+
+
+def fragment_hashes(session: Session, invocation_ids: Sequence[str]) -> Set[str]:
+    """The hashes of the fragments the contents of the given invocations refer to."""
+    hash_columns = [getattr(InvocationContents, f"{field}_hash") for field in DEDUPLICATED_FIELDS]
+    rows = session.execute(select(*hash_columns).where(InvocationContents.invocation_id.in_(invocation_ids)))
+    return {content_hash for row in rows for content_hash in row if content_hash is not None}
+
+
+def prune_fragments(session: Session, content_hashes: Iterable[str]) -> int:
+    """Deletes those of the given fragments that no contents row refers to. Returns the number deleted."""
+    content_hashes = list(content_hashes)
+    if not content_hashes:
+        return 0
+    if session.get_bind().dialect.name == "postgresql":
+        # Writers insert a row's fragments before the row. Waiting for every writer that inserted fragments (and
+        # holding new ones off) means a row that refers to one of these fragments is either visible to the delete
+        # or is written afterwards, together with its fragments.
+        session.execute(text(f"LOCK TABLE {ContentFragment.__tablename__} IN SHARE ROW EXCLUSIVE MODE"))
+    hash_columns = [getattr(InvocationContents, f"{field}_hash") for field in DEDUPLICATED_FIELDS]
+    referenced = union(*(select(column).where(column.in_(content_hashes)) for column in hash_columns))
+    return session.execute(
+        delete(ContentFragment).where(
+            ContentFragment.content_hash.in_(content_hashes), ContentFragment.content_hash.not_in(referenced)
+        )
+    ).rowcount
+
+
+def load_fragments(session: Session, hashes: Iterable[str]) -> Dict[str, str]:
+    """The JSON of the fragments with the given hashes."""
+    found: Dict[str, str] = {}
+    missing: List[str] = []
+    for content_hash in set(hashes):
+        data = _fragment_memo.get(content_hash)
+        if data is None:
+            missing.append(content_hash)
+        else:
+            found[content_hash] = data
+    if missing:
+        # Core select on the session's connection, so loading never triggers an autoflush.
+        rows = session.connection().execute(
+            select(ContentFragment.content_hash, ContentFragment.data).where(ContentFragment.content_hash.in_(missing))
+        )
+        for content_hash, data in rows:
+            _fragment_memo.put(content_hash, data)
+            found[content_hash] = data
+    return found
+
+
+@event.listens_for(InvocationContents, "load")
+def _restore_fragments(target: InvocationContents, context: Any) -> None:
+    hashes = {
+        field: content_hash
+        for field in DEDUPLICATED_FIELDS
+        if (content_hash := getattr(target, f"{field}_hash")) is not None
+    }
+    if not hashes:
+        return
+    fragments = load_fragments(context.session, hashes.values())
+    for field, content_hash in hashes.items():
+        if content_hash not in fragments:
+            logger.warning(f"Missing content fragment {content_hash} for {field} of invocation {target.invocation_id}.")
+            continue
+        # Committed, so restoring a field never marks the contents as modified.
+        set_committed_value(target, field, json.loads(fragments[content_hash]))
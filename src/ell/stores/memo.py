@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+@dataclass
+class MemoStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class MemoCache(Generic[V]):
+    """
+    A bounded, thread-safe in-memory cache that stores use in front of slower lookups.
+
+    Holds at most `max_size` entries and evicts the least recently used one when full. With `ttl` set, entries
+    expire `ttl` seconds after they were stored.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        assert max_size > 0, "max_size must be positive."
+        assert ttl is None or ttl > 0, "ttl must be positive."
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = MemoStats()
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[Optional[float], V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """The value stored under `key`, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: V) -> None:
+        with self._lock:
+            expires_at = self._clock() + self.ttl if self.ttl is not None else None
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
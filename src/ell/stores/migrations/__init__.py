@@ -15,7 +15,8 @@ def get_alembic_config(engine_url: str) -> Config:
     migrations_dir = Path(__file__).parent
     
     alembic_cfg.set_main_option("script_location", str(migrations_dir))
-    alembic_cfg.set_main_option("sqlalchemy.url", str(engine_url))
+    # Config values are interpolated, so a literal % (e.g. in a percent-encoded path) has to be doubled.
+    alembic_cfg.set_main_option("sqlalchemy.url", str(engine_url).replace("%", "%%"))
     alembic_cfg.set_main_option("version_table", "ell_alembic_version")
     alembic_cfg.set_main_option("timezone", "UTC")
     
@@ -0,0 +1,27 @@
+"""invocation keyset index
+
+Indexes invocations by (created_at, id), the key listings are ordered and paginated by (see ell.stores.pagination).
+
+Revision ID: 2f7d3b9e6a41
+Revises: 9e4a7c2d5f18
+Create Date: 2026-10-17 20:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2f7d3b9e6a41'
+down_revision: Union[str, None] = '9e4a7c2d5f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_invocation_created_at_id', 'invocation', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_invocation_created_at_id', table_name='invocation')
@@ -0,0 +1,36 @@
+"""prompt cache
+
+Revision ID: 3c1e9b7f2a54
+Revises: f6528d04bbbd
+Create Date: 2026-10-17 12:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import ell.stores.models.core
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c1e9b7f2a54'
+down_revision: Union[str, None] = 'f6528d04bbbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('promptcacheentry',
+    sa.Column('prompt_cache_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('model', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('messages', sa.JSON(), nullable=False),
+    sa.Column('created_at', ell.stores.models.core.UTCTimestamp(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('prompt_cache_key')
+    )
+    op.create_index(op.f('ix_promptcacheentry_model'), 'promptcacheentry', ['model'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_promptcacheentry_model'), table_name='promptcacheentry')
+    op.drop_table('promptcacheentry')
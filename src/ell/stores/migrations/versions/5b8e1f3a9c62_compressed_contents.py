@@ -0,0 +1,70 @@
+"""compressed contents
+
+The downgrade decodes compressed contents with a copy of the payload format of ell.stores.compression, so later
+changes to that module don't change what this migration does.
+
+Revision ID: 5b8e1f3a9c62
+Revises: 8d2f4a6c1b37
+Create Date: 2026-10-17 16:00:00.000000+00:00
+
+"""
+import json
+import zlib
+from typing import Dict, Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import ell.stores.models.core
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e1f3a9c62'
+down_revision: Union[str, None] = '8d2f4a6c1b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_CONTENTS_FIELDS = ('params', 'results', 'invocation_api_params', 'global_vars', 'free_vars')
+
+
+def _decompress(blob: bytes, dictionaries: Dict[str, bytes]) -> bytes:
+    # b'ELC1', one codec byte ('z' zlib, 's' zstd), a 16 character dictionary id ('0' * 16 for none), the payload.
+    assert blob[:4] == b'ELC1', 'Not a compressed contents payload.'
+    codec, dict_id, payload = blob[4:5], blob[5:21].decode(), blob[21:]
+    dictionary: Optional[bytes] = None if dict_id == '0' * 16 else dictionaries[dict_id]
+    if codec == b's':
+        import zstandard
+
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(payload) + decompressor.flush()
+
+
+def upgrade() -> None:
+    op.create_table('compressiondictionary',
+    sa.Column('dictionary_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('codec', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', ell.stores.models.core.UTCTimestamp(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('dictionary_id')
+    )
+    with op.batch_alter_table('invocationcontents') as batch_op:
+        batch_op.add_column(sa.Column('compressed', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    # Write compressed contents back to their JSON columns first.
+    connection = op.get_bind()
+    contents = sa.table('invocationcontents', sa.column('invocation_id', sa.String), sa.column('compressed', sa.LargeBinary),
+                        *(sa.column(field, sa.JSON) for field in _CONTENTS_FIELDS))
+    dictionaries = dict(connection.execute(sa.text('SELECT dictionary_id, data FROM compressiondictionary')).all())
+    for invocation_id, blob in connection.execute(
+        sa.select(contents.c.invocation_id, contents.c.compressed).where(contents.c.compressed.isnot(None))
+    ).all():
+        fields = json.loads(_decompress(blob, dictionaries))
+        connection.execute(contents.update().where(contents.c.invocation_id == invocation_id).values(**fields))
+
+    with op.batch_alter_table('invocationcontents') as batch_op:
+        batch_op.drop_column('compressed')
+    op.drop_table('compressiondictionary')
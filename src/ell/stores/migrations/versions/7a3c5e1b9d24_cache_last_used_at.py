@@ -0,0 +1,34 @@
+"""cache last used at
+
+Records when a cache tier last stored or served a cached invocation or prompt cache entry, so bounded tiers evict
+and expire entries by their last use rather than by when they were first created (see ell.stores.tiered).
+
+Revision ID: 7a3c5e1b9d24
+Revises: 2f7d3b9e6a41
+Create Date: 2026-10-18 09:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import ell.stores.models.core
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3c5e1b9d24'
+down_revision: Union[str, None] = '2f7d3b9e6a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('invocation', sa.Column('last_used_at', ell.stores.models.core.UTCTimestamp(timezone=True), nullable=True))
+    op.add_column('promptcacheentry', sa.Column('last_used_at', ell.stores.models.core.UTCTimestamp(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('promptcacheentry') as batch_op:
+        batch_op.drop_column('last_used_at')
+    with op.batch_alter_table('invocation') as batch_op:
+        batch_op.drop_column('last_used_at')
@@ -0,0 +1,118 @@
+"""content fragments
+
+Moves the params, api params, globals and free variables of existing invocation contents into content-addressed
+fragments (see ell.stores.fragments). On SQLite the file only shrinks after a VACUUM.
+
+The field list, size threshold and hashing are copied here rather than imported, so later changes to
+ell.stores.fragments don't change what this migration does.
+
+Revision ID: 8d2f4a6c1b37
+Revises: 3c1e9b7f2a54
+Create Date: 2026-10-17 14:00:00.000000+00:00
+
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2f4a6c1b37'
+down_revision: Union[str, None] = '3c1e9b7f2a54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+_BATCH_SIZE = 1000
+DEDUPLICATED_FIELDS = ('params', 'invocation_api_params', 'global_vars', 'free_vars')
+_MIN_FRAGMENT_SIZE = 128
+
+_contents = sa.table(
+    'invocationcontents',
+    sa.column('invocation_id', sa.String),
+    *(sa.column(field, sa.JSON) for field in DEDUPLICATED_FIELDS),
+    *(sa.column(f'{field}_hash', sa.String) for field in DEDUPLICATED_FIELDS),
+)
+_fragments = sa.table('contentfragment', sa.column('content_hash', sa.String), sa.column('data', sa.Text))
+
+
+def _deduplicate_contents_rows(rows: List[Dict[str, Any]]) -> Dict[str, str]:
+    # The values come straight from JSON columns, so their canonical JSON needs no unstructuring.
+    fragments: Dict[str, str] = {}
+    for row in rows:
+        for field in DEDUPLICATED_FIELDS:
+            if row.get(field) is None:
+                continue
+            data = json.dumps(row[field], sort_keys=True, default=repr, ensure_ascii=False)
+            if len(data) < _MIN_FRAGMENT_SIZE:
+                continue
+            content_hash = hashlib.sha256(data.encode('utf-8')).hexdigest()
+            fragments[content_hash] = data
+            row[field] = None
+            row[f'{field}_hash'] = content_hash
+    return fragments
+
+
+def upgrade() -> None:
+    op.create_table('contentfragment',
+    sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    with op.batch_alter_table('invocationcontents') as batch_op:
+        for field in DEDUPLICATED_FIELDS:
+            batch_op.add_column(sa.Column(f'{field}_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+    connection = op.get_bind()
+    last_id = ''
+    while True:
+        rows = connection.execute(
+            sa.select(_contents.c.invocation_id, *(_contents.c[field] for field in DEDUPLICATED_FIELDS))
+            .where(_contents.c.invocation_id > last_id)
+            .order_by(_contents.c.invocation_id)
+            .limit(_BATCH_SIZE)
+        ).mappings().all()
+        if not rows:
+            break
+        last_id = rows[-1]['invocation_id']
+
+        rows = [dict(row) for row in rows]
+        fragments = _deduplicate_contents_rows(rows)
+        if not fragments:
+            continue
+        known = set(connection.execute(
+            sa.select(_fragments.c.content_hash).where(_fragments.c.content_hash.in_(fragments))
+        ).scalars())
+        new = [dict(content_hash=h, data=data) for h, data in fragments.items() if h not in known]
+        if new:
+            connection.execute(_fragments.insert(), new)
+        for row in rows:
+            moved = {field: row[f'{field}_hash'] for field in DEDUPLICATED_FIELDS if row.get(f'{field}_hash')}
+            if moved:
+                connection.execute(
+                    _contents.update()
+                    .where(_contents.c.invocation_id == row['invocation_id'])
+                    .values(**{f'{field}_hash': h for field, h in moved.items()}, **{field: sa.null() for field in moved})
+                )
+
+
+def downgrade() -> None:
+    connection = op.get_bind()
+    for field in DEDUPLICATED_FIELDS:
+        hash_column = _contents.c[f'{field}_hash']
+        rows = connection.execute(
+            sa.select(_contents.c.invocation_id, _fragments.c.data)
+            .join(_fragments, _fragments.c.content_hash == hash_column)
+        ).all()
+        for invocation_id, data in rows:
+            connection.execute(
+                _contents.update().where(_contents.c.invocation_id == invocation_id).values(**{field: json.loads(data)})
+            )
+
+    with op.batch_alter_table('invocationcontents') as batch_op:
+        for field in DEDUPLICATED_FIELDS:
+            batch_op.drop_column(f'{field}_hash')
+    op.drop_table('contentfragment')
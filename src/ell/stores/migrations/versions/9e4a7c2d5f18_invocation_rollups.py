@@ -0,0 +1,81 @@
+"""invocation rollups
+
+Adds the hourly per-LMP invocation rollups (see ell.stores.rollups) and computes them from the existing invocations.
+The histogram buckets and the backfill query are copied here rather than imported, so later changes to
+ell.stores.rollups don't change what this migration does.
+
+Revision ID: 9e4a7c2d5f18
+Revises: 5b8e1f3a9c62
+Create Date: 2026-10-17 18:00:00.000000+00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+import ell.stores.models.core
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e4a7c2d5f18'
+down_revision: Union[str, None] = '5b8e1f3a9c62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Upper bounds (inclusive) of the latency histogram buckets; the last bucket holds everything slower.
+_LATENCY_BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+HISTOGRAM_FIELDS = tuple(f'latency_hist_{i}' for i in range(len(_LATENCY_BUCKET_BOUNDS_MS) + 1))
+_SUM_FIELDS = ('count', 'prompt_tokens', 'completion_tokens', 'latency_ms_sum') + HISTOGRAM_FIELDS
+
+
+def _backfill_rollups(connection: sa.Connection) -> None:
+    invocation = sa.table(
+        'invocation',
+        sa.column('lmp_id', sa.String),
+        sa.column('created_at', ell.stores.models.core.UTCTimestamp(timezone=True)),
+        sa.column('latency_ms', sa.Float),
+        sa.column('prompt_tokens', sa.Integer),
+        sa.column('completion_tokens', sa.Integer),
+    )
+    rollup = sa.table('invocationrollup', sa.column('lmp_id'), sa.column('bucket_start'), *(sa.column(f) for f in _SUM_FIELDS))
+    if connection.dialect.name == 'sqlite':
+        # SQLAlchemy's SQLite datetime format, so backfilled buckets equal incrementally written ones.
+        bucket_start = sa.func.strftime('%Y-%m-%d %H:00:00.000000', invocation.c.created_at)
+    else:
+        bucket_start = sa.func.date_trunc('hour', invocation.c.created_at)
+    latency_ms = sa.func.coalesce(invocation.c.latency_ms, 0)
+    bucket_index = sa.case(
+        *((latency_ms <= bound, i) for i, bound in enumerate(_LATENCY_BUCKET_BOUNDS_MS)),
+        else_=len(_LATENCY_BUCKET_BOUNDS_MS),
+    )
+    aggregates = sa.select(
+        invocation.c.lmp_id,
+        bucket_start,
+        sa.func.count(),
+        sa.func.sum(sa.func.coalesce(invocation.c.prompt_tokens, 0)),
+        sa.func.sum(sa.func.coalesce(invocation.c.completion_tokens, 0)),
+        sa.func.sum(latency_ms),
+        *(sa.func.sum(sa.case((bucket_index == i, 1), else_=0)) for i in range(len(HISTOGRAM_FIELDS))),
+    ).group_by(invocation.c.lmp_id, bucket_start)
+    connection.execute(rollup.insert().from_select(['lmp_id', 'bucket_start', *_SUM_FIELDS], aggregates))
+
+
+def upgrade() -> None:
+    op.create_table('invocationrollup',
+    sa.Column('lmp_id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('bucket_start', ell.stores.models.core.UTCTimestamp(timezone=True), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('latency_ms_sum', sa.Float(), nullable=False),
+    *(sa.Column(field, sa.Integer(), nullable=False) for field in HISTOGRAM_FIELDS),
+    sa.PrimaryKeyConstraint('lmp_id', 'bucket_start')
+    )
+    op.create_index(op.f('ix_invocationrollup_bucket_start'), 'invocationrollup', ['bucket_start'], unique=False)
+    _backfill_rollups(op.get_bind())
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_invocationrollup_bucket_start'), table_name='invocationrollup')
+    op.drop_table('invocationrollup')
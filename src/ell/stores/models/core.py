@@ -18,7 +18,7 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import Any, List, Optional
 from sqlmodel import Field, SQLModel, Relationship, JSON, Column
-from sqlalchemy import Index, func
+from sqlalchemy import Index, LargeBinary, Text, func
 
 
 from typing import  Any
@@ -171,9 +171,67 @@ class InvocationContentsBase(ExternalizeableModel):
 
 
 class InvocationContents(InvocationContentsBase, table=True):
+    # Deduplicated fields are stored as ContentFragments and left NULL here (see ell.stores.fragments).
+    params_hash: Optional[str] = Field(default=None)
+    invocation_api_params_hash: Optional[str] = Field(default=None)
+    global_vars_hash: Optional[str] = Field(default=None)
+    free_vars_hash: Optional[str] = Field(default=None)
+    # The remaining JSON fields, compressed together (see ell.stores.compression); they are then NULL.
+    compressed: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
+
     invocation: "Invocation" = Relationship(back_populates="contents")
 
 
+class ContentFragment(SQLModel, table=True):
+    """
+    A JSON value that many invocations' contents share (their params, api params or variables), stored once under
+    the sha256 of its canonical JSON.
+    """
+    content_hash: str = Field(primary_key=True)
+    data: str = Field(sa_column=Column(Text, nullable=False))
+
+
+class CompressionDictionary(SQLModel, table=True):
+    """
+    A dictionary trained from a store's payloads to compress invocation contents, addressed by its hash.
+    """
+    dictionary_id: str = Field(primary_key=True)
+    codec: str
+    data: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+    created_at: datetime = UTCTimestampField(default=func.now(), nullable=False)
+
+
+class InvocationRollup(SQLModel, table=True):
+    """
+    Invocation statistics of one LMP version over one hour, kept up to date as invocations are written (see
+    ell.stores.rollups). `latency_hist_i` counts the invocations whose latency falls in the i-th bucket of
+    `ell.stores.rollups.LATENCY_BUCKET_BOUNDS_MS`.
+    """
+    lmp_id: str = Field(primary_key=True)
+    bucket_start: datetime = Field(sa_column=Column(UTCTimestamp(timezone=True), primary_key=True, index=True))
+    count: int = Field(default=0)
+    prompt_tokens: int = Field(default=0)
+    completion_tokens: int = Field(default=0)
+    latency_ms_sum: float = Field(default=0.0)
+    latency_hist_0: int = Field(default=0)
+    latency_hist_1: int = Field(default=0)
+    latency_hist_2: int = Field(default=0)
+    latency_hist_3: int = Field(default=0)
+    latency_hist_4: int = Field(default=0)
+    latency_hist_5: int = Field(default=0)
+    latency_hist_6: int = Field(default=0)
+    latency_hist_7: int = Field(default=0)
+    latency_hist_8: int = Field(default=0)
+    latency_hist_9: int = Field(default=0)
+    latency_hist_10: int = Field(default=0)
+    latency_hist_11: int = Field(default=0)
+    latency_hist_12: int = Field(default=0)
+    latency_hist_13: int = Field(default=0)
+    latency_hist_14: int = Field(default=0)
+    latency_hist_15: int = Field(default=0)
+    latency_hist_16: int = Field(default=0)
+
+
 class Invocation(InvocationBase, table=True):
     lmp: SerializedLMP = Relationship(back_populates="invocations")
     consumed_by: List["Invocation"] = Relationship(
@@ -197,8 +255,11 @@ class Invocation(InvocationBase, table=True):
     )
     uses: List["Invocation"] = Relationship(back_populates="used_by")
     contents: InvocationContents = Relationship(back_populates="invocation")
+    # When a cache tier last stored or served this invocation (see ell.stores.tiered); None if none has.
+    last_used_at: Optional[datetime] = UTCTimestampField(nullable=True)
     __table_args__ = (
         Index("ix_invocation_lmp_id_created_at", "lmp_id", "created_at"),
+        Index("ix_invocation_created_at_id", "created_at", "id"),
         Index("ix_invocation_created_at_latency_ms", "created_at", "latency_ms"),
         Index(
             "ix_invocation_created_at_tokens",
@@ -208,3 +269,17 @@ class Invocation(InvocationBase, table=True):
         ),
     )
     evaluation_result_datapoints: List["EvaluationResultDatapoint"] = Relationship(back_populates="invocation_being_labeled")
+
+
+class PromptCacheEntry(SQLModel, table=True):
+    """
+    A text-only provider response cached by the request that produced it, so that any LMP version that sends the
+    same request can reuse it (see ell.util.prompt_cache).
+    """
+    prompt_cache_key: str = Field(primary_key=True)
+    model: str = Field(index=True)
+    # [{"role": ..., "text": [one string per content block]}, ...]
+    messages: List[Dict[str, Any]] = Field(sa_column=Column(JSON, nullable=False))
+    created_at: datetime = UTCTimestampField(default=func.now(), nullable=False)
+    # When a cache tier last stored or served this entry (see ell.stores.tiered); None if none has.
+    last_used_at: Optional[datetime] = UTCTimestampField(nullable=True)
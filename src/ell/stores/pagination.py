@@ -0,0 +1,51 @@
+"""
+Keyset pagination.
+
+Listing queries order rows by a unique key (e.g. `(created_at, id)`) and take a `cursor`: an opaque
+token naming the last row of the previous page. The next page is the rows strictly after that key, which an index on
+the key finds directly, so every page costs the same however deep it is (unlike `OFFSET`, which reads and discards
+every earlier row).
+
+    page = store.get_invocations(session, lmp_filters={}, limit=100)
+    while page:
+        ...
+        page = store.get_invocations(session, lmp_filters={}, limit=100, cursor=next_cursor(page, "created_at", "id"))
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Sequence, Tuple
+
+from sqlalchemy import literal, tuple_
+
+
+def encode_cursor(*values: Any) -> str:
+    """An opaque cursor for a row with the given key values."""
+    data = json.dumps([{"t": v.isoformat()} if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> Tuple[Any, ...]:
+    """The key values of a cursor with `size` values. Raises ValueError if the cursor is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError("wrong number of values")
+        return tuple(datetime.fromisoformat(v["t"]) if isinstance(v, dict) else v for v in values)
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}.") from e
+
+
+def after_cursor(columns: Sequence[Any], cursor: str, descending: bool = True) -> Any:
+    """The condition selecting the rows that follow `cursor` when ordered by `columns`."""
+    values = decode_cursor(cursor, len(columns))
+    # Bound with the columns' types, so e.g. timestamps compare in the format the database stores them in.
+    key = tuple_(*(literal(value, column.type) for column, value in zip(columns, values)))
+    return tuple_(*columns) < key if descending else tuple_(*columns) > key
+
+
+def next_cursor(rows: Sequence[Any], *fields: str) -> Optional[str]:
+    """The cursor of the page after `rows`, keyed by `fields`, or None for an empty page."""
+    if not rows:
+        return None
+    return encode_cursor(*(getattr(rows[-1], field) for field in fields))
@@ -0,0 +1,165 @@
+"""
+Hourly per-LMP invocation rollups.
+
+Dashboards that aggregate the `invocation` table get slower as history grows. `InvocationRollup` keeps, for every
+LMP version and hour, the invocation count, token totals, latency sum and a latency histogram. `SQLStore` updates the
+rollups in the same transaction that writes invocations (and evicts them), so reading a dashboard costs one row per
+LMP and hour however many invocations there are. Latency percentiles are estimated from the histogram.
+
+Databases upgraded to the rollup schema are backfilled by their migration. To rebuild the rollups of a store:
+
+    python -m ell.stores.rollups backfill <storage directory or PostgreSQL connection string>
+"""
+import logging
+from argparse import ArgumentParser
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+from sqlalchemy import Connection, case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from ell.stores.models.core import Invocation, InvocationRollup
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (inclusive) of the latency histogram buckets; the last bucket holds everything slower.
+LATENCY_BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000)
+HISTOGRAM_FIELDS = tuple(f"latency_hist_{i}" for i in range(len(LATENCY_BUCKET_BOUNDS_MS) + 1))
+SUM_FIELDS = ("count", "prompt_tokens", "completion_tokens", "latency_ms_sum") + HISTOGRAM_FIELDS
+
+# SQLAlchemy's SQLite format for datetimes, so backfilled and incrementally written buckets compare equal.
+_SQLITE_HOUR_FORMAT = "%Y-%m-%d %H:00:00.000000"
+
+RollupKey = Tuple[str, datetime]
+
+
+def hour_start(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def latency_bucket(latency_ms: float) -> int:
+    return bisect_left(LATENCY_BUCKET_BOUNDS_MS, latency_ms)
+
+
+def rollup_deltas(invocation_rows: Iterable[Dict[str, Any]]) -> Dict[RollupKey, Dict[str, Any]]:
+    """The change to each rollup that writing the given invocation rows makes."""
+    deltas: Dict[RollupKey, Dict[str, Any]] = defaultdict(lambda: dict.fromkeys(SUM_FIELDS, 0))
+    for row in invocation_rows:
+        delta = deltas[(row["lmp_id"], hour_start(row["created_at"]))]
+        latency_ms = row.get("latency_ms") or 0
+        delta["count"] += 1
+        delta["prompt_tokens"] += row.get("prompt_tokens") or 0
+        delta["completion_tokens"] += row.get("completion_tokens") or 0
+        delta["latency_ms_sum"] += latency_ms
+        delta[HISTOGRAM_FIELDS[latency_bucket(latency_ms)]] += 1
+    return deltas
+
+
+def apply_rollup_deltas(session: Session, deltas: Dict[RollupKey, Dict[str, Any]], sign: int = 1) -> None:
+    """
+    Adds (or with `sign=-1` subtracts) `deltas` to the rollups in the database. Increments are done in the database
+    and in a stable key order, so concurrent writers neither lose updates nor deadlock.
+    """
+    if not deltas:
+        return
+    rows = [
+        dict(lmp_id=lmp_id, bucket_start=bucket_start, **{field: sign * value for field, value in delta.items()})
+        for (lmp_id, bucket_start), delta in sorted(deltas.items())
+    ]
+    dialect = session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(InvocationRollup)
+        session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["lmp_id", "bucket_start"],
+                set_={field: getattr(InvocationRollup, field) + statement.excluded[field] for field in SUM_FIELDS},
+            ),
+            rows,
+        )
+        return
+    for row in rows:
+        updated = session.execute(
+            update(InvocationRollup)
+            .where(InvocationRollup.lmp_id == row["lmp_id"], InvocationRollup.bucket_start == row["bucket_start"])
+            .values(**{field: getattr(InvocationRollup, field) + row[field] for field in SUM_FIELDS})
+        ).rowcount
+        if not updated:
+            session.execute(insert(InvocationRollup), [row])
+
+
+def backfill_rollups(connection: Connection) -> int:
+    """Recomputes every rollup from the `invocation` table. Returns the number of rollup rows."""
+    if connection.dialect.name == "sqlite":
+        bucket_start = func.strftime(_SQLITE_HOUR_FORMAT, Invocation.created_at)
+    else:
+        bucket_start = func.date_trunc("hour", Invocation.created_at)
+    latency_ms = func.coalesce(Invocation.latency_ms, 0)
+    bucket_index = case(
+        *((latency_ms <= bound, i) for i, bound in enumerate(LATENCY_BUCKET_BOUNDS_MS)),
+        else_=len(LATENCY_BUCKET_BOUNDS_MS),
+    )
+    aggregates = select(
+        Invocation.lmp_id,
+        bucket_start,
+        func.count(),
+        func.sum(func.coalesce(Invocation.prompt_tokens, 0)),
+        func.sum(func.coalesce(Invocation.completion_tokens, 0)),
+        func.sum(latency_ms),
+        *(func.sum(case((bucket_index == i, 1), else_=0)) for i in range(len(HISTOGRAM_FIELDS))),
+    ).group_by(Invocation.lmp_id, bucket_start)
+
+    connection.execute(delete(InvocationRollup))
+    connection.execute(insert(InvocationRollup).from_select(["lmp_id", "bucket_start", *SUM_FIELDS], aggregates))
+    return connection.execute(select(func.count()).select_from(InvocationRollup)).scalar()
+
+
+def histogram_percentile(histogram: Sequence[int], fraction: float) -> Optional[float]:
+    """
+    The latency below which `fraction` of the histogram's invocations fall, interpolated linearly within its bucket.
+    Latencies in the open-ended last bucket are reported as its lower bound.
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    seen = 0
+    for i, n in enumerate(histogram):
+        if n and seen + n >= target:
+            lower = LATENCY_BUCKET_BOUNDS_MS[i - 1] if i else 0
+            if i == len(LATENCY_BUCKET_BOUNDS_MS):
+                return float(lower)
+            return lower + (LATENCY_BUCKET_BOUNDS_MS[i] - lower) * (target - seen) / n
+        seen += n
+    return float(LATENCY_BUCKET_BOUNDS_MS[-1])
+
+
+def _open_store(location: str):
+    from ell.stores.sql import PostgresStore, SQLiteStore
+
+    if location.startswith("postgresql://"):
+        return PostgresStore(location)
+    return SQLiteStore(location)
+
+
+def main():
+    parser = ArgumentParser(description="Maintain ell's invocation rollups")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="Recompute the rollups of a store from its invocations")
+    backfill_parser.add_argument("store", help="Storage directory or PostgreSQL connection string")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = _open_store(args.store)
+    logger.info(f"Backfilled {store.backfill_rollups()} rollups.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Full-text search over invocation inputs and outputs.
+
+The index is optional. `SQLStore(..., full_text_search=True)` creates it, and from then on every store opened on
+the database keeps it up to date as invocations are written or evicted. The text of an invocation is every string
+in its params and results, read from the blob store for externalized contents. On SQLite the index is an FTS5 table
+plus a regular table mapping invocation ids to the FTS5 rowids, so removing an invocation from the index is an index
+lookup (invocations' own rowids can change on VACUUM, so they can't key the index). On PostgreSQL it is a table of `tsvector`s with a GIN index. Either way a
+search reads only the matching index entries, however many invocations the store has.
+
+To index the invocations a store already has:
+
+    python -m ell.stores.search rebuild <storage directory or PostgreSQL connection string>
+"""
+import logging
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Engine, bindparam, inspect, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "invocationsearch"
+# SQLite only: invocation id -> rowid of its document in SEARCH_TABLE.
+SEARCH_KEY_TABLE = "invocationsearchkey"
+# PostgreSQL rejects tsvectors over 1MB; the start of a huge payload is what people search for anyway.
+MAX_INDEXED_CHARS = 100_000
+SNIPPET_START, SNIPPET_END = "<mark>", "</mark>"
+_TS_CONFIG = "english"
+# Strings under these keys are metadata or binary data, not text anyone searches for.
+_SKIPPED_KEYS = {"__origin_trace__", "__lstr", "image", "image_url", "audio", "role", "type"}
+
+
+@dataclass
+class SearchHit:
+    invocation_id: str
+    lmp_id: str
+    created_at: datetime
+    rank: float
+    snippet: str
+
+
+def extract_text(value: Any) -> str:
+    """The strings in a JSON value, one per line."""
+    strings: List[str] = []
+
+    def visit(value: Any) -> None:
+        if isinstance(value, str):
+            if value:
+                strings.append(value)
+        elif isinstance(value, dict):
+            for key, item in value.items():
+                if key not in _SKIPPED_KEYS:
+                    visit(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                visit(item)
+
+    visit(value)
+    return "\n".join(strings)[:MAX_INDEXED_CHARS]
+
+
+def contents_text(contents: Dict[str, Any]) -> str:
+    from ell.util.serialization import pydantic_ltype_aware_cattr
+
+    return extract_text(pydantic_ltype_aware_cattr.unstructure([contents.get("params"), contents.get("results")]))
+
+
+def has_search_index(engine: Engine) -> bool:
+    return inspect(engine).has_table(SEARCH_TABLE)
+
+
+def create_search_index(engine: Engine) -> None:
+    with engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_KEY_TABLE} ("
+                "id INTEGER PRIMARY KEY, invocation_id VARCHAR NOT NULL UNIQUE)"
+            ))
+            connection.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(text)"))
+        elif connection.dialect.name == "postgresql":
+            connection.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+                "invocation_id VARCHAR PRIMARY KEY REFERENCES invocation (id) ON DELETE CASCADE, "
+                "document TSVECTOR NOT NULL, text TEXT NOT NULL)"
+            ))
+            connection.execute(text(
+                f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)"
+            ))
+        else:
+            raise NotImplementedError(f"Full-text search is not supported on {connection.dialect.name}.")
+
+
+def index_invocations(session: Session, documents: Sequence[Tuple[str, str]]) -> None:
+    """Adds (invocation id, text) documents to the index; the invocations must already be written."""
+    rows = [dict(invocation_id=invocation_id, text=document) for invocation_id, document in documents if document]
+    if not rows:
+        return
+    if session.get_bind().dialect.name == "sqlite":
+        session.execute(text(f"INSERT INTO {SEARCH_KEY_TABLE} (invocation_id) VALUES (:invocation_id)"), rows)
+        session.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, text) "
+                f"SELECT id, :text FROM {SEARCH_KEY_TABLE} WHERE invocation_id = :invocation_id"
+            ),
+            rows,
+        )
+    else:
+        session.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE} (invocation_id, document, text) "
+                f"VALUES (:invocation_id, to_tsvector('{_TS_CONFIG}', :text), :text) ON CONFLICT DO NOTHING"
+            ),
+            rows,
+        )
+
+
+def unindex_invocations(session: Session, invocation_ids: Sequence[str]) -> None:
+    """Removes invocations from the index; call it before deleting them."""
+    if not invocation_ids:
+        return
+    params = dict(invocation_ids=list(invocation_ids))
+    expanding = bindparam("invocation_ids", expanding=True)
+    if session.get_bind().dialect.name == "sqlite":
+        session.execute(
+            text(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN "
+                f"(SELECT id FROM {SEARCH_KEY_TABLE} WHERE invocation_id IN :invocation_ids)"
+            ).bindparams(expanding),
+            params,
+        )
+        session.execute(
+            text(f"DELETE FROM {SEARCH_KEY_TABLE} WHERE invocation_id IN :invocation_ids").bindparams(expanding), params
+        )
+    else:
+        session.execute(
+            text(f"DELETE FROM {SEARCH_TABLE} WHERE invocation_id IN :invocation_ids").bindparams(expanding), params
+        )
+
+
+def clear_index(session: Session) -> None:
+    session.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+    if session.get_bind().dialect.name == "sqlite":
+        session.execute(text(f"DELETE FROM {SEARCH_KEY_TABLE}"))
+
+
+def _fts5_query(query: str) -> str:
+    # Each word as a quoted phrase, so user input never trips over FTS5's query syntax.
+    return " ".join('"' + word.replace('"', '""') + '"' for word in query.split())
+
+
+def search(
+    session: Session, query: str, lmp_id: Optional[str] = None, limit: int = 20, offset: int = 0
+) -> List[SearchHit]:
+    """The invocations whose text matches every word of `query`, best match first."""
+    params: Dict[str, Any] = dict(limit=limit, offset=offset, lmp_id=lmp_id)
+    lmp_condition = "AND invocation.lmp_id = :lmp_id" if lmp_id is not None else ""
+    if session.get_bind().dialect.name == "sqlite":
+        params["query"] = _fts5_query(query)
+        if not params["query"]:
+            return []
+        statement = text(
+            f"SELECT invocation.id, invocation.lmp_id, invocation.created_at, -bm25({SEARCH_TABLE}) AS rank, "
+            f"snippet({SEARCH_TABLE}, 0, '{SNIPPET_START}', '{SNIPPET_END}', '…', 24) "
+            f"FROM {SEARCH_TABLE} JOIN {SEARCH_KEY_TABLE} ON {SEARCH_KEY_TABLE}.id = {SEARCH_TABLE}.rowid "
+            f"JOIN invocation ON invocation.id = {SEARCH_KEY_TABLE}.invocation_id "
+            f"WHERE {SEARCH_TABLE} MATCH :query {lmp_condition} "
+            f"ORDER BY bm25({SEARCH_TABLE}) LIMIT :limit OFFSET :offset"
+        )
+    else:
+        params["query"] = query
+        # Rank only the best matches, then highlight only the page that is returned.
+        statement = text(
+            f"WITH hits AS ("
+            f"SELECT s.invocation_id, s.text, ts_rank_cd(s.document, q) AS rank, q "
+            f"FROM {SEARCH_TABLE} s CROSS JOIN websearch_to_tsquery('{_TS_CONFIG}', :query) q "
+            f"JOIN invocation ON invocation.id = s.invocation_id "
+            f"WHERE s.document @@ q {lmp_condition} "
+            f"ORDER BY rank DESC LIMIT :limit OFFSET :offset) "
+            f"SELECT invocation.id, invocation.lmp_id, invocation.created_at, hits.rank, "
+            f"ts_headline('{_TS_CONFIG}', hits.text, hits.q, "
+            f"'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxFragments=2, MaxWords=24, MinWords=8') "
+            f"FROM hits JOIN invocation ON invocation.id = hits.invocation_id ORDER BY hits.rank DESC"
+        )
+    return [
+        SearchHit(
+            invocation_id=invocation_id,
+            lmp_id=hit_lmp_id,
+            created_at=(
+                datetime.fromisoformat(created_at).replace(tzinfo=timezone.utc) if isinstance(created_at, str) else created_at
+            ),
+            rank=rank,
+            snippet=snippet,
+        )
+        for invocation_id, hit_lmp_id, created_at, rank, snippet in session.execute(statement, params)
+    ]
+
+
+def _open_store(location: str):
+    from ell.stores.sql import PostgresStore, SQLiteStore
+
+    if location.startswith("postgresql://"):
+        return PostgresStore(location, full_text_search=True)
+    return SQLiteStore(location, full_text_search=True)
+
+
+def main():
+    parser = ArgumentParser(description="Maintain ell's full-text search index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Create the index if needed and index every invocation")
+    rebuild_parser.add_argument("store", help="Storage directory or PostgreSQL connection string")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = _open_store(args.store)
+    logger.info(f"Indexed {store.rebuild_search_index()} invocations.")
+
+
+if __name__ == "__main__":
+    main()
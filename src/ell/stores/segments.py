@@ -0,0 +1,238 @@
+"""
+Log-structured blob store.
+
+`SQLBlobStore` writes one gzip file per blob, which at millions of invocations exhausts inodes and makes backups and
+directory listings slow. `SegmentBlobStore` appends blobs to a few large segment files instead and keeps an index
+from blob id to (segment, offset, length) in a small SQLite database next to them. Reads memory-map the segment and
+decompress the record in place.
+
+Each record in a segment is self-describing (blob id, length and checksum), so the index can be rebuilt from the
+segments with `rebuild_index`. Storing a blob id again appends a new record that replaces the old one in the index.
+Records that are no longer indexed are dead space until `compact` copies the live records of mostly-dead segments
+into the active segment and deletes the old files. The index also records when each blob was stored, so compaction
+never drops a blob whose invocation may still be on its way to the database.
+
+    store = SQLiteStore(db_dir, blob_store=SegmentBlobStore(os.path.join(db_dir, "segments"), fallback=SQLBlobStore(db_dir)))
+"""
+import logging
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
+
+import ell.stores.store
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# MAGIC, blob id length, payload length, payload crc32; then the blob id and the zlib-compressed payload.
+_MAGIC = b"ELB1"
+_HEADER = struct.Struct("<4sHII")
+_SEGMENT_NAME = re.compile(r"^segment-(\d{6})\.seg$")
+
+
+@dataclass
+class CompactionStats:
+    dropped_blobs: int = 0
+    rewritten_segments: int = 0
+    reclaimed_bytes: int = 0
+
+
+class SegmentBlobStore(ell.stores.store.BlobStore):
+    def __init__(
+        self,
+        directory: str,
+        max_segment_size: int = 256 * 1024 * 1024,
+        compression_level: int = 6,
+        fallback: Optional[ell.stores.store.BlobStore] = None,
+    ):
+        """
+        :param directory: Directory holding the segment files and the index.
+        :param max_segment_size: Size in bytes after which a new segment is started.
+        :param compression_level: zlib level blobs are compressed with.
+        :param fallback: Store that blobs missing from the index are read from, e.g. the `SQLBlobStore` a store used
+            before switching to segments.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_segment_size = max_segment_size
+        self.compression_level = compression_level
+        self.fallback = fallback
+        self._lock = threading.RLock()
+        self._maps: Dict[int, Tuple[mmap.mmap, int]] = {}
+        self._index = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False, isolation_level=None)
+        self._index.execute("PRAGMA journal_mode=WAL")
+        self._index.execute("PRAGMA busy_timeout=30000")
+        self._index.execute(
+            "CREATE TABLE IF NOT EXISTS blobs (blob_id TEXT PRIMARY KEY, segment INTEGER NOT NULL, "
+            "offset INTEGER NOT NULL, length INTEGER NOT NULL, stored_at REAL NOT NULL DEFAULT 0)"
+        )
+        # Indexes created before blobs had a store time; their blobs count as stored long ago.
+        if "stored_at" not in {row[1] for row in self._index.execute("PRAGMA table_info(blobs)")}:
+            self._index.execute("ALTER TABLE blobs ADD COLUMN stored_at REAL NOT NULL DEFAULT 0")
+        self._index.execute("CREATE INDEX IF NOT EXISTS ix_blobs_segment ON blobs (segment)")
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"segment-{segment:06d}.seg")
+
+    def segments(self) -> List[int]:
+        return sorted(int(m.group(1)) for name in os.listdir(self.directory) if (m := _SEGMENT_NAME.match(name)))
+
+    @contextmanager
+    def _active_segment(self, size: int) -> Iterator[Tuple[int, "os.FileIO"]]:
+        """The newest segment opened for appending, locked against other processes, or a new one if it is full."""
+        segments = self.segments()
+        segment = segments[-1] if segments else 1
+        while True:
+            f = open(self._segment_path(segment), "ab")
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0, os.SEEK_END)
+            # Another process may have started a newer segment while we waited for the lock.
+            if f.tell() == 0 or f.tell() + size <= self.max_segment_size:
+                if segment == self.segments()[-1]:
+                    break
+            f.close()
+            segment = max(segment + 1, self.segments()[-1])
+        try:
+            yield segment, f
+        finally:
+            f.close()
+
+    def _append(self, blob_id: str, payload: bytes, stored_at: Optional[float] = None) -> None:
+        id_bytes = blob_id.encode("utf-8")
+        record = _HEADER.pack(_MAGIC, len(id_bytes), len(payload), zlib.crc32(payload)) + id_bytes + payload
+        with self._lock, self._active_segment(len(record)) as (segment, f):
+            offset = f.tell() + _HEADER.size + len(id_bytes)
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+            self._index.execute(
+                "INSERT OR REPLACE INTO blobs (blob_id, segment, offset, length, stored_at) VALUES (?, ?, ?, ?, ?)",
+                (blob_id, segment, offset, len(payload), time.time() if stored_at is None else stored_at),
+            )
+
+    def store_blob(self, blob: bytes, blob_id: str) -> str:
+        self._append(blob_id, zlib.compress(blob, self.compression_level))
+        return blob_id
+
+    def _map(self, segment: int, end: int) -> mmap.mmap:
+        mapped = self._maps.get(segment)
+        if mapped is None or mapped[1] < end:
+            if mapped is not None:
+                mapped[0].close()
+            with open(self._segment_path(segment), "rb") as f:
+                mapped = (mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), os.fstat(f.fileno()).st_size)
+            self._maps[segment] = mapped
+        return mapped[0]
+
+    def retrieve_blob(self, blob_id: str) -> bytes:
+        with self._lock:
+            location = self._index.execute(
+                "SELECT segment, offset, length FROM blobs WHERE blob_id = ?", (blob_id,)
+            ).fetchone()
+            if location is None:
+                if self.fallback is not None:
+                    return self.fallback.retrieve_blob(blob_id)
+                raise KeyError(f"Blob {blob_id} not found.")
+            segment, offset, length = location
+            payload = self._map(segment, offset + length)[offset : offset + length]
+        return zlib.decompress(payload)
+
+    def __contains__(self, blob_id: str) -> bool:
+        with self._lock:
+            return self._index.execute("SELECT 1 FROM blobs WHERE blob_id = ?", (blob_id,)).fetchone() is not None
+
+    def _records(self, segment: int) -> Iterator[Tuple[str, int, int]]:
+        """(blob id, payload offset, payload length) of every intact record in a segment."""
+        with open(self._segment_path(segment), "rb") as f:
+            data = f.read()
+        position = 0
+        while position + _HEADER.size <= len(data):
+            magic, id_length, length, crc = _HEADER.unpack_from(data, position)
+            offset = position + _HEADER.size + id_length
+            if magic != _MAGIC or offset + length > len(data) or zlib.crc32(data[offset : offset + length]) != crc:
+                logger.warning(f"Stopping at a torn or corrupt record in segment {segment} at byte {position}.")
+                return
+            yield data[position + _HEADER.size : offset].decode("utf-8"), offset, length
+            position = offset + length
+
+    def rebuild_index(self) -> int:
+        """
+        Rebuilds the index from the segments; the newest record of each blob id wins. Returns the number of blobs.
+        Segments don't record when blobs were stored, so every blob counts as just stored.
+        """
+        now = time.time()
+        with self._lock:
+            self._index.execute("BEGIN IMMEDIATE")
+            self._index.execute("DELETE FROM blobs")
+            for segment in self.segments():
+                self._index.executemany(
+                    "INSERT OR REPLACE INTO blobs (blob_id, segment, offset, length, stored_at) VALUES (?, ?, ?, ?, ?)",
+                    ((blob_id, segment, offset, length, now) for blob_id, offset, length in self._records(segment)),
+                )
+            self._index.execute("COMMIT")
+            return self._index.execute("SELECT count(*) FROM blobs").fetchone()[0]
+
+    def compact(
+        self, referenced: Optional[Collection[str]] = None, min_dead_ratio: float = 0.5, min_age: float = 3600.0
+    ) -> CompactionStats:
+        """
+        Drops blobs that are not in `referenced` (if given) from the index, then rewrites every segment except the
+        active one in which at least `min_dead_ratio` of the bytes are dead.
+
+        :param min_age: Seconds for which a blob is kept even if it is not referenced. Blobs are stored before their
+            invocation is written, so `referenced` can't know about blobs stored while or shortly before it was read,
+            by this or any other process.
+        """
+        stats = CompactionStats()
+        stored_before = time.time() - min_age
+        with self._lock:
+            if referenced is not None:
+                self._index.execute("CREATE TEMP TABLE IF NOT EXISTS referenced (blob_id TEXT PRIMARY KEY)")
+                self._index.execute("DELETE FROM referenced")
+                self._index.executemany("INSERT OR IGNORE INTO referenced VALUES (?)", ((i,) for i in referenced))
+                stats.dropped_blobs = self._index.execute(
+                    "DELETE FROM blobs WHERE stored_at < ? AND blob_id NOT IN (SELECT blob_id FROM referenced)",
+                    (stored_before,),
+                ).rowcount
+                self._index.execute("DELETE FROM referenced")
+
+            segments = self.segments()
+            for segment in segments[:-1]:
+                size = os.path.getsize(self._segment_path(segment))
+                live = self._index.execute(
+                    "SELECT blob_id, offset, length, stored_at FROM blobs WHERE segment = ?", (segment,)
+                ).fetchall()
+                live_bytes = sum(length for _, _, length, _ in live)
+                if size == 0 or 1 - live_bytes / size < min_dead_ratio:
+                    continue
+                for blob_id, offset, length, stored_at in live:
+                    # Moved blobs keep their store time, so a young unreferenced blob doesn't get a new grace period.
+                    payload = bytes(self._map(segment, offset + length)[offset : offset + length])
+                    self._append(blob_id, payload, stored_at)
+                mapped = self._maps.pop(segment, None)
+                if mapped is not None:
+                    mapped[0].close()
+                os.remove(self._segment_path(segment))
+                stats.rewritten_segments += 1
+                stats.reclaimed_bytes += size - live_bytes
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            for mapped, _ in self._maps.values():
+                mapped.close()
+            self._maps.clear()
+            self._index.close()
@@ -1,26 +1,41 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
-from typing import Any, Optional, Dict, List, Set, Union
+from urllib.parse import quote
+from collections import Counter
+from typing import Any, Optional, Dict, List, Sequence, Set, Tuple, Union
 from pydantic import BaseModel
 import sqlalchemy
 from pathlib import Path
 from typing import Any, Optional, Dict, List, Set
 from sqlmodel import Session, SQLModel, create_engine, select
+from sqlalchemy import Engine, event
+from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import QueuePool
+from ell.stores.compression import Compressor, compress_contents_rows, contents_payload, default_codec, dictionary_id, train_dictionary
+from ell.stores.fragments import canonical_json, deduplicate_contents_rows, fragment_hashes, insert_fragments, prune_fragments
+from ell.stores.memo import MemoCache
 from ell.stores.migrations import init_or_migrate_database
+from ell.stores.pagination import after_cursor
+from ell.stores.search import SearchHit, clear_index, contents_text, create_search_index, has_search_index, index_invocations, search, unindex_invocations
+from ell.stores.rollups import HISTOGRAM_FIELDS, apply_rollup_deltas, backfill_rollups, histogram_percentile, rollup_deltas
 import ell.stores.store
+from ell.stores.store import INVOCATION_CONTENTS_FIELDS
+from ell.stores.writer import InvocationWriter
 from sqlalchemy.sql import text
 from ell.types._lstr import _lstr
-from sqlalchemy import or_, func, and_, extract, FromClause
+from sqlalchemy import or_, func, and_, extract, FromClause, insert, update, delete, union, case, literal
 from sqlalchemy.types import TypeDecorator, VARCHAR
 from ell.stores.models import SerializedLMPUses
 from ell.stores.models.evaluations import (
+    EvaluationLabel,
     EvaluationLabeler,
     EvaluationResultDatapoint,
     EvaluationRunLabelerSummary,
     SerializedEvaluation,
     SerializedEvaluationRun,
 )
-from ell.stores.models.core import InvocationTrace, SerializedLMP, Invocation, InvocationContents
+from ell.stores.models.core import CompressionDictionary, InvocationRollup, InvocationTrace, PromptCacheEntry, SerializedLMP, Invocation, InvocationContents
 from sqlalchemy import func, and_
 from ell.util.serialization import pydantic_ltype_aware_cattr, utc_now
 import gzip
@@ -32,10 +47,77 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+_SQLITE_BUCKET_FORMATS = {
+    "minute": "%Y-%m-%d %H:%M:00",
+    "hour": "%Y-%m-%d %H:00:00",
+    "day": "%Y-%m-%d 00:00:00",
+}
+
 class SQLStore(ell.stores.store.Store):
-    def __init__(self, db_uri: str, blob_store: Optional[ell.stores.store.BlobStore] = None):
+    def __init__(
+        self,
+        db_uri: str,
+        blob_store: Optional[ell.stores.store.BlobStore] = None,
+        write_behind: bool = False,
+        write_batch_size: int = 100,
+        write_flush_interval: float = 0.5,
+        write_queue_size: int = 10000,
+        cache_memo_size: int = 1024,
+        cache_memo_ttl: Optional[float] = None,
+        compress_contents: bool = False,
+        compression_threshold: int = 256,
+        full_text_search: bool = False,
+    ):
+        """
+        :param write_behind: If True, invocations are queued and written by a background thread in batched
+            transactions instead of on the calling thread.
+        :param write_batch_size: Maximum number of invocations per write-behind transaction.
+        :param write_flush_interval: Maximum number of seconds an invocation waits in the queue before its batch is flushed.
+        :param write_queue_size: Maximum number of queued invocations before tracked calls block (backpressure).
+        :param cache_memo_size: Number of `get_cached_invocations` hits kept in memory (least recently used are
+            evicted first), so repeated cached calls skip the database. 0 disables the memo.
+        :param cache_memo_ttl: If set, seconds after which a memoized hit is looked up in the database again.
+        :param compress_contents: If True, the inline JSON fields of invocation contents are stored compressed, with
+            the newest dictionary trained by `train_compression_dictionary` (see ell.stores.compression).
+        :param compression_threshold: Minimum size in characters of the JSON of a contents row for it to be compressed.
+        :param full_text_search: If True, create the full-text index of invocation params and results if the database
+            doesn't have one yet (see ell.stores.search). Stores keep the index up to date either way, including one
+            created after they were opened.
+        """
+        self.engine = self._create_engine(db_uri)
+        
+        init_or_migrate_database(self.engine)
+        self.open_files: Dict[str, Dict[str, Any]] = {}
+        self.invocation_writer = InvocationWriter(
+            self.write_invocations,
+            batch_size=write_batch_size,
+            flush_interval=write_flush_interval,
+            max_queue_size=write_queue_size,
+        ) if write_behind else None
+        self.cache_memo: Optional[MemoCache[List[Invocation]]] = (
+            MemoCache(cache_memo_size, cache_memo_ttl) if cache_memo_size else None
+        )
+        self.prompt_cache_memo: Optional[MemoCache[PromptCacheEntry]] = (
+            MemoCache(cache_memo_size, cache_memo_ttl) if cache_memo_size else None
+        )
+        self.compression_threshold = compression_threshold
+        self.compressor: Optional[Compressor] = self._latest_compressor() if compress_contents else None
+        if full_text_search:
+            create_search_index(self.engine)
+        self.full_text_search = has_search_index(self.engine)
+        super().__init__(blob_store)
+
+    def has_search_index(self) -> bool:
+        """Whether the database has the full-text index, whichever store created it (see ell.stores.search)."""
+        # Another store may create the index after this one was opened. An index is never dropped, so once found
+        # it needs no further checks.
+        if not self.full_text_search:
+            self.full_text_search = has_search_index(self.engine)
+        return self.full_text_search
+
+    def _create_engine(self, db_uri: str, **engine_kwargs: Any) -> Engine:
         # XXX: Use Serialization serialzie_object in incoming PR.
-        self.engine = create_engine(
+        return create_engine(
             db_uri,
             json_serializer=lambda obj: json.dumps(
                 pydantic_ltype_aware_cattr.unstructure(obj),
@@ -43,11 +125,56 @@ class SQLStore(ell.stores.store.Store):
                 default=repr,
                 ensure_ascii=False,
             ),
+            **engine_kwargs,
         )
-        
-        init_or_migrate_database(self.engine)
-        self.open_files: Dict[str, Dict[str, Any]] = {}
-        super().__init__(blob_store)
+
+    def _latest_compressor(self) -> Compressor:
+        codec = default_codec()
+        with Session(self.engine) as session:
+            dictionary = session.exec(
+                select(CompressionDictionary)
+                .where(CompressionDictionary.codec == codec)
+                .order_by(CompressionDictionary.created_at.desc())
+            ).first()
+        return Compressor(codec, dictionary.data if dictionary else None)
+
+    def train_compression_dictionary(self, max_samples: int = 2000, size: int = 32 * 1024) -> Optional[str]:
+        """
+        Trains a compression dictionary on the contents of the newest invocations. If this store compresses contents,
+        new contents are compressed with it; otherwise it is only saved, for stores opened with `compress_contents=True`.
+
+        :return: The id of the new dictionary, or None if there are no contents to train on.
+        """
+        with Session(self.read_engine) as session:
+            contents = session.exec(
+                select(InvocationContents)
+                .join(Invocation)
+                .where(InvocationContents.is_external == False)
+                .order_by(Invocation.created_at.desc())
+                .limit(max_samples)
+            ).all()
+            samples = [
+                canonical_json(contents_payload({field: getattr(c, field) for field in INVOCATION_CONTENTS_FIELDS})).encode("utf-8")
+                for c in contents
+            ]
+        samples = [sample for sample in samples if len(sample) > 2]
+        if not samples:
+            return None
+
+        codec = default_codec()
+        data = train_dictionary(samples, size, codec)
+        dict_id = dictionary_id(data)
+        with Session(self.engine) as session:
+            session.merge(CompressionDictionary(dictionary_id=dict_id, codec=codec, data=data, created_at=utc_now()))
+            session.commit()
+        if self.compressor is not None:
+            self.compressor = Compressor(codec, data)
+        return dict_id
+
+    @property
+    def read_engine(self) -> Engine:
+        """Engine used for queries that never write (studio, cache lookups). Defaults to the main engine."""
+        return self.engine
 
     def write_lmp(
         self, serialized_lmp: SerializedLMP, uses: Dict[str, Any]
@@ -83,37 +210,65 @@ class SQLStore(ell.stores.store.Store):
     def write_invocation(
         self, invocation: Invocation, consumes: Set[str]
     ) -> Optional[Any]:
-        with Session(self.engine) as session:
-            lmp = session.exec(
-                select(SerializedLMP).filter(SerializedLMP.lmp_id == invocation.lmp_id)
-            ).first()
-            assert (
-                lmp is not None
-            ), f"LMP with id {invocation.lmp_id} not found. Writing invocation erroneously"
-
-            # Increment num_invocations
-            if lmp.num_invocations is None:
-                lmp.num_invocations = 1
-            else:
-                lmp.num_invocations += 1
-
-            # Add the invocation contents
-            session.add(invocation.contents)
+        if self.invocation_writer:
+            self.invocation_writer.submit(invocation, consumes)
+        else:
+            self.write_invocations([(invocation, consumes)])
+        return None
+
+    def write_invocations(
+        self, invocations: Sequence[Tuple[Invocation, Set[str]]]
+    ) -> int:
+        if not invocations:
+            return 0
+
+        invocation_rows, contents_rows, trace_rows = [], [], []
+        num_new_invocations: Counter = Counter()
+        for invocation, consumes in invocations:
+            invocation_rows.append(_table_row(invocation, created_at=invocation.created_at or utc_now()))
+            contents_rows.append(_table_row(invocation.contents))
+            trace_rows.extend(
+                dict(invocation_consumer_id=invocation.id, invocation_consuming_id=consumed_id)
+                for consumed_id in consumes
+            )
+            num_new_invocations[invocation.lmp_id] += 1
 
-            # Add the invocation
-            session.add(invocation)
+        # Text is extracted before the contents rows are deduplicated and compressed.
+        documents = [
+            (invocation.id, contents_text(self.load_invocation_contents(invocation))) for invocation, _ in invocations
+        ] if self.has_search_index() else []
+        fragments = deduplicate_contents_rows(contents_rows)
+        if self.compressor is not None:
+            compress_contents_rows(contents_rows, self.compressor, self.compression_threshold)
 
-            # Now create traces.
-            for consumed_id in consumes:
-                session.add(
-                    InvocationTrace(
-                        invocation_consumer_id=invocation.id,
-                        invocation_consuming_id=consumed_id,
-                    )
-                )
+        with Session(self.engine) as session:
+            # One executemany per table instead of a unit-of-work flush per row.
+            insert_fragments(session, fragments)
+            session.execute(insert(Invocation), invocation_rows)
+            session.execute(insert(InvocationContents), contents_rows)
+            if trace_rows:
+                session.execute(insert(InvocationTrace), trace_rows)
+            index_invocations(session, documents)
+
+            # Coalesce the counter updates into a single in-database increment per LMP, issued last and in a
+            # stable order so the hot LMP rows are locked as briefly as possible and without deadlocks.
+            for lmp_id, n in sorted(num_new_invocations.items()):
+                updated = session.execute(
+                    update(SerializedLMP)
+                    .where(SerializedLMP.lmp_id == lmp_id)
+                    .values(num_invocations=func.coalesce(SerializedLMP.num_invocations, 0) + n)
+                ).rowcount
+                assert (
+                    updated == 1
+                ), f"LMP with id {lmp_id} not found. Writing invocation erroneously"
+            apply_rollup_deltas(session, rollup_deltas(invocation_rows))
 
             session.commit()
-            return None
+        return len(invocations)
+
+    def flush(self) -> None:
+        if self.invocation_writer:
+            self.invocation_writer.flush()
 
     def write_evaluation(self, evaluation: SerializedEvaluation) -> str:
         with Session(self.engine) as session:
@@ -168,6 +323,8 @@ class SQLStore(ell.stores.store.Store):
             return evaluation_run.id
         
     def write_evaluation_run_intermediate(self, row_result : EvaluationResultDatapoint) -> None:
+        # The datapoint references its invocation, so make sure queued invocations are written first.
+        self.flush()
         # add a new result datapoint        
         with Session(self.engine) as session:
             session.add(row_result)
@@ -196,20 +353,191 @@ class SQLStore(ell.stores.store.Store):
     def get_cached_invocations(
         self, lmp_id: str, state_cache_key: str
     ) -> List[Invocation]:
+        key = (lmp_id, state_cache_key)
+        if self.cache_memo is not None and (invocations := self.cache_memo.get(key)) is not None:
+            return list(invocations)
+
+        with Session(self.read_engine) as session:
+            # Contents are loaded with the invocations since the caller reads the results after the session closes.
+            invocations = session.exec(
+                select(Invocation)
+                .where(Invocation.lmp_id == lmp_id, Invocation.state_cache_key == state_cache_key)
+                .options(selectinload(Invocation.contents))
+                .order_by(Invocation.created_at.desc())
+                .limit(10)
+            ).all()
+
+        # Only hits are memoized: a miss is usually followed by the invocation that fills it.
+        if invocations and self.cache_memo is not None:
+            self.cache_memo.put(key, list(invocations))
+        return list(invocations)
+
+    def mark_cached_invocations_used(self, invocation_ids: Sequence[str]) -> None:
+        """Records that cached invocations were just stored or served by a cache tier (see ell.stores.tiered)."""
+        if not invocation_ids:
+            return
         with Session(self.engine) as session:
-            return self.get_invocations(
-                session,
-                lmp_filters={"lmp_id": lmp_id},
-                filters={"state_cache_key": state_cache_key},
+            session.execute(
+                update(Invocation).where(Invocation.id.in_(invocation_ids)).values(last_used_at=utc_now())
             )
+            session.commit()
 
-    def get_versions_by_fqn(self, fqn: str) -> List[SerializedLMP]:
+    def evict_cached_invocations(self, max_entries: int) -> int:
+        """
+        Deletes the least recently used cached invocations (those with a state cache key) beyond the `max_entries`
+        most recently used, for stores used as a bounded cache tier. An invocation no tier has marked used counts as
+        used when it was created. Invocations that other rows refer to (calls they made, traces,
+        evaluation results) are kept. Content fragments that only the deleted contents referred to are deleted with
+        them; blobs of externalized contents are left in the blob store.
+
+        :return: The number of invocations deleted.
+        """
+        referenced = union(
+            select(Invocation.used_by_id).where(Invocation.used_by_id.isnot(None)),
+            select(InvocationTrace.invocation_consuming_id),
+            select(EvaluationResultDatapoint.invocation_being_labeled_id),
+            select(EvaluationLabel.label_invocation_id).where(EvaluationLabel.label_invocation_id.isnot(None)),
+        )
         with Session(self.engine) as session:
+            overflow = select(
+                Invocation.id,
+                Invocation.lmp_id,
+                Invocation.created_at,
+                Invocation.latency_ms,
+                Invocation.prompt_tokens,
+                Invocation.completion_tokens,
+            ).where(Invocation.state_cache_key.isnot(None)).order_by(
+                func.coalesce(Invocation.last_used_at, Invocation.created_at).desc()
+            ).offset(max_entries).subquery()
+            evicted = session.execute(select(overflow).where(overflow.c.id.not_in(referenced))).mappings().all()
+            if not evicted:
+                return 0
+
+            ids = [row["id"] for row in evicted]
+            if self.has_search_index():
+                unindex_invocations(session, ids)
+            session.execute(delete(InvocationTrace).where(InvocationTrace.invocation_consumer_id.in_(ids)))
+            orphaned_fragments = fragment_hashes(session, ids)
+            session.execute(delete(InvocationContents).where(InvocationContents.invocation_id.in_(ids)))
+            prune_fragments(session, orphaned_fragments)
+            session.execute(delete(Invocation).where(Invocation.id.in_(ids)))
+            for lmp_id, n in sorted(Counter(row["lmp_id"] for row in evicted).items()):
+                session.execute(
+                    update(SerializedLMP)
+                    .where(SerializedLMP.lmp_id == lmp_id)
+                    .values(num_invocations=func.coalesce(SerializedLMP.num_invocations, 0) - n)
+                )
+            apply_rollup_deltas(session, rollup_deltas(evicted), sign=-1)
+            session.commit()
+
+        if self.cache_memo is not None:
+            self.cache_memo.clear()
+        return len(evicted)
+
+    def backfill_rollups(self) -> int:
+        """Recomputes the invocation rollups from the invocations, e.g. after editing the database by hand."""
+        self.flush()
+        with self.engine.begin() as connection:
+            return backfill_rollups(connection)
+
+    def search_invocations(
+        self, session: Session, query: str, lmp_id: Optional[str] = None, limit: int = 20, offset: int = 0
+    ) -> List[SearchHit]:
+        """
+        The invocations whose params or results contain every word of `query`, best match first, with a snippet of
+        the matching text. Requires the full-text index (`full_text_search=True`).
+        """
+        if not self.has_search_index():
+            raise LookupError("This store has no full-text index; open it with full_text_search=True to create one.")
+        return search(session, query, lmp_id=lmp_id, limit=limit, offset=offset)
+
+    def rebuild_search_index(self, batch_size: int = 1000) -> int:
+        """
+        Indexes every invocation from scratch, e.g. after enabling full-text search. Returns the number read.
+
+        The index is rebuilt in a single transaction, so searches keep seeing the old index until the new one is
+        complete. On SQLite other writers wait for the rebuild to finish.
+        """
+        assert self.has_search_index(), "This store has no full-text index."
+        self.flush()
+        indexed, last_id = 0, ""
+        with Session(self.engine) as session:
+            clear_index(session)
+            while True:
+                invocations = session.exec(
+                    select(Invocation)
+                    .where(Invocation.id > last_id)
+                    .options(selectinload(Invocation.contents))
+                    .order_by(Invocation.id)
+                    .limit(batch_size)
+                ).all()
+                if not invocations:
+                    break
+                last_id = invocations[-1].id
+                index_invocations(
+                    session, [(invocation.id, contents_text(self.load_invocation_contents(invocation))) for invocation in invocations]
+                )
+                indexed += len(invocations)
+                # Only the index rows stay pending; the batch's invocations can be released.
+                session.expunge_all()
+            session.commit()
+        return indexed
+
+    def referenced_blob_ids(self) -> Set[str]:
+        """The ids of every blob the database refers to: externalized invocation contents and evaluation datasets."""
+        with Session(self.read_engine) as session:
+            invocation_ids = session.exec(
+                select(InvocationContents.invocation_id).where(InvocationContents.is_external == True)
+            ).all()
+            dataset_ids = session.exec(select(SerializedEvaluation.dataset_id).distinct()).all()
+        return set(invocation_ids) | set(dataset_ids)
+
+    def compact_blob_store(self, **kwargs: Any) -> Any:
+        """
+        Compacts the blob store (if it supports compaction), dropping blobs the database doesn't refer to. Recently
+        stored blobs are kept, since their invocations may still be being written (see `SegmentBlobStore.compact`).
+        """
+        if not hasattr(self.blob_store, "compact"):
+            return None
+        self.flush()
+        return self.blob_store.compact(self.referenced_blob_ids(), **kwargs)
+
+    def get_prompt_cache_entry(self, prompt_cache_key: str) -> Optional[PromptCacheEntry]:
+        if self.prompt_cache_memo is not None and (entry := self.prompt_cache_memo.get(prompt_cache_key)) is not None:
+            return entry
+
+        with Session(self.read_engine) as session:
+            entry = session.get(PromptCacheEntry, prompt_cache_key)
+
+        if entry is not None and self.prompt_cache_memo is not None:
+            self.prompt_cache_memo.put(prompt_cache_key, entry)
+        return entry
+
+    def mark_prompt_cache_entry_used(self, prompt_cache_key: str) -> None:
+        """Records that a prompt cache entry was just served by a cache tier (see ell.stores.tiered)."""
+        with Session(self.engine) as session:
+            session.execute(
+                update(PromptCacheEntry)
+                .where(PromptCacheEntry.prompt_cache_key == prompt_cache_key)
+                .values(last_used_at=utc_now())
+            )
+            session.commit()
+
+    def write_prompt_cache_entry(self, entry: PromptCacheEntry) -> None:
+        with Session(self.engine) as session:
+            # Concurrent identical requests race to fill the same key; any of their responses will do.
+            session.merge(entry)
+            session.commit()
+        if self.prompt_cache_memo is not None:
+            self.prompt_cache_memo.invalidate(entry.prompt_cache_key)
+
+    def get_versions_by_fqn(self, fqn: str) -> List[SerializedLMP]:
+        with Session(self.read_engine) as session:
             return self.get_lmps(session, name=fqn)
 
     ## HELPER METHODS FOR ELL STUDIO! :)
     def get_latest_lmps(
-        self, session: Session, skip: int = 0, limit: int = 10
+        self, session: Session, skip: int = 0, limit: int = 10, cursor: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
         Gets all the lmps grouped by unique name with the highest created at
@@ -226,7 +554,7 @@ class SQLStore(ell.stores.store.Store):
         filters = {"name": subquery.c.name, "created_at": subquery.c.max_created_at}
 
         return self.get_lmps(
-            session, skip=skip, limit=limit, subquery=subquery, **filters
+            session, skip=skip, limit=limit, cursor=cursor, subquery=subquery, **filters
         )
 
     def get_lmps(
@@ -234,9 +562,14 @@ class SQLStore(ell.stores.store.Store):
         session: Session,
         skip: int = 0,
         limit: int = 10,
+        cursor: Optional[str] = None,
         subquery=None,
         **filters: Optional[Dict[str, Any]],
     ) -> List[Dict[str, Any]]:
+        """
+        LMPs from newest to oldest. Pass `cursor=next_cursor(page, "created_at", "lmp_id")` (see
+        ell.stores.pagination) instead of `skip` to get the page after `page` without scanning the ones before it.
+        """
 
         query = select(SerializedLMP)
 
@@ -253,8 +586,11 @@ class SQLStore(ell.stores.store.Store):
             for key, value in filters.items():
                 query = query.where(getattr(SerializedLMP, key) == value)
 
+        if cursor is not None:
+            query = query.where(after_cursor((SerializedLMP.created_at, SerializedLMP.lmp_id), cursor))
+
         query = query.order_by(
-            SerializedLMP.created_at.desc()
+            SerializedLMP.created_at.desc(), SerializedLMP.lmp_id.desc()
         )  # Sort by created_at in descending order
         query = query.offset(skip).limit(limit)
         results = session.exec(query).all()
@@ -269,10 +605,20 @@ class SQLStore(ell.stores.store.Store):
         limit: int = 10,
         filters: Optional[Dict[str, Any]] = None,
         hierarchical: bool = False,
+        cursor: Optional[str] = None,
     ) -> List[Dict[str, Any]]:
+        """
+        Invocations from newest to oldest. Pass `cursor=next_cursor(page, "created_at", "id")` (see
+        ell.stores.pagination) instead of `skip` to get the page after `page` without scanning the ones before it.
 
+        :param hierarchical: Only list top-level invocations (unless filtering by id), with the invocations they made
+            (`uses`, recursively) loaded in one query.
+        """
         query = select(Invocation).join(SerializedLMP)
 
+        if hierarchical and "id" not in (filters or {}):
+            query = query.where(Invocation.used_by_id.is_(None))
+
         # Apply LMP filters
         for key, value in lmp_filters.items():
             query = query.where(getattr(SerializedLMP, key) == value)
@@ -282,39 +628,130 @@ class SQLStore(ell.stores.store.Store):
             for key, value in filters.items():
                 query = query.where(getattr(Invocation, key) == value)
 
+        if cursor is not None:
+            query = query.where(after_cursor((Invocation.created_at, Invocation.id), cursor))
+
         # Sort from newest to oldest
-        query = query.order_by(Invocation.created_at.desc()).offset(skip).limit(limit)
+        query = query.order_by(Invocation.created_at.desc(), Invocation.id.desc()).offset(skip).limit(limit)
 
         invocations = session.exec(query).all()
+        if hierarchical:
+            self._load_call_trees(session, invocations)
         return invocations
 
-    def get_traces(self, session: Session):
-        query = text(
-            """
-        SELECT 
-            consumer.lmp_id, 
-            trace.*, 
-            consumed.lmp_id
-        FROM 
-            invocation AS consumer
-        JOIN 
-            invocationtrace AS trace ON consumer.id = trace.invocation_consumer_id
-        JOIN 
-            invocation AS consumed ON trace.invocation_consuming_id = consumed.id
+    def _walk_invocations(
+        self, session: Session, invocation_ids: Sequence[str], edges: FromClause, max_depth: int
+    ) -> List[Tuple[Invocation, int]]:
+        """The invocations reachable from `invocation_ids` along `edges` within `max_depth` steps, with their depth."""
+        walk = _reachable(
+            select(Invocation.id.label("node"), literal(0).label("depth")).where(Invocation.id.in_(invocation_ids)),
+            edges,
+            max_depth,
+        )
+        depths = select(walk.c.node, func.min(walk.c.depth).label("depth")).where(walk.c.depth > 0).group_by(walk.c.node).subquery()
+        return list(
+            session.exec(
+                select(Invocation, depths.c.depth)
+                .join(depths, Invocation.id == depths.c.node)
+                .order_by(depths.c.depth, Invocation.created_at)
+            ).all()
+        )
+
+    def get_invocation_ancestors(self, session: Session, invocation_id: str, max_depth: int = 32) -> List[Invocation]:
+        """The invocations that (transitively) made `invocation_id`, from its caller up."""
+        edges = select(Invocation.id.label("source"), Invocation.used_by_id.label("target")).subquery()
+        return [invocation for invocation, _ in self._walk_invocations(session, [invocation_id], edges, max_depth)]
+
+    def get_invocation_descendants(
+        self, session: Session, invocation_ids: Sequence[str], max_depth: int = 32
+    ) -> List[Invocation]:
+        """The invocations that `invocation_ids` (transitively) made, breadth first."""
+        edges = select(Invocation.used_by_id.label("source"), Invocation.id.label("target")).subquery()
+        return [invocation for invocation, _ in self._walk_invocations(session, invocation_ids, edges, max_depth)]
+
+    def _load_call_trees(self, session: Session, invocations: Sequence[Invocation], max_depth: int = 32) -> None:
+        """Loads the `uses` of `invocations` and of the invocations they made, down to `max_depth`, in one query."""
+        if not invocations:
+            return
+        edges = select(Invocation.used_by_id.label("source"), Invocation.id.label("target")).subquery()
+        descendants = self._walk_invocations(session, [invocation.id for invocation in invocations], edges, max_depth)
+        children: Dict[str, List[Invocation]] = {}
+        for invocation, _ in descendants:
+            children.setdefault(invocation.used_by_id, []).append(invocation)
+        # Invocations at the depth limit keep their lazy `uses`.
+        for invocation in [*invocations, *(invocation for invocation, depth in descendants if depth < max_depth)]:
+            set_committed_value(invocation, "uses", children.get(invocation.id, []))
+
+    def get_traces(
+        self,
+        session: Session,
+        invocation_id: Optional[str] = None,
+        lmp_id: Optional[str] = None,
+        max_depth: int = 10,
+        direction: str = "both",
+    ) -> List[Dict[str, Any]]:
+        """
+        The LMP-level trace graph: one `{"consumer", "consumed", "count"}` edge per pair of LMPs where invocations
+        of `consumer` consumed the outputs of invocations of `consumed`, with the number of such invocation pairs.
+
+        Scoped to `invocation_id` or `lmp_id`, only the part of the graph reachable from it within `max_depth`
+        steps is returned: `direction` "upstream" follows what it consumed, "downstream" what consumed it, and
+        "both" does both. Without a scope the whole database's graph is returned.
         """
+        assert direction in ("upstream", "downstream", "both"), "direction must be upstream, downstream or both."
+        assert invocation_id is None or lmp_id is None, "Scope the trace graph to an invocation or an LMP, not both."
+        consumer, consumed = aliased(Invocation), aliased(Invocation)
+        query = (
+            select(consumer.lmp_id, consumed.lmp_id, func.count())
+            .select_from(InvocationTrace)
+            .join(consumer, consumer.id == InvocationTrace.invocation_consumer_id)
+            .join(consumed, consumed.id == InvocationTrace.invocation_consuming_id)
+            .group_by(consumer.lmp_id, consumed.lmp_id)
         )
-        results = session.exec(query).all()
 
-        traces = []
-        for (
-            consumer_lmp_id,
-            consumer_invocation_id,
-            consumed_invocation_id,
-            consumed_lmp_id,
-        ) in results:
-            traces.append({"consumer": consumer_lmp_id, "consumed": consumed_lmp_id})
+        if invocation_id is not None or lmp_id is not None:
+            if invocation_id is not None:
+                seeds = select(Invocation.id.label("node"), literal(0).label("depth")).where(Invocation.id == invocation_id)
+                upstream_edges = select(
+                    InvocationTrace.invocation_consumer_id.label("source"),
+                    InvocationTrace.invocation_consuming_id.label("target"),
+                ).subquery()
+                endpoints = (InvocationTrace.invocation_consumer_id, InvocationTrace.invocation_consuming_id)
+            else:
+                seeds = select(SerializedLMP.lmp_id.label("node"), literal(0).label("depth")).where(SerializedLMP.lmp_id == lmp_id)
+                edge_consumer, edge_consumed = aliased(Invocation), aliased(Invocation)
+                upstream_edges = (
+                    select(edge_consumer.lmp_id.label("source"), edge_consumed.lmp_id.label("target"))
+                    .select_from(InvocationTrace)
+                    .join(edge_consumer, edge_consumer.id == InvocationTrace.invocation_consumer_id)
+                    .join(edge_consumed, edge_consumed.id == InvocationTrace.invocation_consuming_id)
+                    .subquery()
+                )
+                endpoints = (consumer.lmp_id, consumed.lmp_id)
+            downstream_edges = select(
+                upstream_edges.c.target.label("source"), upstream_edges.c.source.label("target")
+            ).subquery()
+
+            walks = []
+            if direction in ("upstream", "both"):
+                walks.append(_reachable(seeds, upstream_edges, max_depth, name="upstream"))
+            if direction in ("downstream", "both"):
+                walks.append(_reachable(seeds, downstream_edges, max_depth, name="downstream"))
+            reached = union(*(select(walk.c.node) for walk in walks)) if len(walks) > 1 else select(walks[0].c.node)
+            reached = reached.subquery()
+            query = query.where(*(endpoint.in_(select(reached.c.node)) for endpoint in endpoints))
+
+        return [
+            {"consumer": consumer_lmp_id, "consumed": consumed_lmp_id, "count": count}
+            for consumer_lmp_id, consumed_lmp_id, count in session.exec(query).all()
+        ]
 
-        return traces
+    def _time_bucket(self, session: Session, column: Any, bucket: str) -> Any:
+        """`column` truncated to the start of its minute, hour or day, in SQL."""
+        assert bucket in _SQLITE_BUCKET_FORMATS, f"bucket must be one of {', '.join(_SQLITE_BUCKET_FORMATS)}."
+        if session.get_bind().dialect.name == "sqlite":
+            return func.strftime(_SQLITE_BUCKET_FORMATS[bucket], column)
+        return func.date_trunc(bucket, column)
 
     def get_invocations_aggregate(
         self,
@@ -322,65 +759,186 @@ class SQLStore(ell.stores.store.Store):
         lmp_filters: Dict[str, Any] = None,
         filters: Dict[str, Any] = None,
         days: int = 30,
+        bucket: Optional[str] = None,
     ) -> Dict[str, Any]:
-        # Calculate the start date for the graph data
+        """
+        Invocation totals over the last `days` days and, per time bucket, the invocation count, token sums, mean
+        latency and latency percentiles. Everything is aggregated in the database, so the result has one graph point
+        per non-empty bucket however many invocations there are.
+
+        Hourly and daily aggregates that filter invocations by nothing but their LMP are read from the invocation
+        rollups, with percentiles estimated from their latency histograms; others scan the invocations and compute
+        percentiles by nearest rank.
+
+        :param bucket: "minute", "hour" or "day". Defaults to hours for up to two days and days otherwise.
+        """
+        bucket = bucket or ("hour" if days <= 2 else "day")
         start_date = datetime.utcnow() - timedelta(days=days)
+        if bucket != "minute" and set(filters or {}) <= {"lmp_id"}:
+            return self._get_rollups_aggregate(session, lmp_filters, filters, start_date, bucket)
+
+        conditions = [Invocation.created_at >= start_date]
+        if lmp_filters:
+            conditions.extend(getattr(SerializedLMP, k) == v for k, v in lmp_filters.items())
+        if filters:
+            conditions.extend(getattr(Invocation, k) == v for k, v in filters.items())
 
-        # Base subquery
-        base_subquery = (
+        prompt_tokens = func.coalesce(Invocation.prompt_tokens, 0)
+        completion_tokens = func.coalesce(Invocation.completion_tokens, 0)
+        totals = session.exec(
             select(
-                Invocation.created_at,
+                func.count(),
+                func.sum(prompt_tokens + completion_tokens),
+                func.avg(Invocation.latency_ms),
+                func.count(func.distinct(Invocation.lmp_id)),
+            )
+            .select_from(Invocation)
+            .join(SerializedLMP, Invocation.lmp_id == SerializedLMP.lmp_id)
+            .where(*conditions)
+        ).one()
+
+        # Rank each invocation's latency within its bucket; a percentile is then the lowest latency ranked at or
+        # above that fraction of the bucket.
+        time_bucket = self._time_bucket(session, Invocation.created_at, bucket)
+        ranked = (
+            select(
+                time_bucket.label("bucket"),
                 Invocation.latency_ms,
-                Invocation.prompt_tokens,
-                Invocation.completion_tokens,
-                Invocation.lmp_id,
+                prompt_tokens.label("prompt_tokens"),
+                completion_tokens.label("completion_tokens"),
+                func.row_number().over(partition_by=time_bucket, order_by=Invocation.latency_ms).label("rank"),
+                func.count().over(partition_by=time_bucket).label("size"),
             )
             .join(SerializedLMP, Invocation.lmp_id == SerializedLMP.lmp_id)
-            .filter(Invocation.created_at >= start_date)
+            .where(*conditions)
+            .subquery()
         )
+        percentiles = [
+            func.min(case((ranked.c.rank >= fraction * ranked.c.size, ranked.c.latency_ms)))
+            for fraction in (0.5, 0.95, 0.99)
+        ]
+        buckets = session.exec(
+            select(
+                ranked.c.bucket,
+                func.count(),
+                func.sum(ranked.c.prompt_tokens),
+                func.sum(ranked.c.completion_tokens),
+                func.avg(ranked.c.latency_ms),
+                *percentiles,
+            )
+            .group_by(ranked.c.bucket)
+            .order_by(ranked.c.bucket)
+        ).all()
 
-        # Apply filters
-        if lmp_filters:
-            base_subquery = base_subquery.filter(
-                and_(*[getattr(SerializedLMP, k) == v for k, v in lmp_filters.items()])
+        graph_data = []
+        for date, count, bucket_prompt_tokens, bucket_completion_tokens, avg_latency, p50, p95, p99 in buckets:
+            if isinstance(date, str):
+                date = datetime.fromisoformat(date).replace(tzinfo=timezone.utc)
+            graph_data.append(
+                {
+                    "date": date,
+                    "count": count,
+                    "tokens": bucket_prompt_tokens + bucket_completion_tokens,
+                    "prompt_tokens": bucket_prompt_tokens,
+                    "completion_tokens": bucket_completion_tokens,
+                    "avg_latency": avg_latency,
+                    "latency_p50": p50,
+                    "latency_p95": p95,
+                    "latency_p99": p99,
+                }
             )
+
+        total_invocations, total_tokens, avg_latency, unique_lmps = totals
+        return {
+            "total_invocations": total_invocations,
+            "total_tokens": total_tokens or 0,
+            "avg_latency": avg_latency or 0,
+            "unique_lmps": unique_lmps,
+            "bucket": bucket,
+            "graph_data": graph_data,
+        }
+
+    def _get_rollups_aggregate(
+        self,
+        session: Session,
+        lmp_filters: Optional[Dict[str, Any]],
+        filters: Optional[Dict[str, Any]],
+        start_date: datetime,
+        bucket: str,
+    ) -> Dict[str, Any]:
+        conditions = [InvocationRollup.bucket_start >= start_date.replace(minute=0, second=0, microsecond=0), InvocationRollup.count > 0]
+        if lmp_filters:
+            conditions.extend(getattr(SerializedLMP, k) == v for k, v in lmp_filters.items())
         if filters:
-            base_subquery = base_subquery.filter(
-                and_(*[getattr(Invocation, k) == v for k, v in filters.items()])
+            conditions.extend(getattr(InvocationRollup, k) == v for k, v in filters.items())
+
+        def aggregate(*columns: Any) -> Any:
+            return (
+                select(*columns)
+                .select_from(InvocationRollup)
+                .join(SerializedLMP, InvocationRollup.lmp_id == SerializedLMP.lmp_id)
+                .where(*conditions)
             )
 
-        data = session.exec(base_subquery).all()
-
-        # Calculate aggregate metrics
-        total_invocations = len(data)
-        total_tokens = sum(row.prompt_tokens + row.completion_tokens for row in data)
-        avg_latency = (
-            sum(row.latency_ms for row in data) / total_invocations
-            if total_invocations > 0
-            else 0
-        )
-        unique_lmps = len(set(row.lmp_id for row in data))
+        total_invocations, total_tokens, latency_ms_sum, unique_lmps = session.exec(
+            aggregate(
+                func.sum(InvocationRollup.count),
+                func.sum(InvocationRollup.prompt_tokens + InvocationRollup.completion_tokens),
+                func.sum(InvocationRollup.latency_ms_sum),
+                func.count(func.distinct(InvocationRollup.lmp_id)),
+            )
+        ).one()
+
+        time_bucket = self._time_bucket(session, InvocationRollup.bucket_start, bucket)
+        buckets = session.exec(
+            aggregate(
+                time_bucket,
+                func.sum(InvocationRollup.count),
+                func.sum(InvocationRollup.prompt_tokens),
+                func.sum(InvocationRollup.completion_tokens),
+                func.sum(InvocationRollup.latency_ms_sum),
+                *(func.sum(getattr(InvocationRollup, field)) for field in HISTOGRAM_FIELDS),
+            )
+            .group_by(time_bucket)
+            .order_by(time_bucket)
+        ).all()
 
-        # Prepare graph data
         graph_data = []
-        for row in data:
+        for date, count, bucket_prompt_tokens, bucket_completion_tokens, bucket_latency_ms_sum, *histogram in buckets:
+            if isinstance(date, str):
+                date = datetime.fromisoformat(date).replace(tzinfo=timezone.utc)
             graph_data.append(
                 {
-                    "date": row.created_at,
-                    "avg_latency": row.latency_ms,
-                    "tokens": row.prompt_tokens + row.completion_tokens,
-                    "count": 1,
+                    "date": date,
+                    "count": count,
+                    "tokens": bucket_prompt_tokens + bucket_completion_tokens,
+                    "prompt_tokens": bucket_prompt_tokens,
+                    "completion_tokens": bucket_completion_tokens,
+                    "avg_latency": bucket_latency_ms_sum / count,
+                    "latency_p50": histogram_percentile(histogram, 0.5),
+                    "latency_p95": histogram_percentile(histogram, 0.95),
+                    "latency_p99": histogram_percentile(histogram, 0.99),
                 }
             )
 
         return {
-            "total_invocations": total_invocations,
-            "total_tokens": total_tokens,
-            "avg_latency": avg_latency,
+            "total_invocations": total_invocations or 0,
+            "total_tokens": total_tokens or 0,
+            "avg_latency": latency_ms_sum / total_invocations if total_invocations else 0,
             "unique_lmps": unique_lmps,
+            "bucket": bucket,
             "graph_data": graph_data,
         }
 
+    def get_lmp_history(self, session: Session, days: int = 365) -> List[Dict[str, Any]]:
+        """The number of LMP versions created per day over the last `days` days."""
+        start_date = datetime.utcnow() - timedelta(days=days)
+        day = self._time_bucket(session, SerializedLMP.created_at, "day")
+        rows = session.exec(
+            select(day, func.count()).where(SerializedLMP.created_at >= start_date).group_by(day).order_by(day)
+        ).all()
+        return [{"date": str(date), "count": count} for date, count in rows]
+
     def get_evaluations(
         self, session: Session, filters: Dict[str, Any], skip: int = 0, limit: int = 100
     ) -> List[SerializedEvaluation]:
@@ -428,7 +986,7 @@ class SQLStore(ell.stores.store.Store):
         return list(results)
 
     def get_eval_versions_by_name(self, name: str) -> List[SerializedEvaluation]:
-        with Session(self.engine) as session:
+        with Session(self.read_engine) as session:
             query = select(SerializedEvaluation).where(
                 SerializedEvaluation.name == name
             )
@@ -450,7 +1008,11 @@ class SQLStore(ell.stores.store.Store):
 
         return result
     
-    def get_evaluation_run_results(self, session: Session, run_id: str,  skip: int = 0, limit: int = 100, filters : Optional[Dict[str, Any]] = None) -> List[EvaluationResultDatapoint]:
+    def get_evaluation_run_results(self, session: Session, run_id: str,  skip: int = 0, limit: int = 100, filters : Optional[Dict[str, Any]] = None, cursor: Optional[str] = None) -> List[EvaluationResultDatapoint]:
+        """
+        Results of an evaluation run in the order they were written. The cursor of the page after `page` is
+        `next_cursor(page, "id")`.
+        """
         query = select(EvaluationResultDatapoint).where(
             EvaluationResultDatapoint.evaluation_run_id == run_id
         )
@@ -459,22 +1021,111 @@ class SQLStore(ell.stores.store.Store):
             for key, value in filters.items():
                 query = query.where(getattr(EvaluationResultDatapoint, key) == value)
 
-        query = query.offset(skip).limit(limit)
+        if cursor is not None:
+            query = query.where(after_cursor((EvaluationResultDatapoint.id,), cursor, descending=False))
+
+        query = query.order_by(EvaluationResultDatapoint.id).offset(skip).limit(limit)
         
         results = session.exec(query).all()
         print(f"Found {len(results)} results for run {run_id}")
         return list(results)
 
 
+def _reachable(seeds: Any, edges: FromClause, max_depth: int, name: str = "walk") -> Any:
+    """
+    A recursive CTE of the (node, depth) pairs reachable from `seeds` (a select of node and depth 0) along `edges`
+    (a selectable with source and target columns) within `max_depth` steps.
+    """
+    walk = seeds.cte(name, recursive=True)
+    step = (
+        select(edges.c.target, walk.c.depth + 1)
+        .join_from(walk, edges, edges.c.source == walk.c.node)
+        .where(walk.c.depth < max_depth, edges.c.target.isnot(None))
+    )
+    return walk.union(step)
+
+
+def _table_row(model: SQLModel, **overrides: Any) -> Dict[str, Any]:
+    """Column values of a table model as a plain dict, for executemany-style inserts."""
+    row = {column.name: getattr(model, column.name) for column in model.__table__.columns}
+    row.update(overrides)
+    return row
+
+
 class SQLiteStore(SQLStore):
-    def __init__(self, db_dir: str):
+    def __init__(
+        self,
+        db_dir: str,
+        high_concurrency: bool = False,
+        busy_timeout: float = 30.0,
+        mmap_size: int = 256 * 1024 * 1024,
+        pool_size: int = 8,
+        blob_store: Optional[ell.stores.store.BlobStore] = None,
+        **kwargs: Any,
+    ):
+        """
+        :param db_dir: Directory holding ell.db and the blob store.
+        :param high_concurrency: If True, tune SQLite for many concurrent writers: WAL journaling, synchronous=NORMAL,
+            memory-mapped reads, a pooled set of connections and write transactions that take the write lock up front
+            (BEGIN IMMEDIATE) so they wait on `busy_timeout` instead of failing with "database is locked".
+        :param busy_timeout: Seconds a connection waits for a lock before giving up.
+        :param mmap_size: Bytes of the database file to memory map (high_concurrency only).
+        :param pool_size: Number of pooled connections kept open (high_concurrency only).
+        :param blob_store: Blob store to use instead of one gzip file per blob under `db_dir`, e.g. a
+            `ell.stores.segments.SegmentBlobStore`.
+        """
         assert not db_dir.endswith(".db"), "Create store with a directory not a db."
 
         os.makedirs(db_dir, exist_ok=True)
         self.db_dir = db_dir
+        self.high_concurrency = high_concurrency
+        self.busy_timeout = busy_timeout
+        self.mmap_size = mmap_size
+        self.pool_size = pool_size
         db_path = os.path.join(db_dir, "ell.db")
-        blob_store = SQLBlobStore(db_dir)
-        super().__init__(f"sqlite:///{db_path}", blob_store=blob_store)
+        blob_store = blob_store or SQLBlobStore(db_dir)
+        super().__init__(sqlalchemy.URL.create("sqlite", database=db_path), blob_store=blob_store, **kwargs)
+        # Read-only connections can never take the write lock, so studio queries don't contend with tracked writes.
+        # The path is percent-encoded for SQLite's URI parser, and the URL built from parts so SQLAlchemy doesn't
+        # decode it again.
+        read_only_url = sqlalchemy.URL.create(
+            "sqlite", database=f"file:{quote(db_path)}", query=dict(mode="ro", uri="true")
+        )
+        self._read_engine = self._create_engine(read_only_url, read_only=True)
+
+    @property
+    def read_engine(self) -> Engine:
+        return self._read_engine
+
+    def _create_engine(self, db_uri: Union[str, sqlalchemy.URL], read_only: bool = False) -> Engine:
+        engine_kwargs: Dict[str, Any] = dict(connect_args=dict(timeout=self.busy_timeout, check_same_thread=False))
+        if self.high_concurrency:
+            engine_kwargs.update(poolclass=QueuePool, pool_size=self.pool_size, max_overflow=self.pool_size * 2)
+        engine = super()._create_engine(db_uri, **engine_kwargs)
+
+        @event.listens_for(engine, "connect")
+        def _configure_connection(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            if read_only:
+                cursor.execute("PRAGMA query_only=ON")
+            if self.high_concurrency:
+                if not read_only:
+                    cursor.execute("PRAGMA journal_mode=WAL")
+                    # Let SQLAlchemy emit BEGIN itself (see below) rather than pysqlite's implicit deferred BEGIN.
+                    dbapi_connection.isolation_level = None
+                cursor.execute("PRAGMA synchronous=NORMAL")
+                cursor.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            cursor.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            cursor.close()
+
+        if self.high_concurrency and not read_only:
+            # A deferred transaction that reads before it writes can't wait for the write lock in WAL mode and
+            # fails immediately with SQLITE_BUSY; taking the lock up front makes writers queue on busy_timeout.
+            @event.listens_for(engine, "begin")
+            def _begin_immediate(conn):
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+        return engine
 
 
 class SQLBlobStore(ell.stores.store.BlobStore):
@@ -505,5 +1156,5 @@ class SQLBlobStore(ell.stores.store.BlobStore):
 
 
 class PostgresStore(SQLStore):
-    def __init__(self, db_uri: str):
-        super().__init__(db_uri)
+    def __init__(self, db_uri: str, **kwargs: Any):
+        super().__init__(db_uri, **kwargs)
@@ -1,13 +1,16 @@
+import json
 from abc import ABC, abstractmethod
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Any, Optional, Dict, List, Set, Union
+from typing import Any, Optional, Dict, List, Sequence, Set, Tuple, Union
 from ell.types._lstr import _lstr
-from ell.stores.models.core import SerializedLMP, Invocation
+from ell.stores.models.core import PromptCacheEntry, SerializedLMP, Invocation
 from ell.types.message import InvocableLM
 from ell.stores.models.evaluations import EvaluationResultDatapoint, EvaluationRunLabelerSummary, SerializedEvaluation, SerializedEvaluationRun
 # from ell.types.studio import SerializedEvaluation, SerializedEvaluationRun
 
+INVOCATION_CONTENTS_FIELDS = ("params", "results", "invocation_api_params", "global_vars", "free_vars")
+
 class BlobStore(ABC):
     @abstractmethod
     def store_blob(self, blob: bytes, blob_id  : str) -> str:
@@ -31,6 +34,20 @@ class Store(ABC):
     def has_blob_storage(self) -> bool:
         return self.blob_store is not None
 
+    def load_invocation_contents(self, invocation: Invocation) -> Dict[str, Any]:
+        """
+        The params, results, api params and variables of an invocation, read from the blob store if they were
+        externalized.
+        """
+        contents = invocation.contents
+        if contents is None:
+            return {}
+        if contents.is_external and self.has_blob_storage:
+            data = json.loads(self.blob_store.retrieve_blob(invocation.id))
+            return {field: data.get(field) for field in INVOCATION_CONTENTS_FIELDS}
+        # Attribute reads, not model_dump: compressed fields are only decompressed when read.
+        return {field: getattr(contents, field) for field in INVOCATION_CONTENTS_FIELDS}
+
     @abstractmethod
     def write_lmp(self, serialized_lmp: SerializedLMP, uses: Dict[str, Any]) -> Optional[Any]:
         """
@@ -54,6 +71,23 @@ class Store(ABC):
         """
         pass
 
+    def write_invocations(self, invocations: Sequence[Tuple[Invocation, Set[str]]]) -> int:
+        """
+        Write many invocations at once.
+
+        :param invocations: Pairs of (invocation, set of invocation IDs consumed by it).
+        :return: The number of invocations written.
+        """
+        for invocation, consumes in invocations:
+            self.write_invocation(invocation, consumes)
+        return len(invocations)
+
+    def flush(self) -> None:
+        """
+        Block until all buffered writes have been persisted. Stores that write synchronously don't need to override this.
+        """
+        pass
+
     @abstractmethod
     def write_evaluation(self, evaluation: SerializedEvaluation) -> str:
         """
@@ -106,6 +140,18 @@ class Store(ABC):
         """
         pass
 
+    def get_prompt_cache_entry(self, prompt_cache_key: str) -> Optional[PromptCacheEntry]:
+        """
+        Get the cached provider response for a prompt cache key. Stores without a prompt cache return None.
+        """
+        return None
+
+    def write_prompt_cache_entry(self, entry: PromptCacheEntry) -> None:
+        """
+        Cache a provider response under its prompt cache key. Stores without a prompt cache ignore it.
+        """
+        pass
+
     @abstractmethod
     def get_versions_by_fqn(self, fqn :str) -> List[SerializedLMP]:
         """
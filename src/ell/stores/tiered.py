@@ -0,0 +1,222 @@
+"""
+Tiered cache store.
+
+`Store.freeze` serves cached invocations from a single store. A `TieredStore` chains several: lookups check an
+in-process memo, then each tier in order (typically a node-local `SQLiteStore`, then a shared `PostgresStore`), and
+a hit in a lower tier is copied into every tier above it, so the next lookup for it is answered locally.
+
+    cache = TieredStore(
+        CacheTier(SQLiteStore("/var/cache/ell", cache_memo_size=0), max_entries=100_000),
+        CacheTier(PostgresStore(db_uri), ttl=30 * 24 * 3600),
+    )
+    with cache.freeze(my_lmp):
+        my_lmp(...)
+
+Everything that is not a cache lookup (writing LMPs and invocations, versions, evaluations) goes to the last tier,
+so a `TieredStore` can also be passed to `ell.init(store=...)`.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from sqlmodel import Session, select
+
+from ell.stores.memo import MemoCache
+from ell.stores.models.core import Invocation, InvocationContents, PromptCacheEntry, SerializedLMP
+from ell.stores.models.evaluations import (
+    EvaluationResultDatapoint,
+    EvaluationRunLabelerSummary,
+    SerializedEvaluation,
+    SerializedEvaluationRun,
+)
+from ell.stores.sql import SQLStore
+from ell.stores.store import Store
+from ell.util.serialization import utc_now
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheTier:
+    """
+    :param store: The store backing this tier.
+    :param max_entries: Maximum number of cached invocations kept in the store. When promotions push it over, the
+        least recently used are evicted (see `SQLStore.evict_cached_invocations`). None keeps everything; use it for
+        the shared tier.
+    :param ttl: Seconds after which an entry this tier has neither stored nor served is too old to be served from
+        it; lookups fall through. Entries never used through a tier count from when they were created.
+    :param promote: Whether hits from lower tiers are copied into this tier.
+    """
+    store: SQLStore
+    max_entries: Optional[int] = None
+    ttl: Optional[float] = None
+    promote: bool = True
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def tracks_use(self) -> bool:
+        """Whether eviction or expiry in this tier depends on when its entries were last used."""
+        return self.max_entries is not None or self.ttl is not None
+
+    def is_fresh(self, entry: Union[Invocation, PromptCacheEntry]) -> bool:
+        last_used_at = entry.last_used_at or entry.created_at
+        return self.ttl is None or last_used_at >= utc_now() - timedelta(seconds=self.ttl)
+
+
+def _detached(store: SQLStore, invocation: Invocation) -> Invocation:
+    """
+    A copy of a cached invocation with its contents inlined, unlinked from the calls around it, and used now (so a
+    tier it is promoted into keeps it as a recently used entry).
+    """
+    return Invocation(
+        id=invocation.id,
+        lmp_id=invocation.lmp_id,
+        latency_ms=invocation.latency_ms,
+        prompt_tokens=invocation.prompt_tokens,
+        completion_tokens=invocation.completion_tokens,
+        state_cache_key=invocation.state_cache_key,
+        created_at=invocation.created_at,
+        last_used_at=utc_now(),
+        contents=InvocationContents(invocation_id=invocation.id, **store.load_invocation_contents(invocation)),
+    )
+
+
+class TieredStore(Store):
+    def __init__(self, *tiers: CacheTier, cache_memo_size: int = 1024, cache_memo_ttl: Optional[float] = None):
+        """
+        :param tiers: Store tiers, fastest first. The last one is authoritative.
+        :param cache_memo_size: Number of cache hits kept in process memory in front of the store tiers.
+            0 disables the memo.
+        :param cache_memo_ttl: If set, seconds after which a memoized hit is looked up in the tiers again.
+        """
+        assert tiers, "A TieredStore needs at least one tier."
+        self.tiers = list(tiers)
+        self.cache_memo: Optional[MemoCache[List[Invocation]]] = (
+            MemoCache(cache_memo_size, cache_memo_ttl) if cache_memo_size else None
+        )
+        # Invocations written through this store land in the last tier, and so do their blobs.
+        super().__init__(self.authoritative.blob_store)
+
+    @property
+    def authoritative(self) -> SQLStore:
+        return self.tiers[-1].store
+
+    def get_cached_invocations(self, lmp_id: str, state_cache_key: str) -> List[Invocation]:
+        key = (lmp_id, state_cache_key)
+        if self.cache_memo is not None and (invocations := self.cache_memo.get(key)) is not None:
+            return list(invocations)
+
+        for depth, tier in enumerate(self.tiers):
+            invocations = [i for i in tier.store.get_cached_invocations(lmp_id, state_cache_key) if tier.is_fresh(i)]
+            if not invocations:
+                tier.misses += 1
+                continue
+            tier.hits += 1
+            if tier.tracks_use:
+                self._mark_used(tier, invocations)
+            invocations = [_detached(tier.store, invocation) for invocation in invocations]
+            for upper in self.tiers[:depth]:
+                if upper.promote:
+                    self._promote(upper, tier.store, lmp_id, state_cache_key, invocations)
+            if self.cache_memo is not None:
+                self.cache_memo.put(key, list(invocations))
+            return invocations
+        return []
+
+    def _promote(
+        self, tier: CacheTier, source: SQLStore, lmp_id: str, state_cache_key: str, invocations: List[Invocation]
+    ) -> None:
+        # A tier that can't be written to only costs the promotion, never the cache hit.
+        try:
+            with Session(tier.store.engine) as session:
+                has_lmp = session.get(SerializedLMP, lmp_id) is not None
+                existing = set(
+                    session.exec(select(Invocation.id).where(Invocation.id.in_([i.id for i in invocations]))).all()
+                )
+            if not has_lmp:
+                with Session(source.read_engine) as session:
+                    lmp = session.get(SerializedLMP, lmp_id)
+                    lmp = SerializedLMP(**dict(lmp.model_dump(), num_invocations=0))
+                tier.store.write_lmp(lmp, {})
+            tier.store.write_invocations([(i, set()) for i in invocations if i.id not in existing])
+            # Copies the tier already has were stale there; they are fresh again now.
+            tier.store.mark_cached_invocations_used(list(existing))
+            if tier.store.cache_memo is not None:
+                tier.store.cache_memo.invalidate((lmp_id, state_cache_key))
+            if tier.max_entries is not None:
+                tier.store.evict_cached_invocations(tier.max_entries)
+        except Exception:
+            logger.exception(f"Failed to promote cached invocations of {lmp_id} into {type(tier.store).__name__}.")
+
+    def _mark_used(self, tier: CacheTier, invocations: List[Invocation]) -> None:
+        try:
+            tier.store.mark_cached_invocations_used([i.id for i in invocations])
+        except Exception:
+            logger.exception(f"Failed to mark cached invocations used in {type(tier.store).__name__}.")
+            return
+        # The store may have memoized these instances; keep them in step with the database.
+        now = utc_now()
+        for invocation in invocations:
+            invocation.last_used_at = now
+
+    def get_prompt_cache_entry(self, prompt_cache_key: str) -> Optional[PromptCacheEntry]:
+        for depth, tier in enumerate(self.tiers):
+            entry = tier.store.get_prompt_cache_entry(prompt_cache_key)
+            if entry is None or not tier.is_fresh(entry):
+                continue
+            if tier.ttl is not None:
+                tier.store.mark_prompt_cache_entry_used(prompt_cache_key)
+                entry.last_used_at = utc_now()
+            for upper in self.tiers[:depth]:
+                if upper.promote:
+                    upper.store.write_prompt_cache_entry(
+                        PromptCacheEntry(**dict(entry.model_dump(), last_used_at=utc_now()))
+                    )
+            return entry
+        return None
+
+    def write_prompt_cache_entry(self, entry: PromptCacheEntry) -> None:
+        self.authoritative.write_prompt_cache_entry(entry)
+
+    def write_lmp(self, serialized_lmp: SerializedLMP, uses: Dict[str, Any]) -> Optional[Any]:
+        return self.authoritative.write_lmp(serialized_lmp, uses)
+
+    def write_invocation(self, invocation: Invocation, consumes: Set[str]) -> Optional[Any]:
+        return self.authoritative.write_invocation(invocation, consumes)
+
+    def write_invocations(self, invocations: Sequence[Tuple[Invocation, Set[str]]]) -> int:
+        return self.authoritative.write_invocations(invocations)
+
+    def flush(self) -> None:
+        for tier in self.tiers:
+            tier.store.flush()
+
+    def write_evaluation(self, evaluation: SerializedEvaluation) -> str:
+        return self.authoritative.write_evaluation(evaluation)
+
+    def write_evaluation_run(self, evaluation_run: SerializedEvaluationRun) -> int:
+        return self.authoritative.write_evaluation_run(evaluation_run)
+
+    def write_evaluation_run_intermediate(self, row_result: EvaluationResultDatapoint) -> None:
+        return self.authoritative.write_evaluation_run_intermediate(row_result)
+
+    def write_evaluation_run_end(
+        self,
+        evaluation_run_id: str,
+        successful: bool,
+        end_time: datetime,
+        error: Optional[str],
+        summaries: List[EvaluationRunLabelerSummary],
+    ) -> None:
+        return self.authoritative.write_evaluation_run_end(evaluation_run_id, successful, end_time, error, summaries)
+
+    def write_evaluation_run_labeler_summaries(self, summaries: List[EvaluationRunLabelerSummary]) -> int:
+        return self.authoritative.write_evaluation_run_labeler_summaries(summaries)
+
+    def get_versions_by_fqn(self, fqn: str) -> List[SerializedLMP]:
+        return self.authoritative.get_versions_by_fqn(fqn)
+
+    def get_eval_versions_by_name(self, name: str) -> List[SerializedEvaluation]:
+        return self.authoritative.get_eval_versions_by_name(name)
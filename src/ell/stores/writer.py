@@ -0,0 +1,107 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Set, Tuple
+
+from ell.stores.models.core import Invocation
+
+logger = logging.getLogger(__name__)
+
+PendingInvocation = Tuple[Invocation, Set[str]]
+
+_CLOSE = object()
+
+
+class InvocationWriter:
+    """
+    Write-behind queue for invocations.
+
+    Tracked calls enqueue their invocation and return immediately; a single background thread drains the queue
+    and hands batches to `write_batch`. A batch is flushed once it holds `batch_size` invocations or once
+    `flush_interval` seconds have passed since its first invocation, whichever comes first. The queue is bounded
+    by `max_queue_size`, so when the store can't keep up callers block in `submit` instead of buffering without
+    limit. Pending invocations are flushed when the interpreter exits.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[PendingInvocation]], None],
+        batch_size: int = 100,
+        flush_interval: float = 0.5,
+        max_queue_size: int = 10000,
+    ):
+        assert batch_size > 0, "batch_size must be positive."
+        self.write_batch = write_batch
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="ell-invocation-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, invocation: Invocation, consumes: Set[str]) -> None:
+        """Enqueue an invocation for writing. Blocks while the queue is full."""
+        if self._closed:
+            raise RuntimeError("Cannot submit invocations to a closed InvocationWriter.")
+        self._queue.put((invocation, consumes))
+
+    def flush(self) -> None:
+        """Block until every invocation submitted so far has been written."""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        """Flush pending invocations and stop the background thread."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_CLOSE)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _CLOSE:
+                self._queue.task_done()
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            closing = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _CLOSE:
+                    closing = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if closing:
+                self._queue.task_done()
+                return
+
+    def _write(self, batch: List[PendingInvocation]) -> None:
+        try:
+            self.write_batch(batch)
+        except Exception:
+            if len(batch) == 1:
+                logger.exception(f"Failed to write invocation {batch[0][0].id}.")
+                return
+            # Isolate the offending invocations so one bad row doesn't drop the whole batch.
+            for pending in batch:
+                self._write([pending])
@@ -73,11 +73,15 @@ def main():
 
     async def db_watcher(db_path, app):
         last_stat = None
+        # In WAL mode (SQLiteStore(high_concurrency=True)) commits only append to the -wal file.
+        wal_path = db_path / "ell.db-wal"
+        last_wal_mtime = None
 
         while True:
             await asyncio.sleep(0.1)  # Fixed interval of 0.1 seconds
             try:
                 current_stat = db_path.stat()
+                current_wal_mtime = wal_path.stat().st_mtime_ns if wal_path.exists() else None
                 
                 if last_stat is None:
                     logger.info(f"Database file found: {db_path}")
@@ -88,8 +92,9 @@ def main():
                     time_changed = abs(current_stat.st_mtime - last_stat.st_mtime) > time_threshold
                     size_changed = current_stat.st_size != last_stat.st_size
                     inode_changed = current_stat.st_ino != last_stat.st_ino
+                    wal_changed = current_wal_mtime != last_wal_mtime
 
-                    if time_changed or size_changed or inode_changed:
+                    if time_changed or size_changed or inode_changed or wal_changed:
                         logger.info(
                             f"Database changed: mtime {time.ctime(last_stat.st_mtime)} -> {time.ctime(current_stat.st_mtime)}, "
                             f"size {last_stat.st_size} -> {current_stat.st_size}, "
@@ -98,6 +103,7 @@ def main():
                         await app.notify_clients("database_updated")
                 
                 last_stat = current_stat
+                last_wal_mtime = current_wal_mtime
             except FileNotFoundError:
                 if last_stat is not None:
                     logger.info(f"Database file deleted: {db_path}")
@@ -1,5 +1,6 @@
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import Annotated, List, Optional, Dict, Any
+from pydantic import BeforeValidator
 from sqlmodel import SQLModel
 from ell.stores.models.evaluations import (
     EvaluationLabelBase,
@@ -12,6 +13,19 @@ from ell.stores.models.evaluations import (
 from ell.stores.models.core import SerializedLMPBase, InvocationBase, InvocationContentsBase
 
 
+def _read_contents(contents: Any) -> Any:
+    # Serializing a contents row reads its __dict__, which lacks the fields still compressed (see
+    # ell.stores.compression); reading them as attributes decompresses them. Constructed, so they serialize as stored.
+    if isinstance(contents, InvocationContentsBase):
+        return InvocationContentsBase.model_construct(
+            **{field: getattr(contents, field) for field in InvocationContentsBase.model_fields}
+        )
+    return contents
+
+
+InvocationContentsPublic = Annotated[InvocationContentsBase, BeforeValidator(_read_contents)]
+
+
 class SerializedLMPWithUses(SerializedLMPBase):
     lmp_id : str
     uses: List[SerializedLMPBase]
@@ -20,7 +34,7 @@ class SerializedLMPWithUses(SerializedLMPBase):
 class InvocationPublic(InvocationBase):
     lmp: SerializedLMPBase
     uses: List["InvocationPublicWithConsumes"] 
-    contents: InvocationContentsBase
+    contents: InvocationContentsPublic
 
 class InvocationPublicWithConsumes(InvocationPublic):
     consumes: List[InvocationPublic]
@@ -29,7 +43,7 @@ class InvocationPublicWithConsumes(InvocationPublic):
 
 class InvocationPublicWithoutLMP(InvocationBase):
     uses : List["InvocationPublicWithoutLMPAndConsumes"]
-    contents: InvocationContentsBase
+    contents: InvocationContentsPublic
 
 
 class InvocationPublicWithoutLMPAndConsumes(InvocationPublicWithoutLMP):
@@ -42,8 +56,13 @@ from pydantic import BaseModel
 class GraphDataPoint(BaseModel):
     date: datetime
     count: int
-    avg_latency: float
+    avg_latency: Optional[float] = None
     tokens: int
+    prompt_tokens: int
+    completion_tokens: int
+    latency_p50: Optional[float] = None
+    latency_p95: Optional[float] = None
+    latency_p99: Optional[float] = None
     # cost: float
 
 class InvocationsAggregate(BaseModel):
@@ -52,11 +71,21 @@ class InvocationsAggregate(BaseModel):
     avg_latency: float
     # total_cost: float
     unique_lmps: int
+    bucket: str
     # successful_invocations: int
     # success_rate: float
     graph_data: List[GraphDataPoint]
 
 
+class InvocationSearchResult(BaseModel):
+    invocation_id: str
+    lmp_id: str
+    created_at: datetime
+    rank: float
+    # The matching text with matches between <mark> and </mark>.
+    snippet: str
+
+
 # Update these models at the end of the file
 class EvaluationLabelerPublic(EvaluationLabelerBase):
     labeling_lmp: Optional[SerializedLMPBase]
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import Optional, Dict, Any, List
 
 from sqlmodel import Session
@@ -9,20 +10,19 @@ import logging
 import json
 from ell.studio.config import Config
 from ell.studio.connection_manager import ConnectionManager
-from ell.studio.datamodels import EvaluationResultDatapointPublic, InvocationPublicWithConsumes, SerializedLMPWithUses, EvaluationPublic, SpecificEvaluationRunPublic
+from ell.studio.datamodels import EvaluationResultDatapointPublic, InvocationPublicWithConsumes, InvocationSearchResult, InvocationsAggregate, SerializedLMPWithUses, EvaluationPublic, SpecificEvaluationRunPublic
 
 from ell.stores.models.core import SerializedLMP
+from ell.stores.pagination import next_cursor
 from datetime import datetime, timedelta
 from sqlmodel import select
 from ell.stores.models.evaluations import SerializedEvaluation
+from ell.util.closure_util import format_source
 
 
 logger = logging.getLogger(__name__)
 
 
-from ell.studio.datamodels import InvocationsAggregate
-
-
 def get_serializer(config: Config):
     if config.pg_connection_string:
         return PostgresStore(config.pg_connection_string)
@@ -33,11 +33,39 @@ def get_serializer(config: Config):
 
 
 
+def _paginate(response: Response, rows: List[Any], limit: int, *fields: str) -> List[Any]:
+    """Sets the X-Next-Cursor header to the cursor of the next page, if there may be one."""
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = next_cursor(rows, *fields)
+    return rows
+
+
+def _invalid_cursor(e: ValueError) -> HTTPException:
+    return HTTPException(status_code=400, detail=str(e))
+
+
+@lru_cache(maxsize=1024)
+def _display_source(source: str) -> str:
+    return format_source(source)
+
+
+def with_display_source(lmp: SerializedLMP) -> SerializedLMPWithUses:
+    """
+    LMPs versioned with the "ast" hashing mode store their source as written; Black only runs here, when the source is
+    displayed. Already formatted source is unchanged (Black is idempotent).
+    """
+    return SerializedLMPWithUses.model_validate(
+        lmp,
+        from_attributes=True,
+        update=dict(source=_display_source(lmp.source), dependencies=_display_source(lmp.dependencies)),
+    )
+
+
 def create_app(config:Config):
     serializer = get_serializer(config)
 
     def get_session():
-        with Session(serializer.engine) as session:
+        with Session(serializer.read_engine) as session:
             yield session
 
     app = FastAPI(title="ell Studio", version=__version__)
@@ -49,6 +77,7 @@ def create_app(config:Config):
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
 
     manager = ConnectionManager()
@@ -66,30 +95,38 @@ def create_app(config:Config):
     
     @app.get("/api/latest/lmps", response_model=list[SerializedLMPWithUses])
     def get_latest_lmps(
+        response: Response,
         skip: int = Query(0, ge=0),
-        limit: int = Query(100, ge=1, le=100),
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None),
         session: Session = Depends(get_session)
     ):
-        lmps = serializer.get_latest_lmps(
-            session,
-            skip=skip, limit=limit,
-            )
-        return lmps
+        try:
+            lmps = serializer.get_latest_lmps(
+                session,
+                skip=skip, limit=limit, cursor=cursor,
+                )
+        except ValueError as e:
+            raise _invalid_cursor(e)
+        _paginate(response, lmps, limit, "created_at", "lmp_id")
+        return [with_display_source(lmp) for lmp in lmps]
 
     # TOOD: Create a get endpoint to efficient get on the index with /api/lmp/<lmp_id>
     @app.get("/api/lmp/{lmp_id}")
     def get_lmp_by_id(lmp_id: str, session: Session = Depends(get_session)):
         lmp = serializer.get_lmps(session, lmp_id=lmp_id)[0]
-        return lmp
+        return with_display_source(lmp)
 
 
 
     @app.get("/api/lmps", response_model=list[SerializedLMPWithUses])
     def get_lmp(
+        response: Response,
         lmp_id: Optional[str] = Query(None),
         name: Optional[str] = Query(None),
         skip: int = Query(0, ge=0),
-        limit: int = Query(100, ge=1, le=100),
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None),
         session: Session = Depends(get_session)
     ):
         
@@ -99,13 +136,16 @@ def create_app(config:Config):
         if lmp_id:
             filters['lmp_id'] = lmp_id
 
-        lmps = serializer.get_lmps(session, skip=skip, limit=limit, **filters)
+        try:
+            lmps = serializer.get_lmps(session, skip=skip, limit=limit, cursor=cursor, **filters)
+        except ValueError as e:
+            raise _invalid_cursor(e)
         
-        if not lmps:
+        if not lmps and cursor is None:
             raise HTTPException(status_code=404, detail="LMP not found")
+        _paginate(response, lmps, limit, "created_at", "lmp_id")
         
-        print(lmps[0])
-        return lmps
+        return [with_display_source(lmp) for lmp in lmps]
 
 
 
@@ -119,10 +159,12 @@ def create_app(config:Config):
 
     @app.get("/api/invocations", response_model=list[InvocationPublicWithConsumes])
     def get_invocations(
+        response: Response,
         id: Optional[str] = Query(None),
         hierarchical: Optional[bool] = Query(False),
         skip: int = Query(0, ge=0),
-        limit: int = Query(100, ge=1, le=100),
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None),
         lmp_name: Optional[str] = Query(None),
         lmp_id: Optional[str] = Query(None),
         session: Session = Depends(get_session)
@@ -137,22 +179,47 @@ def create_app(config:Config):
         if id:
             invocation_filters["id"] = id
 
-        invocations = serializer.get_invocations(
-            session,
-            lmp_filters=lmp_filters,
-            filters=invocation_filters,
-            skip=skip,
-            limit=limit,
-            hierarchical=hierarchical
-        )
-        return invocations
+        try:
+            invocations = serializer.get_invocations(
+                session,
+                lmp_filters=lmp_filters,
+                filters=invocation_filters,
+                skip=skip,
+                limit=limit,
+                hierarchical=hierarchical,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            raise _invalid_cursor(e)
+        return _paginate(response, invocations, limit, "created_at", "id")
 
 
+    @app.get("/api/invocations/search", response_model=List[InvocationSearchResult])
+    def search_invocations(
+        q: str = Query(..., min_length=1),
+        lmp_id: Optional[str] = Query(None),
+        skip: int = Query(0, ge=0),
+        limit: int = Query(20, ge=1, le=100),
+        session: Session = Depends(get_session)
+    ):
+        if not serializer.has_search_index():
+            raise HTTPException(status_code=404, detail="This store has no full-text index")
+        hits = serializer.search_invocations(session, q, lmp_id=lmp_id, limit=limit, offset=skip)
+        return [InvocationSearchResult(**vars(hit)) for hit in hits]
+
     @app.get("/api/traces")
     def get_consumption_graph(
+        invocation_id: Optional[str] = Query(None),
+        lmp_id: Optional[str] = Query(None),
+        max_depth: int = Query(10, ge=1, le=100),
+        direction: str = Query("both", pattern="^(upstream|downstream|both)$"),
         session: Session = Depends(get_session)
     ):
-        traces = serializer.get_traces(session)
+        if invocation_id and lmp_id:
+            raise HTTPException(status_code=400, detail="Scope traces to an invocation or an LMP, not both")
+        traces = serializer.get_traces(
+            session, invocation_id=invocation_id, lmp_id=lmp_id, max_depth=max_depth, direction=direction
+        )
         return traces
 
 
@@ -178,22 +245,7 @@ def create_app(config:Config):
         days: int = Query(365, ge=1, le=3650),  # Default to 1 year, max 10 years
         session: Session = Depends(get_session)
     ):
-        # Calculate the start date
-        start_date = datetime.utcnow() - timedelta(days=days)
-
-        # Query to get all LMP creation times within the date range
-        query = (
-            select(SerializedLMP.created_at)
-            .where(SerializedLMP.created_at >= start_date)
-            .order_by(SerializedLMP.created_at)
-        )
-
-        results = session.exec(query).all()
-
-        # Convert results to a list of dictionaries
-        history = [{"date": str(row), "count": 1} for row in results]
-
-        return history
+        return serializer.get_lmp_history(session, days=days)
 
     async def notify_clients(entity: str, id: Optional[str] = None):
         message = json.dumps({"entity": entity, "id": id})
@@ -208,6 +260,7 @@ def create_app(config:Config):
         lmp_name: Optional[str] = Query(None),
         lmp_id: Optional[str] = Query(None),
         days: int = Query(30, ge=1, le=365),
+        bucket: Optional[str] = Query(None, pattern="^(minute|hour|day)$"),
         session: Session = Depends(get_session)
     ):
         lmp_filters = {}
@@ -216,7 +269,7 @@ def create_app(config:Config):
         if lmp_id:
             lmp_filters["lmp_id"] = lmp_id
 
-        aggregate_data = serializer.get_invocations_aggregate(session, lmp_filters=lmp_filters, days=days)
+        aggregate_data = serializer.get_invocations_aggregate(session, lmp_filters=lmp_filters, days=days, bucket=bucket)
         return InvocationsAggregate(**aggregate_data)
     
     
@@ -282,17 +335,23 @@ def create_app(config:Config):
     @app.get("/api/evaluation-runs/{run_id}/results", response_model=List[EvaluationResultDatapointPublic])
     def get_evaluation_run_results(
         run_id: str,
+        response: Response,
         skip: int = Query(0, ge=0),
-        limit: int = Query(100, ge=1, le=100),
+        limit: int = Query(100, ge=1, le=1000),
+        cursor: Optional[str] = Query(None),
         session: Session = Depends(get_session)
     ):
-        results = serializer.get_evaluation_run_results(
-            session,
-            run_id,
-            skip=skip,
-            limit=limit,
-        )
-        return results
+        try:
+            results = serializer.get_evaluation_run_results(
+                session,
+                run_id,
+                skip=skip,
+                limit=limit,
+                cursor=cursor,
+            )
+        except ValueError as e:
+            raise _invalid_cursor(e)
+        return _paginate(response, results, limit, "id")
     
     @app.get("/api/all-evaluations", response_model=List[EvaluationPublic])
     def get_all_evaluations(
@@ -9,11 +9,12 @@ from PIL import Image as PILImage
 
 from pydantic import BaseModel, ConfigDict, Field, model_validator, field_serializer
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import as_completed
 
 from typing import Any, Callable, Dict, List, Optional, Union
 
 from ell.util.serialization import serialize_image
+from ell.util.concurrency import ContextThreadPoolExecutor
 _lstr_generic = Union[_lstr, str]
 InvocableTool = Callable[..., Union["ToolResult", _lstr_generic, List["ContentBlock"], ]]
 
@@ -415,7 +416,7 @@ class Message(BaseModel):
     
     def call_tools_and_collect_as_message(self, parallel=False, max_workers=None):
         if parallel:
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
                 futures = [executor.submit(c.tool_call.call_and_collect_as_content_block) for c in self.content if c.tool_call]
                 content = [future.result() for future in as_completed(futures)]
         else:
@@ -31,7 +31,7 @@ To fix this:
     ```
     your_lmp_name(..., client={client_to_use_name}(api_key=your_api_key))
     ```
-""" if long else " at time of definition. Can be okay if custom client specified later! https://docs.ell.so/core_concepts/models_and_api_clients.html ") + f"{Style.RESET_ALL}"
+""" if long else " when first called. Can be okay if custom client specified later! https://docs.ell.so/core_concepts/models_and_api_clients.html ") + f"{Style.RESET_ALL}"
 
 
 def _warnings(model, fn, default_client_from_decorator):
@@ -39,7 +39,7 @@ def _warnings(model, fn, default_client_from_decorator):
         if not default_client_from_decorator:
             # Check to see if the model is registered and warn the user we're gonna defualt to OpenAI.
 
-            if model not in config.registry:
+            if not config.is_registered(model):
                 logger.warning(f"""{Fore.LIGHTYELLOW_EX}WARNING: Model `{model}` is used by LMP `{fn.__name__}` but no client could be found that supports `{model}`. Defaulting to use the OpenAI client `{config.default_client}` for `{model}`. This is likely because you've spelled the model name incorrectly or are using a newer model from a provider added after this ell version was released. 
                             
 * If this is a mistake either specify a client explicitly in the decorator:
@@ -32,6 +32,7 @@ import collections
 import ast
 import hashlib
 import itertools
+import time
 from typing import Any, Dict, Iterable, Optional, Set, Tuple, Callable
 import dill
 import inspect
@@ -39,8 +40,8 @@ import types
 from dill.source import getsource
 import re
 from collections import deque
-import black
 
+from ell.util import closure_cache
 from ell.util.serialization import is_immutable_variable
 from ell.util.should_import import should_import
 
@@ -84,6 +85,7 @@ def lexical_closure(
         func = func.__ell_func__
 
     source = getsource(func, lstrip=True, force=True)
+    closure_cache.record_source_file(func)
     already_closed.add(hash(func))
 
     globals_and_frees = _get_globals_and_frees(func)
@@ -103,9 +105,10 @@ def lexical_closure(
 
     dsrc = _clean_src(dirty_src_without_func)
 
-    # Format the sorce and dsrc soruce using Black
-    source = _format_source(source)
-    dsrc = _format_source(dsrc)
+    if _hashing_mode() == "black":
+        # Format the sorce and dsrc soruce using Black
+        source = _format_source(source)
+        dsrc = _format_source(dsrc)
 
     fn_hash = _generate_function_hash(source, dsrc, func.__qualname__)
     
@@ -114,8 +117,16 @@ def lexical_closure(
     return (dirty_src, (source, dsrc), ({outer_ell_func} if not initial_call and hasattr(outer_ell_func, "__ell_func__") else uses))
 
 
+def _hashing_mode() -> str:
+    # ell.util is imported while the configurator is still initializing, so look the config up lazily.
+    from ell.configurator import config
+    return config.hashing_mode
+
+
 def _format_source(source: str) -> str:
     """Format the source code using Black."""
+    # Black is only imported when something needs formatting; the "ast" hashing mode never does at versioning time.
+    import black
     try:
         return black.format_str(source, mode=black.Mode())
     except:
@@ -268,6 +279,7 @@ def _process_modules(modules, cur_src, already_closed, recursion_stack, uses):
 def _process_module_attribute(mname, mval, attr, mdeps, modules, already_closed, recursion_stack, uses):
     """Process a single attribute of a module."""
     val = getattr(mval, attr)
+    closure_cache.record_source_file(mval)
     if isinstance(val, (types.FunctionType, type, types.MethodType)):
         try:
             dep, _, dep_uses = lexical_closure(val, already_closed=already_closed, recursion_stack=recursion_stack.copy())
@@ -292,20 +304,44 @@ def _build_final_source(imports, module_src, dependencies, source):
     seperated_dependencies = list(dict.fromkeys(seperated_dependencies))
     return DELIM + "\n" + f"\n{DELIM}\n".join(seperated_dependencies) + "\n" + DELIM + "\n"
 
-def _generate_function_hash(source, dsrc, qualname):
+def _generate_function_hash(source, dsrc, qualname, hashing_mode: Optional[str] = None):
     """Generate a hash for the function."""
+    if (hashing_mode or _hashing_mode()) == "ast":
+        return ast_function_hash(source, dsrc, qualname)
     return "lmp-" + hashlib.md5("\n".join((source, dsrc, qualname)).encode()).hexdigest()
 
+
+def ast_function_hash(source: str, dsrc: str, qualname: str) -> str:
+    """
+    The "ast" hashing mode's lmp id: a hash of the AST-normalized source and dependencies, so it doesn't change with
+    whitespace, formatting or comments. Black preserves the AST, so Black-formatted and raw source hash the same.
+    """
+    return "lmp-" + hashlib.md5("\n".join((_canonical_source(source), _canonical_source(dsrc), qualname)).encode()).hexdigest()
+
+
+# Placeholders the closure writes for mutable values (`name = <Foo object>`) aren't valid Python; quote them first.
+_MUTABLE_PLACEHOLDER = re.compile(r"^(# <BmV>\n\w+ = )(<.*?>)$", flags=re.MULTILINE)
+
+
+def _canonical_source(source: str) -> str:
+    try:
+        return ast.dump(ast.parse(_MUTABLE_PLACEHOLDER.sub(lambda m: m.group(1) + repr(m.group(2)), source)))
+    except (SyntaxError, ValueError):
+        # Not parseable (e.g. a dependency repr'd as `<object at 0x...>`): fall back to normalizing whitespace.
+        return "\n".join(line.rstrip() for line in source.splitlines() if line.strip())
+
 def _update_ell_func(outer_ell_func, source, dsrc, globals_dict, frees_dict, fn_hash, uses):
     """Update the ell function attributes."""
-    formatted_source = _format_source(source)
-    formatted_dsrc = _format_source(dsrc)
+    formatted_source = _format_source(source) if _hashing_mode() == "black" else source
+    formatted_dsrc = _format_source(dsrc) if _hashing_mode() == "black" else dsrc
     
     if hasattr(outer_ell_func, "__ell_func__"):
         
         outer_ell_func.__ell_closure__ = (formatted_source, formatted_dsrc, globals_dict, frees_dict)
-        outer_ell_func.__ell_hash__ = fn_hash
         outer_ell_func.__ell_uses__ = uses
+        # Set last: other threads treat the presence of __ell_hash__ as "closure is ready".
+        outer_ell_func.__ell_hash__ = fn_hash
+        closure_cache.record_closure(outer_ell_func)
 
 def _raise_error(message, exception, recursion_stack):
     """Raise an error with detailed information."""
@@ -387,7 +423,16 @@ def lexically_closured_source(func, forced_dependencies: Optional[Dict[str, Any]
     """
     if not callable(func):
         raise ValueError("Input must be a callable object (function, method, or class).")
-    _, fnclosure, uses = lexical_closure(func, initial_call=True, recursion_stack=[], forced_dependencies=forced_dependencies)
+
+    cache = closure_cache.get_closure_cache() if hasattr(func, "__ell_func__") else None
+    if cache is not None and cache.restore(func, forced_dependencies, _get_globals_and_frees):
+        return func.__ell_closure__, func.__ell_uses__
+
+    start = time.perf_counter()
+    with closure_cache.recording() as recorded:
+        _, fnclosure, uses = lexical_closure(func, initial_call=True, recursion_stack=[], forced_dependencies=forced_dependencies)
+    if cache is not None:
+        cache.save(func, forced_dependencies, recorded, time.perf_counter() - start, _get_globals_and_frees)
     return func.__ell_closure__, uses
 
 import ast
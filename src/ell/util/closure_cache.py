@@ -0,0 +1,280 @@
+"""
+On-disk cache of lexical closures.
+
+Computing an LMP's closure (walking its globals with dill, collecting dependency sources and formatting them with
+Black) dominates cold start for large LMP collections. The result only depends on the LMP's code, the source files
+it was assembled from and the values of the globals it references, so it can be reused across processes.
+
+Entries are keyed by the LMP's code object. An entry records every closure computed along the way (the LMP and the
+LMPs it uses), the source files they were built from with their mtimes and sizes, and a fingerprint of each
+function's globals and free variables. An entry is only reused when all of those still match; otherwise the closure
+is recomputed and the entry rewritten. Values assigned at import time in dependency modules are covered by their
+file's mtime, not by value.
+
+Enable it with `ell.init(closure_cache_dir=...)` or the `ELL_CLOSURE_CACHE_DIR` environment variable.
+"""
+import hashlib
+import inspect
+import json
+import logging
+import marshal
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from ell.__version__ import __version__
+from ell.util.serialization import is_immutable_variable
+
+logger = logging.getLogger(__name__)
+
+# Bump when the entry layout or anything that feeds the lmp hash changes.
+CACHE_FORMAT_VERSION = 1
+
+
+@dataclass
+class ClosureCacheStats:
+    hits: int = 0
+    misses: int = 0
+    seconds_saved: float = 0.0
+
+
+@dataclass
+class _Recording:
+    """What a closure computation touched: its source files and every tracked function it versioned."""
+    files: Set[str] = field(default_factory=set)
+    closures: List[Any] = field(default_factory=list)
+
+
+_recording: ContextVar[Optional[_Recording]] = ContextVar("ell_closure_recording", default=None)
+
+
+@contextmanager
+def recording():
+    token = _recording.set(_Recording())
+    try:
+        yield _recording.get()
+    finally:
+        _recording.reset(token)
+
+
+def record_source_file(obj: Any) -> None:
+    """Called by the closure walker for every function, class and module whose source ends up in a closure."""
+    rec = _recording.get()
+    if rec is None:
+        return
+    try:
+        path = inspect.getsourcefile(obj)
+    except TypeError:
+        path = None
+    # Sources without a file (e.g. notebooks or exec'd code) can't be validated, so the result isn't cacheable.
+    rec.files.add(os.path.abspath(path) if path else "")
+
+
+def record_closure(outer_ell_func: Any) -> None:
+    rec = _recording.get()
+    if rec is not None:
+        rec.closures.append(outer_ell_func)
+
+
+def _unwrap(func: Any) -> Any:
+    while hasattr(func, "__ell_func__"):
+        func = func.__ell_func__
+    return func
+
+
+def _ref(obj: Any) -> Optional[Tuple[str, str]]:
+    module, qualname = getattr(obj, "__module__", None), getattr(obj, "__qualname__", None)
+    if not module or not qualname or "<locals>" in qualname or "<lambda>" in qualname:
+        return None
+    return module, qualname
+
+
+def _resolve(ref: List[str]) -> Any:
+    obj = sys.modules.get(ref[0])
+    for part in ref[1].split("."):
+        obj = getattr(obj, part, None)
+    return obj if hasattr(obj, "__ell_func__") else None
+
+
+def _file_signature(path: str) -> Optional[List[int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _describe(value: Any) -> str:
+    if isinstance(value, types.ModuleType):
+        return f"<module {value.__name__}>"
+    if isinstance(value, (types.FunctionType, types.MethodType, type)) or hasattr(value, "__ell_func__"):
+        return f"<{getattr(value, '__module__', '')}.{getattr(value, '__qualname__', '')}>"
+    if is_immutable_variable(value):
+        return repr(value)
+    if isinstance(value, (list, set)):
+        return f"[{', '.join(_describe(v) for v in value)}]"
+    return f"<{type(value).__module__}.{type(value).__qualname__} object>"
+
+
+def fingerprint_globals_and_frees(globals_and_frees: Dict[str, Dict[str, Any]]) -> str:
+    """A hash of the names, identities and (for immutable values) values of a function's globals and free vars."""
+    described = {
+        kind: {name: _describe(value) for name, value in variables.items()}
+        for kind, variables in globals_and_frees.items()
+    }
+    return hashlib.sha256(json.dumps(described, sort_keys=True).encode()).hexdigest()
+
+
+class ClosureCache:
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self.stats = ClosureCacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, func: Any, forced_dependencies: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        from ell.configurator import config
+
+        inner = _unwrap(func)
+        code = getattr(inner, "__code__", None)
+        if code is None:
+            return None
+        forced = {name: _describe(value) for name, value in (forced_dependencies or {}).items()}
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    CACHE_FORMAT_VERSION,
+                    __version__,
+                    config.hashing_mode,
+                    inner.__module__,
+                    inner.__qualname__,
+                    hashlib.sha256(marshal.dumps(code)).hexdigest(),
+                    forced,
+                ],
+                sort_keys=True,
+            ).encode()
+        ).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def restore(self, func: Any, forced_dependencies: Optional[Dict[str, Any]], get_globals_and_frees) -> bool:
+        """
+        Sets `__ell_closure__`, `__ell_uses__` and `__ell_hash__` on `func` (and on the LMPs it uses) from the cache.
+        Returns False, leaving everything untouched, if there is no valid entry.
+        """
+        start = time.perf_counter()
+        key = self.key(func, forced_dependencies)
+        compute_seconds = self._restore(key, func, get_globals_and_frees) if key is not None else None
+        with self._lock:
+            if compute_seconds is not None:
+                self.stats.hits += 1
+                self.stats.seconds_saved += max(0.0, compute_seconds - (time.perf_counter() - start))
+            else:
+                self.stats.misses += 1
+        return compute_seconds is not None
+
+    def _restore(self, key: str, func: Any, get_globals_and_frees) -> Optional[float]:
+        """Returns how long the cached closure originally took to compute, or None on a miss."""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("format") != CACHE_FORMAT_VERSION:
+            return None
+        if any(_file_signature(path) != signature for path, signature in entry["files"].items()):
+            return None
+
+        # Resolve and validate everything before touching any function.
+        targets = []
+        for i, closure in enumerate(entry["closures"]):
+            target = func if i == 0 else _resolve(closure["ref"])
+            if target is None:
+                return None
+            uses = [_resolve(ref) for ref in closure["uses"]]
+            if any(use is None for use in uses):
+                return None
+            globals_and_frees = get_globals_and_frees(_unwrap(target))
+            if fingerprint_globals_and_frees(globals_and_frees) != closure["fingerprint"]:
+                return None
+            targets.append((target, closure, set(uses), globals_and_frees))
+
+        # Dependencies first, then the LMP itself; each __ell_hash__ is set last, as the closure walker does.
+        for target, closure, uses, globals_and_frees in reversed(targets):
+            if target is not func and hasattr(target, "__ell_hash__"):
+                continue
+            target.__ell_closure__ = (closure["source"], closure["dependencies"], globals_and_frees["globals"], globals_and_frees["frees"])
+            target.__ell_uses__ = uses
+            target.__ell_hash__ = closure["hash"]
+        logger.info(f"Restored the closure of {_unwrap(func).__qualname__} from the closure cache.")
+        return entry["seconds"]
+
+    def save(
+        self,
+        func: Any,
+        forced_dependencies: Optional[Dict[str, Any]],
+        rec: _Recording,
+        seconds: float,
+        get_globals_and_frees,
+    ) -> None:
+        key = self.key(func, forced_dependencies)
+        if key is None or "" in rec.files:
+            return
+        files = {path: _file_signature(path) for path in sorted(rec.files)}
+        if any(signature is None for signature in files.values()):
+            return
+
+        # The LMP itself is recorded last (dependencies are versioned first), but is stored first.
+        closures = []
+        for target in [func] + [c for c in rec.closures if c is not func]:
+            ref = _ref(target)
+            uses = [_ref(use) for use in target.__ell_uses__]
+            if (ref is None and target is not func) or any(use is None for use in uses):
+                return
+            closures.append(
+                dict(
+                    ref=ref,
+                    hash=target.__ell_hash__,
+                    source=target.__ell_closure__[0],
+                    dependencies=target.__ell_closure__[1],
+                    fingerprint=fingerprint_globals_and_frees(get_globals_and_frees(_unwrap(target))),
+                    uses=uses,
+                )
+            )
+
+        entry = dict(format=CACHE_FORMAT_VERSION, seconds=seconds, files=files, closures=closures)
+        # Write-then-rename so concurrent processes never read a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            logger.exception("Failed to write closure cache entry.")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_caches: Dict[str, ClosureCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_closure_cache() -> Optional[ClosureCache]:
+    """The closure cache for the configured `closure_cache_dir`, or None if caching is disabled."""
+    from ell.configurator import config
+
+    cache_dir = config.closure_cache_dir
+    if not cache_dir:
+        return None
+    with _caches_lock:
+        if cache_dir not in _caches:
+            _caches[cache_dir] = ClosureCache(cache_dir)
+        return _caches[cache_dir]
@@ -3,7 +3,6 @@ from functools import lru_cache
 import hashlib
 import importlib
 import os
-import black
 from dill.detect import nestedglobals
 
 import inspect
@@ -155,6 +154,7 @@ def should_import(module_name : str):
 
 def format_source(source: str) -> str:
     """Format the source code using Black."""
+    import black
     try:
         return black.format_str(source, mode=black.Mode())
     except:
@@ -0,0 +1,22 @@
+"""
+Helpers for fanning out LMP calls without losing the invocation stack.
+
+ell keeps the current invocation in a contextvar so nested LMP calls know their parent. asyncio tasks copy the
+context automatically, but threads started by a ThreadPoolExecutor do not: work submitted to a plain executor runs
+with an empty context and its invocations lose their `used_by_id`. Submit through these helpers instead.
+"""
+import contextvars
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+def submit_with_context(executor: Executor, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """Submit `fn` to any executor so that it runs inside a copy of the caller's context."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """A ThreadPoolExecutor whose submissions run inside a copy of the submitting thread's context."""
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
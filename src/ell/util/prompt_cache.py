@@ -0,0 +1,99 @@
+"""
+Prompt-level response cache.
+
+The state cache key used by `store.freeze(...)` hashes the LMP version together with its inputs, so any edit to an
+LMP invalidates its cached results. The prompt cache is keyed on what is actually sent to the model instead: the
+canonicalized output of `Provider.translate_to_provider` (model, messages, tools and api params), together with the
+provider and the client's endpoint. Any LMP version, or any other LMP, that builds a byte-identical request gets the
+cached response.
+
+Only text responses are cached; responses with tool calls, structured outputs or other content always go to the
+provider. Enable it with `ell.init(prompt_cache=True)`; entries live in the configured store.
+"""
+import hashlib
+import json
+import logging
+from typing import Any, Callable, List, Mapping, Optional
+
+from pydantic import BaseModel
+
+from ell.types import ContentBlock, Message
+from ell.types._lstr import _lstr
+
+logger = logging.getLogger(__name__)
+
+# Parameters that change how a response is delivered, not what it is.
+_TRANSPORT_PARAMS = frozenset({"stream", "stream_options"})
+
+
+def _canonicalize(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, type) and issubclass(obj, BaseModel):
+        return obj.model_json_schema()
+    # Anything else only matches itself within a process (reprs may hold addresses), which at worst is a miss.
+    return repr(obj)
+
+
+def request_hash(provider: Any, client: Any, provider_call_params: Mapping[str, Any]) -> str:
+    """A hash of a translated request that is equal for any two requests that would get the same response."""
+    request = {k: v for k, v in provider_call_params.items() if k not in _TRANSPORT_PARAMS}
+    canonical = json.dumps(
+        [
+            f"{type(provider).__module__}.{type(provider).__qualname__}",
+            str(getattr(client, "base_url", "") or ""),
+            request,
+        ],
+        sort_keys=True,
+        default=_canonicalize,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def prompt_cache_key(provider: Any, client: Any, provider_call_params: Mapping[str, Any]) -> Optional[str]:
+    """The prompt cache key for a translated request, or None if the prompt cache is disabled."""
+    from ell.configurator import config
+
+    if not config.prompt_cache or config.store is None:
+        return None
+    return request_hash(provider, client, provider_call_params)
+
+
+def load_cached_response(
+    key: str, origin_id: Optional[str] = None, logger_fn: Optional[Callable[..., None]] = None
+) -> Optional[List[Message]]:
+    """The cached messages for `key`, traced to `origin_id` as if the provider had just returned them."""
+    from ell.configurator import config
+
+    entry = config.store.get_prompt_cache_entry(key)
+    if entry is None:
+        return None
+    logger.info(f"Using prompt cache entry {key} for {entry.model}.")
+    messages = []
+    for message in entry.messages:
+        if logger_fn:
+            logger_fn("".join(message["text"]))
+        messages.append(
+            Message(
+                role=message["role"],
+                content=[ContentBlock(text=_lstr(text, origin_trace=origin_id)) for text in message["text"]],
+            )
+        )
+    return messages
+
+
+def save_response(key: str, model: str, messages: List[Message]) -> None:
+    """Caches `messages` under `key` if they are plain text."""
+    from ell.configurator import config
+    from ell.stores.models.core import PromptCacheEntry
+
+    if not messages or any(block.type != "text" for message in messages for block in message.content):
+        return
+    config.store.write_prompt_cache_entry(
+        PromptCacheEntry(
+            prompt_cache_key=key,
+            model=model,
+            messages=[dict(role=m.role, text=[str(block.text) for block in m.content]) for m in messages],
+        )
+    )
@@ -0,0 +1,222 @@
+"""
+Semantic nearest-neighbour cache for LMP outputs.
+
+Exact caching (`store.freeze(...)`) only answers calls whose serialized params hash to a stored state cache key.
+The semantic cache sits on top of it: the params of every invocation recorded by a frozen call are embedded and
+indexed per LMP version under their state cache key, and an exact miss falls back to the nearest indexed params. If their cosine
+similarity is at least `threshold`, the invocations stored under the neighbour's state cache key are served.
+
+    ell.init(semantic_cache=SemanticCache(my_embed_fn, threshold=0.92))
+
+`embed` is any function from text to a 1-d vector. `HashingEmbedder` is a deterministic, dependency-free stand-in
+for tests and offline use. Indexes are numpy arrays; with `index_dir` set they are saved there as .npy files and
+memory-mapped when loaded again.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], np.ndarray]
+
+
+@dataclass
+class SemanticCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class HashingEmbedder:
+    """
+    Embeds text as a normalized bag of hashed word tokens. Deterministic across processes, so texts that share most
+    of their words are close. Not a language model: use it for tests, not for real paraphrases.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def __call__(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            bucket = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[bucket % self.dim] += 1.0
+        return vector
+
+
+class _Index:
+    """The embeddings of one LMP version, their state cache keys and when each was last used."""
+
+    def __init__(self, dim: int, vectors: Optional[np.ndarray] = None, keys: Optional[List[str]] = None):
+        # Rows past len(keys) are spare capacity, so appending rarely reallocates.
+        self._vectors = vectors if vectors is not None else np.empty((0, dim), dtype=np.float32)
+        self.keys = keys or []
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self._last_used = np.zeros(len(self.keys), dtype=np.int64)
+        self.dirty = False
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[: len(self.keys)]
+
+    @property
+    def last_used(self) -> np.ndarray:
+        return self._last_used[: len(self.keys)]
+
+    def _reserve(self, capacity: int) -> None:
+        # Also copies a (read-only) memory-mapped index into memory before its first change.
+        if capacity <= len(self._vectors) and self._vectors.flags.writeable:
+            return
+        size = len(self.keys)
+        vectors = np.empty((capacity, self._vectors.shape[1]), dtype=np.float32)
+        vectors[:size] = self._vectors[:size]
+        last_used = np.zeros(capacity, dtype=np.int64)
+        last_used[:size] = self._last_used[:size]
+        self._vectors, self._last_used = vectors, last_used
+
+    def put(self, key: str, vector: np.ndarray, clock: int, max_entries: int) -> bool:
+        """Adds an entry, replacing the least recently used one if the index is full. Returns whether it evicted."""
+        size = len(self.keys)
+        evict = size >= max_entries
+        if evict:
+            row = int(np.argmin(self.last_used))
+            self._reserve(len(self._vectors))
+            del self.rows[self.keys[row]]
+            self.keys[row] = key
+        else:
+            row = size
+            if size == len(self._vectors) or not self._vectors.flags.writeable:
+                # Doubling the capacity keeps appends amortized constant time.
+                self._reserve(min(max(2 * size, 16), max_entries))
+            self.keys.append(key)
+        self.rows[key] = row
+        self._vectors[row] = vector
+        self._last_used[row] = clock
+        self.dirty = True
+        return evict
+
+
+class SemanticCache:
+    """
+    :param embed: Function embedding the serialized params of a call.
+    :param threshold: Minimum cosine similarity for a neighbour to be served.
+    :param max_entries: Maximum entries per LMP version; the least recently used entry is evicted first.
+    :param index_dir: If set, indexes are saved here (see `save`) and memory-mapped on load.
+    """
+
+    def __init__(
+        self,
+        embed: Embedder,
+        threshold: float = 0.95,
+        max_entries: int = 10000,
+        index_dir: Optional[str] = None,
+    ):
+        assert 0 < threshold <= 1, "threshold must be in (0, 1]."
+        assert max_entries > 0, "max_entries must be positive."
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.index_dir = index_dir
+        self.stats = SemanticCacheStats()
+        self._indexes: Dict[str, _Index] = {}
+        self._clock = 0
+        self._lock = threading.Lock()
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+            atexit.register(self.save)
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed(text), dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _paths(self, lmp_id: str) -> Tuple[str, str]:
+        return os.path.join(self.index_dir, f"{lmp_id}.npy"), os.path.join(self.index_dir, f"{lmp_id}.json")
+
+    def _index(self, lmp_id: str, dim: int) -> _Index:
+        index = self._indexes.get(lmp_id)
+        if index is None:
+            index = self._load(lmp_id) or _Index(dim)
+            self._indexes[lmp_id] = index
+        return index
+
+    def _load(self, lmp_id: str) -> Optional[_Index]:
+        if not self.index_dir:
+            return None
+        vectors_path, keys_path = self._paths(lmp_id)
+        try:
+            with open(keys_path, "r", encoding="utf-8") as f:
+                keys = json.load(f)
+            vectors = np.load(vectors_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if len(keys) != len(vectors):
+            return None
+        return _Index(vectors.shape[1], vectors, keys)
+
+    def lookup(self, lmp_id: str, params_str: str) -> Optional[str]:
+        """The state cache key of the nearest indexed params within the threshold, or None."""
+        query = self._embed(params_str)
+        with self._lock:
+            index = self._index(lmp_id, query.shape[0])
+            if len(index.keys) == 0:
+                self.stats.misses += 1
+                return None
+            similarities = index.vectors @ query
+            row = int(np.argmax(similarities))
+            similarity = float(similarities[row])
+            if similarity < self.threshold:
+                self.stats.misses += 1
+                return None
+            self._clock += 1
+            index.last_used[row] = self._clock
+            self.stats.hits += 1
+            # Under the lock: once it is released an add may replace this row in place.
+            key = index.keys[row]
+        logger.info(f"Semantic cache hit for {lmp_id} (similarity {similarity:.3f}).")
+        return key
+
+    def add(self, lmp_id: str, params_str: str, state_cache_key: str) -> None:
+        """Indexes the params of a recorded invocation under its state cache key."""
+        vector = self._embed(params_str)
+        with self._lock:
+            index = self._index(lmp_id, vector.shape[0])
+            self._clock += 1
+            if state_cache_key in index.rows:
+                index.last_used[index.rows[state_cache_key]] = self._clock
+                return
+            if index.put(state_cache_key, vector, self._clock, self.max_entries):
+                self.stats.evictions += 1
+
+    def save(self) -> None:
+        """Writes changed indexes to `index_dir`."""
+        if not self.index_dir:
+            return
+        with self._lock:
+            for lmp_id, index in self._indexes.items():
+                if not index.dirty:
+                    continue
+                vectors_path, keys_path = self._paths(lmp_id)
+                # Write-then-rename so readers never map a partial file.
+                for path, write in (
+                    (vectors_path, lambda f: np.save(f, np.ascontiguousarray(index.vectors))),
+                    (keys_path, lambda f: f.write(json.dumps(index.keys).encode("utf-8"))),
+                ):
+                    fd, tmp_path = tempfile.mkstemp(dir=self.index_dir, suffix=".tmp")
+                    with os.fdopen(fd, "wb") as f:
+                        write(f)
+                    os.replace(tmp_path, path)
+                index.dirty = False
+
+    def __len__(self) -> int:
+        return sum(len(index.keys) for index in self._indexes.values())
@@ -61,41 +61,119 @@ pydantic_ltype_aware_cattr.register_unstructure_hook(
     unstructure_lstr
 )
 
+def structure_result(obj, origin_trace=None):
+    """
+    Rebuilds an LMP result stored as JSON: `_lstr`s (traced back to `origin_trace`) and Messages, in any list.
+    """
+    if isinstance(obj, list):
+        return [structure_result(item, origin_trace) for item in obj]
+    if isinstance(obj, dict) and obj.get("__lstr"):
+        return _lstr(obj["content"], origin_trace=origin_trace)
+    if isinstance(obj, dict) and "role" in obj and "content" in obj:
+        from ell.types import Message
+
+        return Message.model_validate(obj)
+    return obj
+
 pydantic_ltype_aware_cattr.register_unstructure_hook(
     BaseModel,
     lambda obj: obj.model_dump(exclude_none=True, exclude_unset=True)
 )
 
 
+def _handle_complex_types(obj):
+    if isinstance(obj, (int, float, str, bool, type(None))):
+        return obj
+    elif isinstance(obj, (list, tuple)):
+        return [_handle_complex_types(item) if not isinstance(item, (int, float, str, bool, type(None))) else item for item in obj]
+    elif isinstance(obj, dict):
+        return {k: _handle_complex_types(v) if not isinstance(v, (int, float, str, bool, type(None))) else v for k, v in obj.items()}
+    elif isinstance(obj, (set, frozenset)):
+        return list(sorted(_handle_complex_types(item) if not isinstance(item, (int, float, str, bool, type(None))) else item for item in obj))
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    else:
+        return f"<Object of type {type(obj).__name__}>"
+
+# Building a cattrs converter costs milliseconds; share one instead of building it on every invocation.
+_immutable_vars_converter = cattrs.Converter()
+_immutable_vars_converter.register_unstructure_hook(object, _handle_complex_types)
+
+
 def get_immutable_vars(vars_dict):
-    converter = cattrs.Converter()
-
-    def handle_complex_types(obj):
-        if isinstance(obj, (int, float, str, bool, type(None))):
-            return obj
-        elif isinstance(obj, (list, tuple)):
-            return [handle_complex_types(item) if not isinstance(item, (int, float, str, bool, type(None))) else item for item in obj]
-        elif isinstance(obj, dict):
-            return {k: handle_complex_types(v) if not isinstance(v, (int, float, str, bool, type(None))) else v for k, v in obj.items()}
-        elif isinstance(obj, (set, frozenset)):
-            return list(sorted(handle_complex_types(item) if not isinstance(item, (int, float, str, bool, type(None))) else item for item in obj))
-        elif isinstance(obj, np.ndarray):
-            return obj.tolist()
-        else:
-            return f"<Object of type {type(obj).__name__}>"
-
-    converter.register_unstructure_hook(object, handle_complex_types)
-    x = converter.unstructure(vars_dict)
-    return x
+    return _immutable_vars_converter.unstructure(vars_dict)
 
 
-def compute_state_cache_key(ipstr, fn_closure):
-    _global_free_vars_str = f"{json.dumps(get_immutable_vars(fn_closure[2]), sort_keys=True, default=repr, ensure_ascii=False)}"
-    _free_vars_str = f"{json.dumps(get_immutable_vars(fn_closure[3]), sort_keys=True, default=repr, ensure_ascii=False)}"
-    state_cache_key = hashlib.sha256(f"{ipstr}{_global_free_vars_str}{_free_vars_str}".encode('utf-8')).hexdigest()
-    return state_cache_key
+def _serializes_statically(value):
+    """Whether `get_immutable_vars` always serializes `value` the same way, whatever happens to it later."""
+    if isinstance(value, (list, dict, set, np.ndarray)):
+        return False
+    if isinstance(value, (tuple, frozenset)):
+        return all(_serializes_statically(item) for item in value)
+    # Anything else is a primitive or is serialized by its type name alone.
+    return True
 
 
+def _dumps_vars(unstructured_vars):
+    return json.dumps(unstructured_vars, sort_keys=True, default=repr, ensure_ascii=False)
+
+
+class ClosureVars:
+    """
+    The serialized globals and free variables of one LMP version, as stored with each invocation and hashed into
+    its state cache key.
+
+    Most referenced values can't change how they serialize, so they are serialized once. Lists, dicts, sets and
+    arrays can be mutated between calls; only those are re-serialized on each use, and the snapshot is rebuilt when
+    one of them actually changed.
+    """
+
+    def __init__(self, fn_closure):
+        self.closure = fn_closure
+        self._mutable = tuple(
+            {name: value for name, value in variables.items() if not _serializes_statically(value)}
+            for variables in (fn_closure[2], fn_closure[3])
+        )
+        self._snapshot = self._build(tuple(get_immutable_vars(variables) for variables in self._mutable))
+
+    def _build(self, mutable_values):
+        global_vars, free_vars = (
+            {**get_immutable_vars(variables), **values}
+            for variables, values in zip((self.closure[2], self.closure[3]), mutable_values)
+        )
+        fingerprint = f"{_dumps_vars(global_vars)}{_dumps_vars(free_vars)}"
+        return mutable_values, global_vars, free_vars, fingerprint
+
+    def _current(self):
+        snapshot = self._snapshot
+        if any(self._mutable):
+            mutable_values = tuple(get_immutable_vars(variables) for variables in self._mutable)
+            if mutable_values != snapshot[0]:
+                snapshot = self._snapshot = self._build(mutable_values)
+        return snapshot
+
+    @property
+    def global_vars(self):
+        return self._current()[1]
+
+    @property
+    def free_vars(self):
+        return self._current()[2]
+
+    def state_cache_key(self, ipstr):
+        return hashlib.sha256(f"{ipstr}{self._current()[3]}".encode('utf-8')).hexdigest()
+
+
+def get_closure_vars(func):
+    """The `ClosureVars` of the current version of a tracked function, built once per version."""
+    closure_vars = getattr(func, "__ell_closure_vars__", None)
+    if closure_vars is None or closure_vars.closure is not func.__ell_closure__:
+        closure_vars = func.__ell_closure_vars__ = ClosureVars(func.__ell_closure__)
+    return closure_vars
+
+
+def compute_state_cache_key(ipstr, fn_closure):
+    return ClosureVars(fn_closure).state_cache_key(ipstr)
 
 
 def serialize_object(obj):
@@ -105,27 +183,61 @@ def serialize_object(obj):
 
 
 def prepare_invocation_params(params):
-    invocation_params = params
-    
-    # Thisis because we wneed the caching to work on the hash of a cleaned and serialized object.
-    jstr = serialize_object(invocation_params)
+    """
+    Cleans invocation params for storage and caching.
 
+    Returns the cleaned params (what `json.loads(serialize_object(params))` would give), the canonical JSON string
+    the state cache key is hashed from (byte-identical to `serialize_object(params)`), and the ids of the
+    invocations whose `_lstr` outputs appear anywhere in the params.
+
+    Containers and `_lstr`s are unstructured by hand in one pass, collecting origin traces as they are found.
+    Other values go through the converter's hooks; only when those produce something that isn't plain JSON is the
+    string parsed back to get the cleaned params.
+    """
     consumes = set()
-    import re
-    # XXX: Better than registering a hook in cattrs.
-    pattern = r'"__origin_trace__":\s*"frozenset\({(.+?)}\)"'
-    
-    # Find all matches in the jstr
-    matches = re.findall(pattern, jstr)
-    
-    # Process each match and add to consumes set
-    for match in matches:
-        # Remove quotes and spaces, then split by comma
-        items = [item.strip().strip("'") for item in match.split(',')]
-        consumes.update(items)
-    consumes = list(consumes)
-    # XXX: Only need to reload because of 'input' caching., we could skip this by making ultimate model caching rather than input hash caching; if prompt same use the same output.. irrespective of version.
-    return json.loads(jstr), jstr, consumes
+    foreign = []
+    unstructured = _unstructure_param(params, consumes, foreign)
+
+    unserializable = []
+    def default(obj):
+        unserializable.append(obj)
+        return repr(obj)
+
+    jstr = json.dumps(unstructured, sort_keys=True, default=default, ensure_ascii=False)
+
+    # Origin traces inside hook outputs (e.g. pydantic dumps of _lstr fields) are frozensets stored under
+    # "__origin_trace__"; json.dumps hands those to `default`.
+    for obj in unserializable:
+        if isinstance(obj, frozenset) and obj and f'"__origin_trace__": {json.dumps(repr(obj), ensure_ascii=False)}' in jstr:
+            consumes.update(obj)
+
+    cleaned = json.loads(jstr) if foreign or unserializable else unstructured
+    return cleaned, jstr, list(consumes)
+
+
+def _unstructure_param(obj, consumes, foreign):
+    # Mirrors pydantic_ltype_aware_cattr.unstructure for plain containers and _lstrs; anything else is handed to
+    # the converter and recorded in `foreign`.
+    obj_type = type(obj)
+    if obj_type is str or obj_type is int or obj_type is float or obj_type is bool or obj is None:
+        return obj
+    if obj_type is list or obj_type is tuple:
+        return [_unstructure_param(item, consumes, foreign) for item in obj]
+    if obj_type is dict:
+        unstructured = {}
+        for key, value in obj.items():
+            if type(key) is not str:
+                # json.dumps stringifies non-str keys, so the cleaned params have to be parsed back.
+                foreign.append(key)
+                if not isinstance(key, (int, float, bool, type(None))):
+                    key = pydantic_ltype_aware_cattr.unstructure(key)
+            unstructured[key] = _unstructure_param(value, consumes, foreign)
+        return unstructured
+    if obj_type is _lstr and obj.__dict__.keys() == {"__origin_trace__"}:
+        consumes.update(obj.__origin_trace__)
+        return {"content": str(obj), "__origin_trace__": repr(obj.__origin_trace__), "__lstr": True}
+    foreign.append(obj)
+    return pydantic_ltype_aware_cattr.unstructure(obj)
 
 
 def is_immutable_variable(value):
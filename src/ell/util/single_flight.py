@@ -0,0 +1,133 @@
+"""
+Single-flight coalescing of identical concurrent provider calls.
+
+When many callers send the same request at nearly the same moment, the first one (the leader) makes the provider
+call and the others wait for it and share its response. Each caller still records its own invocation: shared
+messages are re-traced to the caller's invocation and keep the leader's invocation in their origin trace, which
+links every follower's results to the invocation that paid for them. Followers report no token usage.
+
+Requests are matched on the canonicalized provider payload (see `ell.util.prompt_cache.request_hash`), so calls
+with the same state cache key, or from different LMPs that build the same request, are coalesced alike. Enable it
+with `ell.init(single_flight=True)`.
+"""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, List, Mapping, Optional, Tuple, TypeVar
+
+from ell.types import ContentBlock, Message, ToolCall
+from ell.types._lstr import _lstr
+from ell.util.prompt_cache import request_hash
+
+T = TypeVar("T")
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """Runs at most one call per key at a time; callers that arrive while it is in flight share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._futures: Dict[Tuple[int, Hashable], "asyncio.Future[T]"] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """Returns `fn()`'s result (or raises its error) and whether it was shared from another caller's call."""
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+            return flight.result, False
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Async counterpart of `do`. Coalesces callers on the same event loop."""
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            future = self._futures.get(loop_key)
+            leader = future is None
+            if leader:
+                future = self._futures[loop_key] = loop.create_future()
+                # Mark the outcome as retrieved even if nobody else was waiting for it.
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        if not leader:
+            return await asyncio.shield(future), True
+
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._futures[loop_key]
+
+
+def single_flight_key(
+    provider: Any, client: Any, provider_call_params: Mapping[str, Any], prompt_cache_key: Optional[str] = None
+) -> Optional[str]:
+    """The key identical requests are coalesced on, or None if single flight is disabled."""
+    from ell.configurator import config
+
+    if not config.single_flight:
+        return None
+    # The prompt cache key, when there is one, is the same hash.
+    return prompt_cache_key or request_hash(provider, client, provider_call_params)
+
+
+def _retrace(value: Any, origin_id: Optional[str]) -> Any:
+    if isinstance(value, _lstr) and origin_id is not None:
+        return _lstr(str(value), origin_trace=value.__origin_trace__ | {origin_id})
+    return value
+
+
+def share_response(
+    messages: List[Message], leader_origin_id: Optional[str], origin_id: Optional[str], logger_fn: Optional[Callable[..., None]] = None
+) -> Tuple[List[Message], Dict[str, Any]]:
+    """A follower's copy of the leader's response, traced to both invocations, and its metadata."""
+    shared = []
+    for message in messages:
+        content = []
+        for block in message.content:
+            if block.text is not None:
+                block = ContentBlock(text=_retrace(block.text, origin_id))
+            elif block.tool_call is not None:
+                tool_call = block.tool_call
+                block = ContentBlock(
+                    tool_call=ToolCall(
+                        tool=tool_call.tool, params=tool_call.params, tool_call_id=_retrace(tool_call.tool_call_id, origin_id)
+                    )
+                )
+            content.append(block)
+        if logger_fn:
+            logger_fn(message.text)
+        shared.append(Message(role=message.role, content=content))
+    return shared, {"single_flight_leader": leader_origin_id}
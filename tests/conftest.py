@@ -1,7 +1,91 @@
 import pytest
 import os
+from typing import Any, Dict, List, Optional
 from unittest.mock import patch
 
+from ell.provider import EllCallParams, Provider
+
 @pytest.fixture(autouse=True)
 def setup_test_env():
     yield
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    """Installs a fresh SQLiteStore as ell's global store for the duration of a test."""
+    from ell.configurator import config
+    from ell.stores.sql import SQLiteStore
+
+    old_store = config.store
+    config.store = SQLiteStore(str(tmp_path))
+    try:
+        yield config.store
+    finally:
+        config.store = old_store
+
+
+def write_test_lmp(store, lmp_id="test_lmp_1", **fields: Any):
+    """Writes an LMP with no dependencies directly to `store`; `fields` override its defaults."""
+    from ell.stores.models.core import SerializedLMP
+    from ell.types.lmp import LMPType
+    from ell.util.serialization import utc_now
+
+    lmp_fields: Dict[str, Any] = dict(
+        name=lmp_id, source="def test_function(): pass", dependencies="", lmp_type=LMPType.LM, created_at=utc_now()
+    )
+    store.write_lmp(SerializedLMP(lmp_id=lmp_id, **{**lmp_fields, **fields}), {})
+
+
+def make_invocation(invocation_id, lmp_id="test_lmp_1", params=None, results=None, **fields: Any):
+    """An invocation of `lmp_id` with inline contents, ready for `store.write_invocation`."""
+    from ell.stores.models.core import Invocation, InvocationContents
+    from ell.util.serialization import utc_now
+
+    invocation_fields: Dict[str, Any] = dict(latency_ms=1.0, prompt_tokens=1, completion_tokens=1, created_at=utc_now())
+    return Invocation(
+        id=invocation_id,
+        lmp_id=lmp_id,
+        **{**invocation_fields, **fields},
+        contents=InvocationContents(
+            invocation_id=invocation_id, params={"x": 1} if params is None else params, results=results
+        ),
+    )
+
+
+class CountingClient:
+    """A fake provider client that records the messages of each request and answers with a numbered response."""
+
+    def __init__(self):
+        self.requests = []
+
+    def create(self, model: str, messages: List[Dict[str, Any]], stream: bool = False):
+        self.requests.append(messages)
+        return f"response {len(self.requests)}"
+
+
+class CountingProvider(Provider):
+    def provider_call_function(self, client, api_call_params: Optional[Dict[str, Any]] = None):
+        return client.create
+
+    def translate_to_provider(self, ell_call: EllCallParams):
+        messages = [dict(role=m.role, content=m.text_only) for m in ell_call.messages]
+        return dict(model=ell_call.model, messages=messages, stream=True)
+
+    def translate_from_provider(self, provider_response, ell_call, provider_call_params, origin_id=None, logger=None):
+        from ell.types import Message
+        from ell.types._lstr import _lstr
+
+        return [Message(role="assistant", content=_lstr(provider_response, origin_trace=origin_id))], {}
+
+
+@pytest.fixture
+def counting_provider():
+    """Registers `CountingProvider` for `CountingClient` (and its subclasses) for the duration of a test."""
+    from ell.configurator import config
+
+    old_providers = dict(config.providers)
+    config.register_provider(CountingProvider(), CountingClient)
+    try:
+        yield
+    finally:
+        config.providers = old_providers
@@ -0,0 +1,168 @@
+import asyncio
+import importlib
+import inspect
+import json
+from typing import Any, Dict, List, Optional
+
+import pytest
+from sqlmodel import Session, select
+
+import ell
+from ell.configurator import config, register_provider
+from ell.provider import EllCallParams, Provider
+from ell.stores.models.core import Invocation
+from ell.types import Message
+from ell.types._lstr import _lstr
+
+
+class FakeAsyncClient:
+    async def create(self, model: str, messages: List[Dict[str, Any]]):
+        await asyncio.sleep(0)
+        return f"echo: {messages[-1]['content']}"
+
+
+class FakeSyncClient:
+    def create(self, model: str, messages: List[Dict[str, Any]]):
+        return f"sync echo: {messages[-1]['content']}"
+
+
+class FakeProvider(Provider):
+    def provider_call_function(self, client, api_call_params: Optional[Dict[str, Any]] = None):
+        return client.create
+
+    def translate_to_provider(self, ell_call: EllCallParams):
+        return dict(
+            model=ell_call.model,
+            messages=[dict(role=m.role, content=m.text_only) for m in ell_call.messages],
+        )
+
+    def translate_from_provider(self, provider_response, ell_call, provider_call_params, origin_id=None, logger=None):
+        return (
+            [Message(role="assistant", content=_lstr(provider_response, origin_trace=origin_id))],
+            {"usage": {"prompt_tokens": 1, "completion_tokens": 2}},
+        )
+
+
+register_provider(FakeProvider(), FakeAsyncClient)
+register_provider(FakeProvider(), FakeSyncClient)
+
+
+@ell.simple(model="fake-model", client=FakeAsyncClient())
+async def async_echo(text: str):
+    return f"say {text}"
+
+
+@ell.simple(model="fake-model", client=FakeSyncClient())
+async def async_echo_with_sync_client(text: str):
+    return f"say {text}"
+
+
+def test_async_lmps_are_coroutine_functions():
+    assert inspect.iscoroutinefunction(async_echo)
+    assert inspect.iscoroutinefunction(async_echo.__ell_func__)
+
+
+def test_async_lmp_without_store():
+    assert asyncio.run(async_echo("hi")) == "echo: say hi"
+
+
+def test_async_lmp_with_sync_client_falls_back_to_thread():
+    assert asyncio.run(async_echo_with_sync_client("hi")) == "sync echo: say hi"
+
+
+def test_async_lmps_are_tracked_concurrently(sqlite_store):
+    async def main():
+        return await asyncio.gather(*[async_echo(str(i), _get_invocation_id=True) for i in range(10)])
+
+    results = asyncio.run(main())
+    assert [r for r, _ in results] == [f"echo: say {i}" for i in range(10)]
+
+    with Session(sqlite_store.engine) as session:
+        invocations = session.exec(select(Invocation)).all()
+        assert {i.id for i in invocations} == {invocation_id for _, invocation_id in results}
+        assert all(i.prompt_tokens == 1 and i.completion_tokens == 2 for i in invocations)
+
+
+def test_async_lmps_track_their_own_parent(sqlite_store):
+    @ell.simple(model="fake-model", client=FakeAsyncClient())
+    async def inner(text: str):
+        return f"say {text}"
+
+    @ell.simple(model="fake-model", client=FakeAsyncClient())
+    async def outer(text: str):
+        return f"outer {await inner(text)}"
+
+    # Sibling tasks interleave on one event loop; each nested call must still link to its own parent.
+    async def main():
+        return await asyncio.gather(*[outer(str(i), _get_invocation_id=True) for i in range(8)])
+
+    results = asyncio.run(main())
+    outer_ids = {invocation_id for _, invocation_id in results}
+
+    with Session(sqlite_store.engine) as session:
+        inner_invocations = session.exec(select(Invocation).where(Invocation.lmp_id == inner.__ell_func__.__ell_hash__)).all()
+        assert len(inner_invocations) == 8
+        assert {i.used_by_id for i in inner_invocations} == outer_ids
+
+
+def _sse(events):
+    return "".join(
+        (f"event: {name}\n" if name else "") + f"data: {data if isinstance(data, str) else json.dumps(data)}\n\n"
+        for name, data in events
+    ).encode()
+
+
+def _mock_http_client(sdk, events):
+    """An http client for `sdk` (a provider SDK module) that answers every request with the given SSE events."""
+    # Use whichever httpx distribution the SDK is built on.
+    httpx = importlib.import_module(sdk.DefaultAsyncHttpxClient.__mro__[1].__module__.split(".")[0])
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=_sse(events))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), requests
+
+
+def test_async_openai_client_is_awaited_on_the_loop():
+    openai = pytest.importorskip("openai")
+    chunk = dict(id="c", object="chat.completion.chunk", created=0, model="gpt-4o-mini")
+    http_client, requests = _mock_http_client(openai, [
+        (None, dict(chunk, choices=[dict(index=0, delta=dict(role="assistant", content="Ahoy"), finish_reason=None)])),
+        (None, dict(chunk, choices=[dict(index=0, delta=dict(content=" there"), finish_reason="stop")])),
+        (None, dict(chunk, choices=[], usage=dict(prompt_tokens=3, completion_tokens=2, total_tokens=5))),
+        (None, "[DONE]"),
+    ])
+    client = openai.AsyncOpenAI(api_key="sk-test", http_client=http_client)
+
+    @ell.simple(model="gpt-4o-mini", client=client)
+    async def greet(name: str):
+        return f"Greet {name}."
+
+    assert asyncio.run(greet("the crew")) == "Ahoy there"
+    assert requests[0]["messages"][-1]["content"] == [{"type": "text", "text": "Greet the crew."}]
+
+
+def test_async_anthropic_client_is_awaited_on_the_loop():
+    anthropic = pytest.importorskip("anthropic")
+    usage = dict(input_tokens=3, output_tokens=2)
+    http_client, requests = _mock_http_client(anthropic, [
+        ("message_start", dict(type="message_start", message=dict(
+            id="m", type="message", role="assistant", model="claude-3-5-sonnet-20241022", content=[],
+            stop_reason=None, stop_sequence=None, usage=usage,
+        ))),
+        ("content_block_start", dict(type="content_block_start", index=0, content_block=dict(type="text", text=""))),
+        ("content_block_delta", dict(type="content_block_delta", index=0, delta=dict(type="text_delta", text="Ahoy"))),
+        ("content_block_stop", dict(type="content_block_stop", index=0)),
+        ("message_delta", dict(type="message_delta", delta=dict(stop_reason="end_turn", stop_sequence=None), usage=usage)),
+        ("message_stop", dict(type="message_stop")),
+    ])
+    client = anthropic.AsyncAnthropic(api_key="sk-test", http_client=http_client)
+
+    @ell.simple(model="claude-3-5-sonnet-20241022", client=client, max_tokens=10)
+    async def greet(name: str):
+        return f"Greet {name}."
+
+    assert asyncio.run(greet("the crew")) == "Ahoy"
+    assert requests[0]["messages"][-1]["content"][0]["text"] == "Greet the crew."
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+import ell
+import ell.lmp.function
+from sqlmodel import Session, select
+
+from ell.stores.bundle import export_cache_bundle, import_cache_bundle
+from ell.stores.models.core import Invocation
+from ell.stores.sql import SQLiteStore
+from tests.conftest import make_invocation
+
+
+@ell.lmp.function.function()
+def inner(x: int):
+    return x + 1
+
+
+@ell.lmp.function.function()
+def squared(x: int):
+    return inner(x) ** 2
+
+
+@ell.lmp.function.function()
+def negated(x: int):
+    return -x
+
+
+def test_bundle_round_trip_warms_another_store(sqlite_store, tmp_path):
+    with sqlite_store.freeze(squared, negated):
+        for x in (1, 2, 2):
+            squared(x)
+        negated(5)
+
+    bundle = str(tmp_path / "cache.ell.gz")
+    stats = export_cache_bundle(sqlite_store, bundle, lmp_name=squared.__ell_func__.__qualname__)
+    # Two distinct calls to squared; its dependency comes along, negated does not.
+    assert (stats.invocations, stats.lmps) == (2, 2)
+    assert stats.contents == 2
+
+    other = SQLiteStore(str(tmp_path / "other"))
+    imported = import_cache_bundle(other, bundle)
+    assert (imported.invocations, imported.lmps, imported.skipped) == (2, 2, 0)
+    assert [lmp.lmp_id for lmp in other.get_versions_by_fqn(inner.__ell_func__.__qualname__)] == [inner.__ell_func__.__ell_hash__]
+    assert other.get_versions_by_fqn(squared.__ell_func__.__qualname__)[0].num_invocations == 2
+    assert other.get_versions_by_fqn(negated.__ell_func__.__qualname__) == []
+
+    # Importing again is a no-op.
+    assert import_cache_bundle(other, bundle).skipped == 2
+
+    # The imported store answers the frozen call without running the LMP.
+    ell.config.store = other
+    with other.freeze(squared):
+        assert squared(2) == 9
+    assert other.get_versions_by_fqn(squared.__ell_func__.__qualname__)[0].num_invocations == 2
+
+
+def test_bundle_date_range(sqlite_store, tmp_path):
+    @ell.lmp.function.function()
+    def halved(x: int):
+        return x / 2
+
+    halved(1)
+
+    bundle = str(tmp_path / "cache.ell.gz")
+    tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
+    assert export_cache_bundle(sqlite_store, bundle, since=tomorrow).invocations == 0
+    assert export_cache_bundle(sqlite_store, bundle, until=tomorrow).invocations == 1
+
+
+def test_bundle_exports_only_the_invocations_lookups_serve(sqlite_store, tmp_path):
+    @ell.lmp.function.function()
+    def tripled(x: int):
+        return x * 3
+
+    # Unfrozen calls are all recorded under the same key; a lookup serves only the latest.
+    for _ in range(3):
+        tripled(1)
+    lmp_id = tripled.__ell_func__.__ell_hash__
+    sqlite_store.write_invocation(make_invocation("without-key", lmp_id), set())
+    with Session(sqlite_store.engine) as session:
+        (state_cache_key,) = set(session.exec(select(Invocation.state_cache_key).where(Invocation.id != "without-key")))
+    latest = sqlite_store.get_cached_invocations(lmp_id, state_cache_key)[0]
+
+    bundle = str(tmp_path / "cache.ell.gz")
+    assert export_cache_bundle(sqlite_store, bundle).invocations == 1
+    other = SQLiteStore(str(tmp_path / "other"))
+    import_cache_bundle(other, bundle)
+    assert [invocation.id for invocation in other.get_cached_invocations(lmp_id, state_cache_key)] == [latest.id]
@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Optional
+
+import ell
+from ell.configurator import _Model, config, register_provider
+from ell.provider import EllCallParams, Provider
+from ell.types import Message
+from ell.types._lstr import _lstr
+
+
+class PlanClient:
+    def __init__(self, name: str):
+        self.name = name
+
+    def create(self, model: str, messages: List[Dict[str, Any]]):
+        return self.name
+
+
+class TaggingProvider(Provider):
+    def __init__(self, tag: str):
+        self.tag = tag
+
+    def provider_call_function(self, client, api_call_params: Optional[Dict[str, Any]] = None):
+        return client.create
+
+    def translate_to_provider(self, ell_call: EllCallParams):
+        return dict(model=ell_call.model, messages=[dict(role=m.role, content=m.text_only) for m in ell_call.messages])
+
+    def translate_from_provider(self, provider_response, ell_call, provider_call_params, origin_id=None, logger=None):
+        content = _lstr(f"{self.tag}:{provider_response}", origin_trace=origin_id)
+        return [Message(role="assistant", content=content)], {}
+
+
+def test_call_plan_follows_config_changes(monkeypatch):
+    # Register into copies, so the test's models and providers don't outlive it.
+    monkeypatch.setattr(config, "registry", dict(config.registry))
+    monkeypatch.setattr(config, "providers", dict(config.providers))
+    register_provider(TaggingProvider("a"), PlanClient)
+    config.register_model("plan-model", default_client=PlanClient("first"))
+
+    @ell.simple(model="plan-model")
+    def hello():
+        return "hello"
+
+    assert hello() == "a:first"
+
+    register_provider(TaggingProvider("b"), PlanClient)
+    assert hello() == "b:first"
+
+    config.register_model("plan-model", default_client=PlanClient("second"))
+    assert hello() == "b:second"
+
+    with config.model_registry_override({"plan-model": _Model(name="plan-model", default_client=PlanClient("override"))}):
+        assert hello() == "b:override"
+    assert hello() == "b:second"
+
+    assert hello(client=PlanClient("explicit")) == "b:explicit"
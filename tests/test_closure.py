@@ -365,6 +365,18 @@ def test_lexical_closure_with_async_function():
     assert "return x * 2" in closure
     assert isinstance(uses, Set)
 
+def test_ast_function_hash_ignores_formatting():
+    from ell.util.closure import ast_function_hash
+
+    written = "def f(x):\n  return x+1\n"
+    reformatted = "def f(x):\n    # increment\n    return x + 1\n"
+    changed = "def f(x):\n    return x + 2\n"
+    dependencies = "# <BmV>\nclient = <OpenAI object>\n# </BmV>\n"
+
+    assert ast_function_hash(written, dependencies, "f") == ast_function_hash(reformatted, dependencies, "f")
+    assert ast_function_hash(written, dependencies, "f") != ast_function_hash(changed, dependencies, "f")
+
+
 # def test_lexical_closure_with_reexported_modules():
 #     # Simulate re-exported modules
 #     # module_a.py
@@ -460,4 +472,4 @@ def test_lexical_closure_with_async_function():
 #             unique_lines.add(stripped_line)
 
 if __name__ == "__main__":
-    test_lexical_closure_uses()
\ No newline at end of file
+    test_lexical_closure_uses()
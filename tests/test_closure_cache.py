@@ -0,0 +1,87 @@
+import importlib
+import os
+import sys
+import textwrap
+
+import pytest
+
+from ell.configurator import config
+from ell.util.closure import lexically_closured_source
+from ell.util.closure_cache import get_closure_cache
+
+MODULE_SOURCE = textwrap.dedent(
+    '''
+    import ell
+
+    GREETING = "{greeting}"
+
+    def shout(text):
+        return text.upper() + "!"
+
+    @ell.simple(model="gpt-4o-mini", client=object())
+    def inner(name: str):
+        return shout(GREETING + " " + name)
+
+    @ell.simple(model="gpt-4o-mini", client=object())
+    def outer(name: str):
+        return inner(name)
+    '''
+)
+
+
+@pytest.fixture
+def lmp_module(tmp_path, monkeypatch):
+    module_path = tmp_path / "closure_cache_lmps.py"
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(config, "closure_cache_dir", str(tmp_path / "closure_cache"))
+    # Version on demand so that the test controls when closures are computed.
+    monkeypatch.setattr(config, "lazy_versioning", True)
+
+    def load(greeting="hello"):
+        source = MODULE_SOURCE.format(greeting=greeting)
+        if not module_path.exists() or module_path.read_text() != source:
+            module_path.write_text(source)
+            # Make sure the edit is visible even on filesystems with coarse mtimes.
+            stat = os.stat(module_path)
+            os.utime(module_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        sys.modules.pop("closure_cache_lmps", None)
+        importlib.invalidate_caches()
+        return importlib.import_module("closure_cache_lmps")
+
+    yield load
+    sys.modules.pop("closure_cache_lmps", None)
+
+
+def test_closure_cache_restores_closures_across_imports(lmp_module):
+    cache = get_closure_cache()
+
+    first = lmp_module()
+    lexically_closured_source(first.outer.__ell_func__)
+    assert (cache.stats.hits, cache.stats.misses) == (0, 1)
+
+    second = lmp_module()
+    lexically_closured_source(second.outer.__ell_func__)
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+    for name in ("outer", "inner"):
+        computed, restored = getattr(first, name), getattr(second, name)
+        computed = computed.__ell_func__ if name == "outer" else computed
+        restored = restored.__ell_func__ if name == "outer" else restored
+        assert restored.__ell_hash__ == computed.__ell_hash__
+        assert restored.__ell_closure__[:2] == computed.__ell_closure__[:2]
+        assert restored.__ell_closure__[2].keys() == computed.__ell_closure__[2].keys()
+    assert second.outer.__ell_func__.__ell_uses__ == {second.inner}
+
+
+def test_closure_cache_misses_when_a_source_file_changes(lmp_module):
+    cache = get_closure_cache()
+
+    first = lmp_module("hello")
+    lexically_closured_source(first.outer.__ell_func__)
+
+    changed = lmp_module("goodbye")
+    lexically_closured_source(changed.outer.__ell_func__)
+
+    assert cache.stats.hits == 0
+    assert changed.outer.__ell_func__.__ell_hash__ != first.outer.__ell_func__.__ell_hash__
+    assert "goodbye" in changed.outer.__ell_func__.__ell_closure__[1]
@@ -0,0 +1,107 @@
+import json
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+import ell
+import ell.lmp.function
+from ell.stores.compression import ZLIB, Compressor, blob_dictionary_id, decompress, train_dictionary
+from ell.stores.models.core import Invocation
+from ell.stores.sql import SQLiteStore
+
+
+def _payload(i):
+    return json.dumps(
+        {"results": [{"role": "assistant", "content": [{"text": {"content": f"The answer is {i}.", "__lstr": True}}]}]},
+        sort_keys=True,
+    ).encode()
+
+
+def test_trained_dictionary_shrinks_small_payloads():
+    samples = [_payload(i) for i in range(200)]
+    dictionary = train_dictionary(samples, codec=ZLIB)
+    plain, trained = Compressor(ZLIB), Compressor(ZLIB, dictionary)
+
+    payload = _payload(1000)
+    assert len(trained.compress(payload)) < len(plain.compress(payload)) < len(payload) + 30
+    blob = trained.compress(payload)
+    assert decompress(blob, dictionary if blob_dictionary_id(blob) else None) == payload
+
+
+def test_compressed_contents_read_back_transparently(tmp_path):
+    old_store = ell.config.store
+    ell.config.store = store = SQLiteStore(str(tmp_path), compress_contents=True, compression_threshold=16)
+    try:
+        @ell.lmp.function.function()
+        def shout(word: str):
+            return f"{word.upper()}!"
+
+        for word in ("ahoy", "avast"):
+            shout(word)
+        assert store.train_compression_dictionary() is not None
+        shout("belay")
+
+        with Session(store.engine) as session:
+            raw = session.execute(text("SELECT results, compressed FROM invocationcontents")).all()
+            assert all(json.loads(results) is None and compressed is not None for results, compressed in raw)
+            invocations = session.exec(select(Invocation).order_by(Invocation.created_at)).all()
+            assert [i.contents.results for i in invocations] == ["AHOY!", "AVAST!", "BELAY!"]
+            assert [i.contents.params for i in invocations] == [{"word": w} for w in ("ahoy", "avast", "belay")]
+
+        with store.freeze(shout):
+            assert shout("belay") == "BELAY!"
+    finally:
+        ell.config.store = old_store
+
+
+def test_training_a_dictionary_does_not_enable_compression(tmp_path):
+    old_store = ell.config.store
+    ell.config.store = store = SQLiteStore(str(tmp_path), compression_threshold=16)
+    try:
+        @ell.lmp.function.function()
+        def shout(word: str):
+            return f"{word.upper()}!"
+
+        shout("ahoy")
+        assert store.train_compression_dictionary() is not None
+        assert store.compressor is None
+        shout("avast")
+
+        with Session(store.engine) as session:
+            raw = session.execute(text("SELECT compressed FROM invocationcontents")).all()
+            assert all(compressed is None for compressed, in raw)
+        # A store opened with compression picks up the saved dictionary.
+        assert SQLiteStore(str(tmp_path), compress_contents=True).compressor.dictionary is not None
+    finally:
+        ell.config.store = old_store
+
+
+def test_compressed_contents_decompress_when_read(tmp_path):
+    from sqlalchemy.orm import selectinload
+    from sqlalchemy.orm.attributes import instance_state
+
+    old_store = ell.config.store
+    ell.config.store = store = SQLiteStore(str(tmp_path), compress_contents=True, compression_threshold=16)
+    try:
+        @ell.lmp.function.function()
+        def shout(word: str):
+            return f"{word.upper()}!"
+
+        shout("ahoy")
+        assert store.train_compression_dictionary() is not None
+        shout("avast")
+
+        with Session(store.engine) as session:
+            invocations = session.exec(
+                select(Invocation).options(selectinload(Invocation.contents)).order_by(Invocation.created_at)
+            ).all()
+            assert all("results" not in instance_state(i.contents).dict for i in invocations)
+            assert invocations[0].contents.results == "AHOY!"
+            assert "results" not in instance_state(invocations[1].contents).dict
+        # Reads after the session closed decompress too, and nothing was written back.
+        assert store.load_invocation_contents(invocations[1])["results"] == "AVAST!"
+        with Session(store.engine) as session:
+            raw = session.execute(text("SELECT results, compressed FROM invocationcontents")).all()
+            assert all(json.loads(results) is None and compressed is not None for results, compressed in raw)
+    finally:
+        ell.config.store = old_store
@@ -0,0 +1,97 @@
+import json
+
+from alembic import command
+from sqlalchemy import create_engine, text
+from sqlmodel import Session, select
+
+import ell
+import ell.lmp.function
+from ell.stores.migrations import get_alembic_config
+from ell.stores.fragments import canonical_json, fragment_hash
+from ell.stores.models.core import ContentFragment, Invocation, InvocationContents, InvocationRollup
+from ell.stores.sql import SQLiteStore
+from tests.conftest import make_invocation, write_test_lmp
+
+INSTRUCTIONS = "Answer in the voice of a ship's captain. " * 10
+
+
+@ell.lmp.function.function()
+def captain(question: str, context: str):
+    return f"{INSTRUCTIONS} {question}"
+
+
+def test_repeated_contents_are_stored_once(sqlite_store):
+    context = "The ship sails at dawn. " * 20
+    for question in ("Where?", "When?", "Why?"):
+        captain(question, context)
+
+    with Session(sqlite_store.engine) as session:
+        raw = session.execute(text("SELECT params, global_vars, global_vars_hash FROM invocationcontents")).all()
+        fragments = session.exec(select(ContentFragment)).all()
+    # Every call has different params, but they all share the same globals.
+    assert len({row.global_vars_hash for row in raw}) == 1
+    assert all(json.loads(row.global_vars) is None for row in raw)
+    assert len(fragments) == 4
+
+    with Session(sqlite_store.engine) as session:
+        invocations = session.exec(select(Invocation).order_by(Invocation.created_at)).all()
+        contents = [invocation.contents for invocation in invocations]
+        assert [c.params["question"] for c in contents] == ["Where?", "When?", "Why?"]
+        assert all(c.params["context"] == context for c in contents)
+        assert all(c.global_vars["INSTRUCTIONS"] == INSTRUCTIONS for c in contents)
+        # Restored fields don't count as changes.
+        assert not session.dirty
+
+
+def test_migration_moves_existing_contents_into_fragments(tmp_path):
+    db_url = f"sqlite:///{tmp_path / 'ell.db'}"
+    alembic_cfg = get_alembic_config(db_url)
+    command.upgrade(alembic_cfg, "3c1e9b7f2a54")
+    params = json.dumps({"document": "x" * 500})
+    engine = create_engine(db_url)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO serializedlmp (lmp_id, name, source, dependencies, created_at, lmp_type) "
+            "VALUES ('lmp-1', 'summarize', '', '', '2024-01-01', 'LM')"
+        ))
+        for i in range(2):
+            conn.execute(text(
+                "INSERT INTO invocation (id, lmp_id, latency_ms, created_at) VALUES (:id, 'lmp-1', 1, '2024-01-01')"
+            ), dict(id=f"invocation-{i}"))
+            conn.execute(text(
+                "INSERT INTO invocationcontents (invocation_id, params, results, is_external) VALUES (:id, :params, '[]', 0)"
+            ), dict(id=f"invocation-{i}", params=params))
+
+    store = SQLiteStore(str(tmp_path))
+    with Session(store.engine) as session:
+        [fragment] = session.exec(select(ContentFragment)).all()
+        # The migration hashes exactly like the store does, so later writes share its fragments.
+        assert fragment.content_hash == fragment_hash(canonical_json(json.loads(params)))
+        [rollup] = session.exec(select(InvocationRollup)).all()
+        assert (rollup.lmp_id, rollup.count, rollup.latency_hist_0) == ("lmp-1", 2, 2)
+        assert session.execute(text("SELECT count(*) FROM invocationcontents WHERE params IS NULL")).scalar() == 2
+        assert [c.params for c in session.exec(select(InvocationContents)).all()] == [json.loads(params)] * 2
+
+    command.downgrade(alembic_cfg, "3c1e9b7f2a54")
+    with engine.connect() as conn:
+        assert [json.loads(p) for (p,) in conn.execute(text("SELECT params FROM invocationcontents"))] == [json.loads(params)] * 2
+
+
+def test_evicting_contents_prunes_their_fragments(tmp_path):
+    store = SQLiteStore(str(tmp_path))
+    write_test_lmp(store)
+    shared, own = {"document": "shared " * 50}, {"document": "own " * 50}
+    store.write_invocations([
+        (make_invocation("kept", params=shared, state_cache_key="k1"), set()),
+        (make_invocation("evicted-shared", params=shared, state_cache_key="k2"), set()),
+        (make_invocation("evicted-own", params=own, state_cache_key="k3"), set()),
+    ])
+    with Session(store.engine) as session:
+        session.execute(text("UPDATE invocation SET created_at = '2000-01-01' WHERE id LIKE 'evicted-%'"))
+        session.commit()
+
+    assert store.evict_cached_invocations(max_entries=1) == 2
+    with Session(store.engine) as session:
+        hashes = set(session.exec(select(ContentFragment.content_hash)).all())
+        assert hashes == {fragment_hash(canonical_json(shared))}
+        assert session.get(Invocation, "kept").contents.params == shared
@@ -0,0 +1,79 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+PROVIDER_SDKS = ["openai", "anthropic", "groq", "botocore", "google.genai", "black"]
+
+
+def run_fresh(code):
+    """Runs `code` in a fresh interpreter and returns what it printed as JSON."""
+    env = dict(os.environ, OPENAI_API_KEY="sk-test")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", textwrap.dedent(code)],
+        capture_output=True, text=True, check=True, env=env,
+    )
+    return json.loads(result.stdout), result.stderr
+
+
+def test_import_ell_does_not_import_provider_sdks():
+    imported, importtime = run_fresh(
+        f"""
+        import json, sys
+        import ell
+        print(json.dumps([sdk for sdk in {PROVIDER_SDKS!r} if sdk in sys.modules]))
+        """
+    )
+    assert imported == []
+    assert any(line.endswith("| ell") for line in importtime.splitlines())
+
+
+def test_providers_and_models_are_registered_on_first_use():
+    loaded, _ = run_fresh(
+        """
+        import json, sys
+        import ell
+        from ell.configurator import config
+
+        config.register_model("gpt-4o", default_client="registered before the defaults")
+        client, fallback = config.get_client_for("gpt-4o-mini")
+        provider = config.get_provider_for(client)
+        print(json.dumps(dict(
+            client=type(client).__module__,
+            fallback=fallback,
+            provider=type(provider).__name__,
+            kept=config.get_client_for("gpt-4o")[0],
+            anthropic="anthropic" in sys.modules,
+            ollama=ell.models.ollama.__name__,
+        )))
+        """
+    )
+    assert loaded == dict(
+        client="openai",
+        fallback=False,
+        provider="OpenAIProvider",
+        kept="registered before the defaults",
+        anthropic=False,
+        ollama="ell.models.ollama",
+    )
+
+
+def test_defining_an_lmp_does_not_import_provider_sdks():
+    imported, _ = run_fresh(
+        f"""
+        import json, sys
+        import ell
+
+        @ell.simple(model="gpt-4o-mini")
+        def hello(name: str):
+            return f"Say hello to {{name}}."
+
+        @ell.complex(model="claude-3-5-sonnet-20241022")
+        def chat(message: str):
+            return [ell.user(message)]
+
+        print(json.dumps([sdk for sdk in {PROVIDER_SDKS!r} if sdk in sys.modules]))
+        """
+    )
+    assert imported == []
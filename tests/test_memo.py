@@ -0,0 +1,26 @@
+from ell.stores.memo import MemoCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_memo_cache_evicts_least_recently_used_and_expires():
+    clock = FakeClock()
+    memo = MemoCache(max_size=2, ttl=10, clock=clock)
+
+    memo.put("a", 1)
+    memo.put("b", 2)
+    assert memo.get("a") == 1
+    memo.put("c", 3)
+    assert memo.get("b") is None
+    assert (memo.get("a"), memo.get("c")) == (1, 3)
+
+    clock.now = 10
+    assert memo.get("a") is None
+    assert len(memo) == 1
+    assert (memo.stats.hits, memo.stats.misses, memo.stats.evictions) == (3, 2, 1)
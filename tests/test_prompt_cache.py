@@ -0,0 +1,30 @@
+import ell
+from ell.configurator import config
+from tests.conftest import CountingClient
+
+
+def test_prompt_cache_is_shared_by_lmps_that_send_the_same_request(sqlite_store, counting_provider, monkeypatch):
+    monkeypatch.setattr(config, "prompt_cache", True)
+    client = CountingClient()
+
+    @ell.simple(model="counting-model", client=client)
+    def greet(name: str):
+        return f"Say hello to {name}."
+
+    @ell.simple(model="counting-model", client=client)
+    def greet_reworded(person: str):
+        # Written differently, but sends the same messages.
+        greeting = "Say hello to " + person
+        return greeting + "."
+
+    assert greet("Ada") == "response 1"
+    assert greet_reworded("Ada") == "response 1"
+    assert greet("Grace") == "response 2"
+    assert len(client.requests) == 2
+
+    # Cached responses are traced to the invocation that reused them.
+    result, invocation_id = greet_reworded("Ada", _get_invocation_id=True)
+    assert invocation_id in result.__origin_trace__
+
+    monkeypatch.setattr(config, "prompt_cache", False)
+    assert greet("Ada") == "response 3"
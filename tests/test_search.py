@@ -0,0 +1,126 @@
+import json
+
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session
+
+import ell.stores.search as search_module
+import ell.stores.sql as sql_module
+from ell.stores.models.core import InvocationContents
+from ell.stores.search import SEARCH_KEY_TABLE, SEARCH_TABLE, extract_text
+from ell.stores.sql import SQLiteStore
+from tests.conftest import make_invocation, write_test_lmp
+
+
+def _invocation(invocation_id, lmp_id, question, answer, state_cache_key=None):
+    return make_invocation(
+        invocation_id,
+        lmp_id,
+        params={"question": question},
+        results=[{"role": "assistant", "content": [{"text": {"content": answer, "__lstr": True}}]}],
+        state_cache_key=state_cache_key,
+    )
+
+
+def _hit_ids(store, query, **kwargs):
+    with Session(store.engine) as session:
+        return [hit.invocation_id for hit in store.search_invocations(session, query, **kwargs)]
+
+
+def test_extract_text_skips_metadata():
+    text = extract_text({"role": "user", "content": [{"text": {"content": "hello there", "__lstr": True}}], "n": 3})
+    assert text == "hello there"
+
+
+def test_search_invocations(tmp_path):
+    store = SQLiteStore(str(tmp_path), full_text_search=True)
+    write_test_lmp(store, "sailor")
+    write_test_lmp(store, "farmer")
+    store.write_invocations([
+        (_invocation("i1", "sailor", "Where does the ship go?", "The ship sails north at dawn.", "k1"), set()),
+        (_invocation("i2", "sailor", "What is the weather?", "A storm is coming from the sea.", "k2"), set()),
+        (_invocation("i3", "farmer", "When is the harvest?", "The harvest starts at dawn, ship it by noon."), set()),
+    ])
+    # Externalized contents are indexed from the blob store.
+    external = _invocation("invocation-000004", "sailor", "Any whales?", "A humpback whale breached.")
+    store.blob_store.store_blob(json.dumps(external.contents.model_dump()).encode("utf-8"), "invocation-000004")
+    external.contents = InvocationContents(invocation_id="invocation-000004", is_external=True)
+    store.write_invocation(external, set())
+
+    assert set(_hit_ids(store, "ship dawn")) == {"i1", "i3"}
+    assert _hit_ids(store, "ship dawn", lmp_id="farmer") == ["i3"]
+    assert _hit_ids(store, "humpback") == ["invocation-000004"]
+    assert _hit_ids(store, '"unbalanced (query') == []
+    with Session(store.engine) as session:
+        [hit] = store.search_invocations(session, "storm")
+    assert hit.lmp_id == "sailor" and "<mark>storm</mark>" in hit.snippet
+
+    # A store opened without the flag keeps the existing index up to date.
+    other = SQLiteStore(str(tmp_path))
+    other.write_invocation(_invocation("i5", "farmer", "Rain?", "Plenty of rain for the storm season."), set())
+    assert set(_hit_ids(other, "storm")) == {"i2", "i5"}
+
+    # Evicted invocations leave the index.
+    assert other.evict_cached_invocations(max_entries=0) == 2
+    assert _hit_ids(other, "storm") == ["i5"]
+
+    assert other.rebuild_search_index(batch_size=2) == 3
+    assert set(_hit_ids(other, "storm")) == {"i5"}
+    assert set(_hit_ids(other, "dawn")) == {"i3"}
+
+
+def test_search_requires_index(tmp_path):
+    store = SQLiteStore(str(tmp_path))
+    assert not store.full_text_search
+    with Session(store.engine) as session, pytest.raises(LookupError):
+        store.search_invocations(session, "anything")
+
+
+def test_index_created_by_another_store_is_kept_up_to_date(tmp_path):
+    store = SQLiteStore(str(tmp_path))
+    write_test_lmp(store, "sailor")
+    SQLiteStore(str(tmp_path), full_text_search=True)
+
+    store.write_invocation(_invocation("i1", "sailor", "Where to?", "North, past the storm."), set())
+    assert _hit_ids(store, "storm") == ["i1"]
+
+
+def test_rebuild_keeps_the_old_index_until_it_commits(tmp_path, monkeypatch):
+    store = SQLiteStore(str(tmp_path), full_text_search=True)
+    write_test_lmp(store, "sailor")
+    store.write_invocations([
+        (_invocation(f"i{i}", "sailor", "Where to?", f"North, past storm number {i}."), set()) for i in range(3)
+    ])
+
+    seen_during_rebuild = []
+    contents_text = search_module.contents_text
+
+    def searching_contents_text(contents):
+        seen_during_rebuild.append(len(_hit_ids(store, "storm")))
+        return contents_text(contents)
+
+    monkeypatch.setattr(sql_module, "contents_text", searching_contents_text)
+    assert store.rebuild_search_index(batch_size=1) == 3
+    assert seen_during_rebuild == [3, 3, 3]
+    assert len(_hit_ids(store, "storm")) == 3
+
+
+def test_unindexing_looks_invocations_up_by_key(tmp_path):
+    store = SQLiteStore(str(tmp_path), full_text_search=True)
+    write_test_lmp(store, "sailor")
+    store.write_invocation(_invocation("i1", "sailor", "Where to?", "North, past the storm.", "k1"), set())
+
+    with Session(store.engine) as session:
+        plan = session.execute(text(
+            f"EXPLAIN QUERY PLAN DELETE FROM {SEARCH_TABLE} WHERE rowid IN "
+            f"(SELECT id FROM {SEARCH_KEY_TABLE} WHERE invocation_id IN ('i1'))"
+        )).all()
+    details = [row[-1] for row in plan]
+    # The FTS5 rows are found by rowid ("0:=") and the keys through their unique index, never by a full scan.
+    assert f"SCAN {SEARCH_TABLE} VIRTUAL TABLE INDEX 0:=" in details
+    assert any(detail.startswith(f"SEARCH {SEARCH_KEY_TABLE} USING") for detail in details)
+
+    assert store.evict_cached_invocations(max_entries=0) == 1
+    with Session(store.engine) as session:
+        assert session.execute(text(f"SELECT count(*) FROM {SEARCH_KEY_TABLE}")).scalar() == 0
+    assert _hit_ids(store, "storm") == []
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+from sqlmodel import Session
+
+import ell
+import ell.lmp.function
+from ell.stores.models.core import Invocation
+from ell.stores.segments import SegmentBlobStore
+from ell.stores.sql import SQLBlobStore, SQLiteStore
+
+
+def test_segments_store_rebuild_and_compact(tmp_path):
+    store = SegmentBlobStore(str(tmp_path / "segments"), max_segment_size=4096)
+    blobs = {f"invocation-{i:04d}": os.urandom(900) for i in range(20)}
+    for blob_id, blob in blobs.items():
+        store.store_blob(blob, blob_id)
+    store.store_blob(b"replaced", "invocation-0000")
+    blobs["invocation-0000"] = b"replaced"
+
+    assert len(store.segments()) > 1
+    assert all(store.retrieve_blob(blob_id) == blob for blob_id, blob in blobs.items())
+    with pytest.raises(KeyError):
+        store.retrieve_blob("invocation-missing")
+
+    # The index can be rebuilt from the segments alone.
+    store._index.execute("DELETE FROM blobs")
+    assert store.rebuild_index() == len(blobs)
+    assert all(store.retrieve_blob(blob_id) == blob for blob_id, blob in blobs.items())
+
+    # Dropping most blobs lets every sealed segment be rewritten.
+    kept = {"invocation-0000", "invocation-0019"}
+    segments_before = store.segments()
+    stats = store.compact(kept, min_age=0)
+    assert stats.dropped_blobs == len(blobs) - len(kept)
+    assert stats.rewritten_segments == len(segments_before) - 1
+    assert not set(segments_before[:-1]) & set(store.segments())
+    assert all(store.retrieve_blob(blob_id) == blobs[blob_id] for blob_id in kept)
+    assert "invocation-0001" not in store
+
+
+def test_compact_keeps_recently_stored_blobs(tmp_path):
+    store = SegmentBlobStore(str(tmp_path / "segments"), max_segment_size=4096)
+    for i in range(10):
+        store.store_blob(os.urandom(900), f"invocation-{i:04d}")
+    # Backdate all but the newest blob, as if they had been stored an hour ago.
+    store._index.execute("UPDATE blobs SET stored_at = stored_at - 7200 WHERE blob_id != 'invocation-0009'")
+
+    # The newest blob's invocation may not be committed yet, so it survives although nothing refers to it.
+    stats = store.compact({"invocation-0000"})
+    assert stats.dropped_blobs == 8
+    assert "invocation-0000" in store and "invocation-0009" in store
+    assert "invocation-0001" not in store
+
+
+def test_index_without_store_times_is_upgraded(tmp_path):
+    directory = tmp_path / "segments"
+    store = SegmentBlobStore(str(directory))
+    store.store_blob(b"old", "invocation-0000")
+    store._index.execute("ALTER TABLE blobs DROP COLUMN stored_at")
+    store.close()
+
+    store = SegmentBlobStore(str(directory))
+    assert store.retrieve_blob("invocation-0000") == b"old"
+    assert store.compact(set()).dropped_blobs == 1
+
+
+def test_sqlite_store_with_segments(tmp_path):
+    db_dir = str(tmp_path)
+    legacy = SQLBlobStore(db_dir)
+    legacy.store_blob(b"old", "dataset-legacy")
+    segments = SegmentBlobStore(os.path.join(db_dir, "segments"), fallback=legacy)
+    old_store = ell.config.store
+    ell.config.store = store = SQLiteStore(db_dir, blob_store=segments)
+    try:
+        @ell.lmp.function.function()
+        def echo(text: str):
+            return text
+
+        big = "x" * 200_000
+        _, invocation_id = echo(big, _get_invocation_id=True)
+        assert invocation_id in segments
+        assert segments.retrieve_blob("dataset-legacy") == b"old"
+
+        store.compact_blob_store()
+        with Session(store.engine) as session:
+            invocation = session.get(Invocation, invocation_id)
+            assert invocation.contents.is_external
+            assert store.load_invocation_contents(invocation)["params"] == {"text": big}
+    finally:
+        ell.config.store = old_store
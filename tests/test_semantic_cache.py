@@ -0,0 +1,83 @@
+import numpy as np
+
+import ell
+import ell.lmp.function
+from ell.configurator import config
+from ell.util.semantic_cache import HashingEmbedder, SemanticCache
+
+
+def test_semantic_cache_finds_neighbours_evicts_and_persists(tmp_path):
+    embed = HashingEmbedder(dim=64)
+    assert np.array_equal(embed("Hello there"), embed("hello, there!"))
+
+    cache = SemanticCache(embed, threshold=0.8, max_entries=2, index_dir=str(tmp_path))
+    cache.add("lmp", "what is the capital of france", "key-france")
+    cache.add("lmp", "how tall is mount everest", "key-everest")
+
+    assert cache.lookup("lmp", "what is the capital city of france") == "key-france"
+    assert cache.lookup("lmp", "recommend a good book") is None
+    assert cache.lookup("other-lmp", "what is the capital of france") is None
+
+    # Everest is the least recently used entry.
+    cache.add("lmp", "who wrote hamlet", "key-hamlet")
+    assert cache.lookup("lmp", "how tall is mount everest") is None
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 3, 1)
+
+    cache.save()
+    reloaded = SemanticCache(embed, threshold=0.8, index_dir=str(tmp_path))
+    assert reloaded.lookup("lmp", "who wrote hamlet") == "key-hamlet"
+    assert len(reloaded) == 2
+
+
+def test_frozen_lmp_serves_paraphrased_inputs(sqlite_store, monkeypatch):
+    cache = SemanticCache(HashingEmbedder(), threshold=0.9)
+    monkeypatch.setattr(config, "semantic_cache", cache)
+    calls = []
+
+    @ell.lmp.function.function()
+    def answer(question: str):
+        calls.append(question)
+        return ell.assistant(f"answer #{len(calls)}")
+
+    # Calls that no frozen call could be served from aren't indexed.
+    answer("Who wrote Hamlet?")
+    assert len(cache) == 0
+
+    with sqlite_store.freeze(answer):
+        first = answer("What is the capital of France?")
+        assert answer("what is the capital of france") == first
+        assert answer("Who painted the Mona Lisa?") != first
+    assert len(calls) == 3
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+    assert len(cache) == 2
+
+
+def test_index_grows_in_chunks_and_replaces_in_place():
+    # Orthogonal embeddings, so every entry is only its own neighbour.
+    cache = SemanticCache(lambda text: np.eye(64)[int(text)], threshold=0.99, max_entries=40)
+    for i in range(17):
+        cache.add("lmp", str(i), f"key-{i}")
+    index = cache._indexes["lmp"]
+    assert len(index._vectors) == 32 and len(index.vectors) == 17
+    for i in range(17, 45):
+        cache.add("lmp", str(i), f"key-{i}")
+    assert len(index._vectors) == 40 and len(cache) == 40
+    assert cache.stats.evictions == 5
+    # The five least recently used entries made room; every remaining key still finds its own row.
+    assert cache.lookup("lmp", "3") is None
+    assert all(cache.lookup("lmp", str(i)) == f"key-{i}" for i in range(5, 45))
+
+
+def test_lookup_returns_the_key_it_matched(monkeypatch):
+    import ell.util.semantic_cache as semantic_cache
+
+    cache = SemanticCache(lambda text: np.eye(64)[int(text)], threshold=0.99, max_entries=1)
+    cache.add("lmp", "0", "key-0")
+
+    # Another thread adds an entry as soon as the lookup releases the lock, replacing the matched row in place.
+    def log_and_add(message):
+        cache.add("lmp", "1", "key-1")
+
+    monkeypatch.setattr(semantic_cache.logger, "info", log_and_add)
+    assert cache.lookup("lmp", "0") == "key-0"
+    assert cache._indexes["lmp"].keys == ["key-1"]
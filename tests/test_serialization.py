@@ -0,0 +1,105 @@
+import dataclasses
+import datetime
+import enum
+import json
+
+import numpy as np
+import pytest
+from pydantic import BaseModel, ConfigDict
+
+import ell
+from ell.types import Message
+from ell.types._lstr import _lstr
+import hashlib
+
+from ell.util.serialization import ClosureVars, get_immutable_vars, prepare_invocation_params, serialize_object
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    at: datetime.datetime
+
+
+class Params(BaseModel):
+    a: int
+    s: str = "x"
+
+
+class TracedParams(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+    text: _lstr
+
+
+first = _lstr("hi", origin_trace="invocation-a")
+second = _lstr("yo", origin_trace=frozenset({"invocation-b", "invocation-c"}))
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"x": 1, "y": "s"},
+        {"messages": [Message(role="user", content="hello"), ell.user(["plain"])], "t": (1, 2.5, None, True)},
+        {"ints": {2: "x", 10: "y"}, "floats": {1.5: 1}, "bools": {True: 1, False: 2}},
+        {"set": {3, 1, 2}, "frozenset": frozenset({"q"}), "enum": Color.RED, "dataclass": Point(1, datetime.datetime(2024, 1, 1)), "model": Params(a=1)},
+        {"array": np.arange(3), "np_int": np.int64(3), "np_float": np.float64(1.5), "type": object, "bytes": b"x"},
+        {"nested": {"b": {"a": 1, "c": [{"z": 1, "a": 2}]}}},
+    ],
+)
+def test_prepare_invocation_params_matches_serialize_object(params):
+    cleaned, jstr, consumes = prepare_invocation_params(params)
+    # The hash input must stay byte-identical so existing state cache keys keep hitting.
+    assert jstr == serialize_object(params)
+    assert cleaned == json.loads(jstr)
+    assert consumes == []
+
+
+def test_prepare_invocation_params_collects_origin_traces():
+    params = {"text": first, "history": [second, {"nested": [first]}], "untraced": _lstr("plain")}
+    cleaned, jstr, consumes = prepare_invocation_params(params)
+
+    assert sorted(consumes) == ["invocation-a", "invocation-b", "invocation-c"]
+    assert jstr == serialize_object(params)
+    assert cleaned["text"] == {"content": "hi", "__origin_trace__": "frozenset({'invocation-a'})", "__lstr": True}
+
+
+def test_prepare_invocation_params_collects_origin_traces_from_models():
+    params = {"model": TracedParams(text=_lstr("x", origin_trace="invocation-z")), "untraced": frozenset({"invocation-q"})}
+    cleaned, jstr, consumes = prepare_invocation_params(params)
+
+    assert consumes == ["invocation-z"]
+    assert jstr == serialize_object(params)
+    assert cleaned == json.loads(jstr)
+
+
+def _state_cache_key_from_scratch(ipstr, fn_closure):
+    globals_str = json.dumps(get_immutable_vars(fn_closure[2]), sort_keys=True, default=repr, ensure_ascii=False)
+    frees_str = json.dumps(get_immutable_vars(fn_closure[3]), sort_keys=True, default=repr, ensure_ascii=False)
+    return hashlib.sha256(f"{ipstr}{globals_str}{frees_str}".encode("utf-8")).hexdigest()
+
+
+def test_closure_vars_track_mutated_globals():
+    examples = ["a"]
+    settings = {"temperature": 0.5, "stops": ("\n", 3)}
+    fn_closure = ("source", "deps", dict(examples=examples, settings=settings, point=Point(1, None), n=3), dict(arr=np.zeros(2)))
+    closure_vars = ClosureVars(fn_closure)
+
+    def check():
+        assert closure_vars.state_cache_key('{"x": 1}') == _state_cache_key_from_scratch('{"x": 1}', fn_closure)
+        assert closure_vars.global_vars == get_immutable_vars(fn_closure[2])
+        assert closure_vars.free_vars == get_immutable_vars(fn_closure[3])
+
+    check()
+    unchanged = closure_vars._snapshot
+    check()
+    assert closure_vars._snapshot is unchanged
+
+    examples.append("b")
+    settings["stops"] = ("\n",)
+    fn_closure[3]["arr"][0] = 1
+    check()
+    assert closure_vars._snapshot is not unchanged
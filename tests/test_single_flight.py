@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlmodel import Session, select
+
+import ell
+from ell.configurator import config
+from ell.stores.models.core import Invocation
+from ell.util.single_flight import SingleFlight
+from tests.conftest import CountingClient
+
+
+class SlowClient(CountingClient):
+    def create(self, model, messages, stream=False):
+        time.sleep(0.2)
+        return super().create(model, messages, stream)
+
+
+def test_single_flight_shares_one_call_and_its_errors():
+    flights = SingleFlight()
+    calls = []
+    barrier = threading.Barrier(4)
+
+    def slow_call():
+        calls.append(1)
+        time.sleep(0.2)
+        return "done"
+
+    def caller(_):
+        barrier.wait()
+        return flights.do("key", slow_call)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        outcomes = list(executor.map(caller, range(4)))
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in outcomes) == [False, True, True, True]
+    assert {result for result, _ in outcomes} == {"done"}
+
+    def failing_call():
+        raise ValueError("provider down")
+
+    with pytest.raises(ValueError):
+        flights.do("key", failing_call)
+
+
+def test_concurrent_identical_calls_are_coalesced(sqlite_store, counting_provider, monkeypatch):
+    monkeypatch.setattr(config, "single_flight", True)
+    client = SlowClient()
+
+    @ell.simple(model="counting-model", client=client)
+    def popular(query: str):
+        return f"Answer: {query}"
+
+    barrier = threading.Barrier(4)
+
+    def caller(_):
+        barrier.wait()
+        return popular("what is ell?", _get_invocation_id=True)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        outcomes = list(executor.map(caller, range(4)))
+
+    assert len(client.requests) == 1
+    assert {str(result) for result, _ in outcomes} == {"response 1"}
+    # Every caller's result is traced to its own invocation and to the one that made the call.
+    invocation_ids = {invocation_id for _, invocation_id in outcomes}
+    assert len(invocation_ids) == 4
+    for result, invocation_id in outcomes:
+        assert invocation_id in result.__origin_trace__
+        assert len(result.__origin_trace__) in (1, 2) and result.__origin_trace__ <= invocation_ids
+
+    with Session(sqlite_store.engine) as session:
+        recorded = session.exec(select(Invocation.id).where(Invocation.lmp_id == popular.__ell_func__.__ell_hash__)).all()
+    assert set(recorded) == invocation_ids
+
+
+def test_concurrent_identical_async_calls_are_coalesced():
+    flights = SingleFlight()
+    calls = []
+
+    async def slow_call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("key", slow_call) for _ in range(5)))
+
+    outcomes = asyncio.run(main())
+    assert len(calls) == 1
+    assert [shared for _, shared in outcomes].count(False) == 1
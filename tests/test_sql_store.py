@@ -1,10 +1,16 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
-from ell.stores.sql import SQLStore, SerializedLMP
+import sqlalchemy
+from ell.stores.sql import SQLStore, SQLiteStore, SerializedLMP
+from ell.stores.models.core import Invocation, InvocationContents, InvocationTrace
 from sqlmodel import Session, select
 from sqlalchemy import Engine, create_engine, func
 
 from ell.types.lmp import LMPType
 from ell.util.serialization import utc_now
+from tests.conftest import make_invocation, write_test_lmp
 
 
 @pytest.fixture
@@ -76,4 +82,230 @@ def test_write_lmp(sql_store: SQLStore):
     sql_store.write_lmp(SerializedLMP(lmp_id=lmp_id, name=name, source=source, dependencies=dependencies, lmp_type=LMPType.LM, api_params=api_params, version_number=version_number, initial_global_vars=global_vars, initial_free_vars=free_vars, commit_message=commit_message, created_at=created_at), uses)
     with Session(sql_store.engine) as session:
         count = session.exec(select(func.count()).where(SerializedLMP.lmp_id == lmp_id)).one()
-        assert count == 1
\ No newline at end of file
+        assert count == 1
+
+def test_write_behind_batches_invocations(tmp_path):
+    store = SQLiteStore(str(tmp_path), write_behind=True, write_batch_size=8, write_flush_interval=0.05)
+    write_test_lmp(store)
+
+    for i in range(20):
+        store.write_invocation(make_invocation(f"invocation-{i}"), consumes={f"invocation-{i - 1}"} if i else set())
+    store.flush()
+
+    with Session(store.engine) as session:
+        assert session.exec(select(func.count()).select_from(Invocation)).one() == 20
+        assert session.exec(select(func.count()).select_from(InvocationTrace)).one() == 19
+        assert session.exec(select(SerializedLMP.num_invocations)).one() == 20
+
+    store.invocation_writer.close()
+    with pytest.raises(RuntimeError):
+        store.write_invocation(make_invocation("invocation-late"), consumes=set())
+
+
+def test_write_invocations_coalesces_counters(tmp_path):
+    store = SQLiteStore(str(tmp_path))
+    write_test_lmp(store, "lmp_a")
+    write_test_lmp(store, "lmp_b")
+
+    written = store.write_invocations(
+        [(make_invocation(f"invocation-a{i}", "lmp_a"), set()) for i in range(5)]
+        + [(make_invocation("invocation-b0", "lmp_b"), {"invocation-a0", "invocation-a1"})]
+    )
+    assert written == 6
+
+    with Session(store.engine) as session:
+        counts = dict(session.exec(select(SerializedLMP.lmp_id, SerializedLMP.num_invocations)).all())
+        assert counts == {"lmp_a": 5, "lmp_b": 1}
+        assert session.exec(select(InvocationContents.params).where(InvocationContents.invocation_id == "invocation-b0")).one() == {"x": 1}
+        assert session.exec(select(func.count()).select_from(InvocationTrace)).one() == 2
+
+    # A batch referencing an unknown LMP is rejected as a whole.
+    with pytest.raises(AssertionError):
+        store.write_invocations([(make_invocation("invocation-a5", "lmp_a"), set()), (make_invocation("invocation-x", "missing"), set())])
+    with Session(store.engine) as session:
+        assert session.exec(select(func.count()).select_from(Invocation)).one() == 6
+
+
+def test_sqlite_high_concurrency_stress(tmp_path):
+    store = SQLiteStore(str(tmp_path), high_concurrency=True)
+    n_threads, n_per_thread = 8, 25
+
+    with store.engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+
+    def worker(t):
+        # write_lmp reads before it writes, the pattern that fails fast with "database is locked" without BEGIN IMMEDIATE.
+        write_test_lmp(store, f"lmp_{t}")
+        for i in range(n_per_thread):
+            store.write_invocation(make_invocation(f"invocation-{t}-{i}", f"lmp_{t}"), consumes=set())
+            store.get_cached_invocations(f"lmp_{t}", "missing")
+
+    with ThreadPoolExecutor(max_workers=n_threads) as executor:
+        list(executor.map(worker, range(n_threads)))
+
+    with Session(store.read_engine) as session:
+        assert session.exec(select(func.count()).select_from(Invocation)).one() == n_threads * n_per_thread
+        assert set(session.exec(select(SerializedLMP.num_invocations)).all()) == {n_per_thread}
+
+    # Studio's connections are read-only.
+    with pytest.raises(sqlalchemy.exc.OperationalError):
+        with store.read_engine.begin() as conn:
+            conn.exec_driver_sql("DELETE FROM invocation")
+
+
+def test_sqlite_store_in_a_directory_with_uri_characters(tmp_path):
+    db_dir = str(tmp_path / "my store #1 (50% done?)")
+    store = SQLiteStore(db_dir)
+    write_test_lmp(store)
+    # Reopening runs the migrations against the same path.
+    store = SQLiteStore(db_dir)
+
+    with Session(store.read_engine) as session:
+        assert session.exec(select(SerializedLMP.lmp_id)).all() == ["test_lmp_1"]
+    assert os.listdir(db_dir) == ["ell.db"]
+
+
+def test_invocations_aggregate_buckets_in_sql(tmp_path):
+    from datetime import timedelta
+
+    store = SQLiteStore(str(tmp_path))
+    write_test_lmp(store)
+    now = utc_now().replace(minute=30)
+    invocations = []
+    # 100 invocations an hour ago with latencies 1..100, and one two hours ago.
+    for i in range(100):
+        invocation = make_invocation(f"invocation-{i}")
+        invocation.latency_ms, invocation.created_at = float(i + 1), now - timedelta(hours=1)
+        invocations.append((invocation, set()))
+    old = make_invocation("invocation-old")
+    old.latency_ms, old.prompt_tokens, old.created_at = 7.0, 10, now - timedelta(hours=2)
+    invocations.append((old, set()))
+    store.write_invocations(invocations)
+
+    with Session(store.engine) as session:
+        # Minute buckets are aggregated from the invocations themselves, with exact percentiles.
+        aggregate = store.get_invocations_aggregate(session, days=1, bucket="minute")
+
+    assert aggregate["bucket"] == "minute"
+    assert (aggregate["total_invocations"], aggregate["total_tokens"], aggregate["unique_lmps"]) == (101, 211, 1)
+    first, second = aggregate["graph_data"]
+    assert first["date"] == (now - timedelta(hours=2)).replace(second=0, microsecond=0)
+    assert (first["count"], first["prompt_tokens"], first["latency_p99"]) == (1, 10, 7.0)
+    assert (second["count"], second["tokens"], second["avg_latency"]) == (100, 200, 50.5)
+    assert (second["latency_p50"], second["latency_p95"], second["latency_p99"]) == (50.0, 95.0, 99.0)
+
+
+def test_invocations_aggregate_reads_rollups(tmp_path):
+    from datetime import timedelta
+    from ell.stores.models.core import InvocationRollup
+
+    store = SQLiteStore(str(tmp_path))
+    write_test_lmp(store)
+    now = utc_now().replace(minute=30)
+    invocations = []
+    for i in range(100):
+        invocation = make_invocation(f"invocation-{i}")
+        invocation.latency_ms, invocation.created_at = float(i + 1), now - timedelta(hours=1)
+        invocations.append((invocation, set()))
+    store.write_invocations(invocations[:60])
+    store.write_invocations(invocations[60:])
+    old = make_invocation("invocation-old")
+    old.latency_ms, old.prompt_tokens, old.created_at = 7.0, 10, now - timedelta(hours=2)
+    store.write_invocation(old, set())
+
+    with Session(store.engine) as session:
+        rollups = session.exec(select(InvocationRollup).order_by(InvocationRollup.bucket_start)).all()
+        aggregate = store.get_invocations_aggregate(session, days=1)
+    assert [(r.bucket_start, r.count, r.latency_hist_3) for r in rollups] == [
+        ((now - timedelta(hours=2)).replace(minute=0, second=0, microsecond=0), 1, 1),
+        ((now - timedelta(hours=1)).replace(minute=0, second=0, microsecond=0), 100, 5),
+    ]
+
+    assert aggregate["bucket"] == "hour"
+    assert (aggregate["total_invocations"], aggregate["total_tokens"], aggregate["unique_lmps"]) == (101, 211, 1)
+    first, second = aggregate["graph_data"]
+    assert (first["count"], first["prompt_tokens"]) == (1, 10)
+    assert (second["count"], second["tokens"], second["avg_latency"]) == (100, 200, 50.5)
+    # Estimated from the histogram: p50 falls in (20, 50], p95 and p99 in (50, 100].
+    assert 20 < second["latency_p50"] <= 50 and 90 <= second["latency_p95"] <= second["latency_p99"] <= 100
+
+    # A backfill recomputes the same rollups from the invocations.
+    with Session(store.engine) as session:
+        before = [r.model_dump() for r in session.exec(select(InvocationRollup).order_by(InvocationRollup.bucket_start)).all()]
+    assert store.backfill_rollups() == 2
+    with Session(store.engine) as session:
+        assert [r.model_dump() for r in session.exec(select(InvocationRollup).order_by(InvocationRollup.bucket_start)).all()] == before
+
+
+def test_cursor_pagination(tmp_path):
+    from datetime import timedelta
+    from ell.stores.pagination import next_cursor
+
+    store = SQLiteStore(str(tmp_path))
+    write_test_lmp(store)
+    now = utc_now()
+    invocations = []
+    for i in range(25):
+        invocation = make_invocation(f"invocation-{i:02d}")
+        # Pairs of invocations share a timestamp, so pages must break ties by id.
+        invocation.created_at = now - timedelta(seconds=i // 2)
+        invocations.append((invocation, set()))
+    store.write_invocations(invocations)
+
+    with Session(store.engine) as session:
+        expected = [invocation.id for invocation in store.get_invocations(session, lmp_filters={}, limit=100)]
+        seen, cursor = [], None
+        while True:
+            page = store.get_invocations(session, lmp_filters={}, limit=10, cursor=cursor)
+            if not page:
+                break
+            seen.extend(invocation.id for invocation in page)
+            cursor = next_cursor(page, "created_at", "id")
+
+        assert len(expected) == 25
+        assert seen == expected
+
+        lmps = store.get_lmps(session, limit=1)
+        assert store.get_lmps(session, limit=1, cursor=next_cursor(lmps, "created_at", "lmp_id")) == []
+        with pytest.raises(ValueError):
+            store.get_invocations(session, lmp_filters={}, cursor="not-a-cursor")
+
+
+def test_scoped_traces_and_call_trees(tmp_path):
+    store = SQLiteStore(str(tmp_path))
+    for lmp_id in "abcdxy":
+        write_test_lmp(store, lmp_id=lmp_id)
+
+    def invocation(invocation_id, lmp_id, used_by_id=None):
+        invocation = make_invocation(invocation_id, lmp_id=lmp_id)
+        invocation.used_by_id = used_by_id
+        return invocation
+
+    # c1 -> b1 -> a1 -> d1 (each consumes the previous one's output), and an unrelated y1 -> x1.
+    store.write_invocations([(invocation("c1", "c"), set()), (invocation("y1", "y"), set())])
+    store.write_invocations([(invocation("b1", "b"), {"c1"}), (invocation("b2", "b"), {"c1"}), (invocation("x1", "x"), {"y1"})])
+    store.write_invocations([(invocation("a1", "a"), {"b1", "b2"})])
+    store.write_invocations([(invocation("d1", "d"), {"a1"})])
+    # a call tree: root (a) made child (b), which made grandchild (c).
+    store.write_invocations([(invocation("root", "a"), set())])
+    store.write_invocations([(invocation("child", "b", used_by_id="root"), set())])
+    store.write_invocations([(invocation("grandchild", "c", used_by_id="child"), set())])
+
+    def edges(traces):
+        return sorted((t["consumer"], t["consumed"], t["count"]) for t in traces)
+
+    with Session(store.engine) as session:
+        assert edges(store.get_traces(session)) == [("a", "b", 2), ("b", "c", 2), ("d", "a", 1), ("x", "y", 1)]
+        assert edges(store.get_traces(session, invocation_id="a1", direction="upstream")) == [("a", "b", 2), ("b", "c", 2)]
+        assert edges(store.get_traces(session, invocation_id="a1", direction="downstream")) == [("d", "a", 1)]
+        assert edges(store.get_traces(session, invocation_id="b1")) == [("a", "b", 1), ("b", "c", 1), ("d", "a", 1)]
+        assert edges(store.get_traces(session, lmp_id="a", max_depth=1)) == [("a", "b", 2), ("d", "a", 1)]
+
+        assert [i.id for i in store.get_invocation_ancestors(session, "grandchild")] == ["child", "root"]
+        assert [i.id for i in store.get_invocation_descendants(session, ["root"], max_depth=1)] == ["child"]
+
+        roots = store.get_invocations(session, lmp_filters={}, limit=100, hierarchical=True)
+        assert "child" not in {i.id for i in roots}
+        root = next(i for i in roots if i.id == "root")
+        assert "uses" in root.__dict__
+        assert [i.id for i in root.uses] == ["child"] and [i.id for i in root.uses[0].uses] == ["grandchild"]
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from ell.stores.sql import SQLiteStore
+from ell.studio.config import Config
+from ell.studio.server import create_app
+from tests.conftest import make_invocation, write_test_lmp
+
+
+@pytest.fixture
+def client(tmp_path, sqlite_store):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i in range(3):
+        write_test_lmp(sqlite_store, f"lmp_{i}", name="my_lmp", created_at=start + timedelta(minutes=i))
+    return TestClient(create_app(Config(storage_dir=str(tmp_path))))
+
+
+def test_get_lmps_pages_to_the_end(client):
+    seen, cursor = [], None
+    for _ in range(5):
+        params = dict(name="my_lmp", limit=2)
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/lmps", params=params)
+        assert response.status_code == 200
+        seen += [lmp["lmp_id"] for lmp in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == ["lmp_2", "lmp_1", "lmp_0"]
+
+
+def test_get_lmps_past_the_last_page_is_empty(client):
+    response = client.get("/api/lmps", params=dict(name="my_lmp", limit=3))
+    assert len(response.json()) == 3
+    response = client.get("/api/lmps", params=dict(name="my_lmp", limit=3, cursor=response.headers["X-Next-Cursor"]))
+    assert response.status_code == 200
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_get_lmps_unknown_name_is_not_found(client):
+    assert client.get("/api/lmps", params=dict(name="missing")).status_code == 404
+
+
+def test_search_uses_an_index_created_after_the_app_started(client, tmp_path):
+    assert client.get("/api/invocations/search", params=dict(q="storm")).status_code == 404
+
+    store = SQLiteStore(str(tmp_path), full_text_search=True)
+    store.write_invocation(
+        make_invocation("i1", "lmp_0", params={"question": "Any storms ahead?"}, state_cache_key="k1"), set()
+    )
+    response = client.get("/api/invocations/search", params=dict(q="storms"))
+    assert response.status_code == 200
+    assert [hit["invocation_id"] for hit in response.json()] == ["i1"]
+
+
+def test_aggregate_allows_buckets_without_latencies(client, sqlite_store, monkeypatch):
+    sqlite_store.write_invocation(make_invocation("i1", "lmp_0"), set())
+    aggregate = SQLiteStore.get_invocations_aggregate
+
+    def without_latencies(self, *args, **kwargs):
+        # A bucket whose invocations have no recorded latency has no mean or percentiles.
+        result = aggregate(self, *args, **kwargs)
+        for point in result["graph_data"]:
+            point.update(avg_latency=None, latency_p50=None, latency_p95=None, latency_p99=None)
+        return result
+
+    monkeypatch.setattr(SQLiteStore, "get_invocations_aggregate", without_latencies)
+    response = client.get("/api/invocations/aggregate", params=dict(days=1, bucket="minute"))
+    assert response.status_code == 200
+    (point,) = response.json()["graph_data"]
+    assert point["count"] == 1
+    assert point["avg_latency"] is None and point["latency_p99"] is None
+
+
+def test_invocations_carry_compressed_contents(client, tmp_path):
+    store = SQLiteStore(str(tmp_path), compress_contents=True, compression_threshold=16)
+    store.write_invocation(make_invocation("i1", "lmp_0", params={"question": "Any storms ahead?"}, results="Clear skies."), set())
+
+    (invocation,) = client.get("/api/invocations", params=dict(id="i1")).json()
+    assert (invocation["contents"]["params"], invocation["contents"]["results"]) == ({"question": "Any storms ahead?"}, "Clear skies.")
@@ -0,0 +1,84 @@
+from datetime import timedelta
+
+from sqlmodel import Session, select
+
+import ell
+import ell.lmp.function
+from ell.stores.models.core import Invocation
+from ell.stores.sql import SQLiteStore
+from ell.stores.tiered import CacheTier, TieredStore
+from ell.util.serialization import utc_now
+from tests.conftest import make_invocation, write_test_lmp
+
+
+def _cached_ids(store):
+    with Session(store.engine) as session:
+        return set(session.exec(select(Invocation.id).where(Invocation.state_cache_key.isnot(None))).all())
+
+
+def test_lower_tier_hits_are_promoted(sqlite_store, tmp_path):
+    @ell.lmp.function.function()
+    def tripled(x: int):
+        return x * 3
+
+    # Tracked calls land in the shared store.
+    tripled(3)
+    tripled(4)
+    local = SQLiteStore(str(tmp_path / "local"))
+    local_tier, shared_tier = CacheTier(local, max_entries=1), CacheTier(sqlite_store)
+    cache = TieredStore(local_tier, shared_tier)
+
+    with cache.freeze(tripled):
+        assert tripled(3) == 9
+        assert tripled(3) == 9
+    # Both calls were served from the cache, so the shared store recorded nothing new.
+    assert sqlite_store.get_versions_by_fqn(tripled.__ell_func__.__qualname__)[0].num_invocations == 2
+    assert (local_tier.hits, local_tier.misses, shared_tier.hits) == (0, 1, 1)
+    assert cache.cache_memo.stats.hits == 1
+    assert local.get_versions_by_fqn(tripled.__ell_func__.__qualname__)[0].num_invocations == 1
+
+    # Without the memo, the promoted invocation is answered by the local tier.
+    cache.cache_memo.clear()
+    with cache.freeze(tripled):
+        assert tripled(3) == 9
+    assert (local_tier.hits, shared_tier.hits) == (1, 1)
+
+    # Promoting a second entry evicts the oldest one from the bounded local tier.
+    promoted = _cached_ids(local)
+    with cache.freeze(tripled):
+        assert tripled(4) == 12
+    assert len(_cached_ids(local)) == 1 and _cached_ids(local) != promoted
+    assert _cached_ids(sqlite_store) >= _cached_ids(local) | promoted
+
+
+def test_expired_entries_fall_through(sqlite_store, tmp_path):
+    @ell.lmp.function.function()
+    def doubled(x: int):
+        return x * 2
+
+    doubled(1)
+    stale_tier = CacheTier(sqlite_store, ttl=1e-9)
+    cache = TieredStore(stale_tier, cache_memo_size=0)
+    assert cache.get_cached_invocations(doubled.__ell_func__.__ell_hash__, "missing") == []
+    with cache.freeze(doubled):
+        assert doubled(1) == 2
+    assert (stale_tier.hits, stale_tier.misses) == (0, 2)
+
+
+def test_promoted_entries_are_kept_by_last_use(tmp_path):
+    shared = SQLiteStore(str(tmp_path / "shared"))
+    local = SQLiteStore(str(tmp_path / "local"), cache_memo_size=0)
+    month_ago = utc_now() - timedelta(days=30)
+    for store in (shared, local):
+        write_test_lmp(store, created_at=month_ago)
+    shared.write_invocation(make_invocation("old", state_cache_key="k-old", created_at=month_ago), set())
+    local.write_invocation(make_invocation("new", state_cache_key="k-new"), set())
+
+    local_tier = CacheTier(local, max_entries=1, ttl=3600)
+    cache = TieredStore(local_tier, CacheTier(shared), cache_memo_size=0)
+    # The month-old entry is promoted into the full local tier: the entry that wasn't just used makes room for it,
+    # and the promoted copy is served by the local tier despite its age.
+    assert [i.id for i in cache.get_cached_invocations("test_lmp_1", "k-old")] == ["old"]
+    assert _cached_ids(local) == {"old"}
+    assert [i.id for i in cache.get_cached_invocations("test_lmp_1", "k-old")] == ["old"]
+    assert local_tier.hits == 1
@@ -0,0 +1,70 @@
+from sqlmodel import Session, select
+
+import ell
+import ell.lmp.function
+from ell.lmp._track import get_current_invocation
+from ell.stores.models.core import Invocation
+from ell.util.concurrency import ContextThreadPoolExecutor
+
+
+@ell.lmp.function.function()
+def child(x: int):
+    return x * 2
+
+
+@ell.lmp.function.function()
+def threaded_parent(n: int):
+    with ContextThreadPoolExecutor(max_workers=4) as executor:
+        return sum(executor.map(child, range(n)))
+
+
+def _parents(store, lmp_name):
+    with Session(store.engine) as session:
+        invocations = session.exec(select(Invocation).where(Invocation.lmp_id == getattr(lmp_name, "__ell_hash__"))).all()
+        return [i.used_by_id for i in invocations]
+
+
+def test_parent_tracked_across_thread_pool(sqlite_store):
+    result, parent_id = threaded_parent(8, _get_invocation_id=True)
+    assert result == sum(x * 2 for x in range(8))
+    assert _parents(sqlite_store, child) == [parent_id] * 8
+    assert get_current_invocation() is None
+
+
+
+def test_ast_hashing_mode_reuses_stored_black_versions(sqlite_store, monkeypatch):
+    @ell.lmp.function.function()
+    def doubled(x: int):
+        return x * 2
+
+    doubled(1)
+    black_hash = doubled.__ell_func__.__ell_hash__
+
+    # Simulate a fresh process running with the "ast" hashing mode.
+    monkeypatch.setattr(ell.config, "hashing_mode", "ast")
+    for attr in ("__ell_hash__", "__ell_closure__", "__ell_uses__"):
+        delattr(doubled.__ell_func__, attr)
+    doubled.__ell_func__._has_serialized_lmp = False
+
+    doubled(2)
+    assert doubled.__ell_func__.__ell_hash__ == black_hash
+    assert [lmp.lmp_id for lmp in sqlite_store.get_versions_by_fqn(doubled.__ell_func__.__qualname__)] == [black_hash]
+    assert _parents(sqlite_store, doubled.__ell_func__) == [None, None]
+
+
+def test_frozen_lmp_is_served_from_the_cache_memo(sqlite_store):
+    calls = []
+
+    @ell.lmp.function.function()
+    def tripled(x: int):
+        calls.append(x)
+        return ell.assistant(f"{x * 3}")
+
+    first = tripled(3)
+    with sqlite_store.freeze(tripled):
+        assert tripled(3) == first
+        assert tripled(3) == first
+    assert calls == [3]
+
+    # The first cached call reads the database, the second is answered from memory.
+    assert (sqlite_store.cache_memo.stats.hits, sqlite_store.cache_memo.stats.misses) == (1, 1)